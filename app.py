@@ -1,85 +1,113 @@
-# Yeh app.py file hai. Yahan se pura Flask app start hota hai.
-# Database bhi yahin se banta hai, aur admin/user ke routes bhi yahin se register hote hain.
+# Yeh app.py file hai. Yahan se pura Flask app banta hai: create_app() config, routes aur blueprints set karta hai.
+# create_app() database ko haath nahi lagata, isliye import aur worker boot turant hota hai.
+# Tables banana/upgrade karna aur admin user: flask --app app init-db (python app.py yeh khud kar leta hai).
 # Neeche har section ke upar simple comments milenge.
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-import sqlite3
+from flask import Flask, current_app, render_template, request, redirect, url_for, flash, session
+from flask.cli import with_appcontext
+import click
 import os
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'
+from models.db import connect, get_db, init_app as init_database, write_transaction
+from models.counters import check_lot_counters, rebuild_lot_counters
+from models.schema import SCHEMA_VERSION, migrate
+from models.rollups import rebuild_rollups
+from models.archive import DEFAULT_ARCHIVE_AFTER_DAYS, archive_cutoff, archive_reservations, archive_stats
+from models.allocator import init_app as init_allocator
+from models.cache import init_app as init_cache
+from models.feed import init_app as init_feed
+from models.jobs import init_app as init_jobs
+from models.lifecycle import init_app as init_lifecycle
+from models.metrics import init_app as init_metrics
+from models.passwords import DEFAULT_HASH_METHOD, LoginOverloaded, get_verifier, init_app as init_passwords
+from models.repository import find_user, user_taken
+from models.shards import ShardLayoutError, init_app as init_shards, prepare_shards
+from models.snapshot import get_snapshots, init_app as init_snapshots
+from models.tokens import create_token, revoke_tokens
+from models.timestamps import format_timestamp
 
-# Import blueprints
 from controllers.admin_controller import admin_bp
 from controllers.user_controller import user_bp
+from controllers.api_controller import api_bp
 
-# Register blueprints for admin and user routes
-app.register_blueprint(admin_bp)
-app.register_blueprint(user_bp)
+# Only for debug mode and tests: set SECRET_KEY (config or environment) everywhere else
+DEV_SECRET_KEY = 'your-secret-key-here'
 
-# Initialize the database and create tables if they do not exist
-def init_db():
-    conn = sqlite3.connect('parking.db')
+
+def create_app(config=None):
+    """Build a configured app. Cheap: no database access, no password hashing, no threads.
+
+    `config` overrides the defaults (and the PARKING_DB / SECRET_KEY / ... environment
+    variables). The schema check and other per-worker setup run in each worker
+    process before its first request (models/lifecycle.py). Raises RuntimeError
+    if SECRET_KEY is unset outside debug mode and tests.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    app.config.update(config or {})
+    if not app.config['SECRET_KEY']:
+        if not (app.debug or app.testing):
+            raise RuntimeError('SECRET_KEY is not set: pass it in the config or the SECRET_KEY environment variable.')
+        app.config['SECRET_KEY'] = DEV_SECRET_KEY
+
+    # Database path and connection pool settings (override with the PARKING_DB env variable)
+    init_database(app)
+    # Per-worker startup: schema version check before serving (SCHEMA_CHECK)
+    init_lifecycle(app)
+
+    # Completed reservations older than this many days move to the archive table (flask --app app archive-reservations)
+    app.config.setdefault('ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)
+
+    # Lot availability / page cache (RESPONSE_CACHE_SIZE entries, RESPONSE_CACHE_TTL seconds)
+    init_cache(app)
+    # Live availability feed for SSE screens (FEED_QUEUE_SIZE, FEED_HEARTBEAT, FEED_SYNC_INTERVAL)
+    init_feed(app)
+    # Request/SQL timing and /admin/metrics, only with METRICS_ENABLED (SLOW_REQUEST_MS, SLOW_QUERY_MS)
+    init_metrics(app)
+    # Sharded storage: SHARD_COUNT shard files for spots/reservations, 0 = one file (after metrics: same connection class)
+    init_shards(app)
+    # Reports and exports read a backup-API copy with REPORT_SNAPSHOT (REPORT_SNAPSHOT_MAX_AGE seconds; after shards)
+    init_snapshots(app)
+    # Background maintenance jobs, run by one leader process (JOBS_ENABLED, JOB_WORKERS, JOB_INTERVALS; after snapshots)
+    init_jobs(app)
+    # Password hashing policy and bounded verify pool (PASSWORD_HASH_METHOD, PASSWORD_VERIFY_WORKERS/QUEUE/TIMEOUT)
+    init_passwords(app)
+    # In-memory free-spot allocator (SPOT_ALLOCATION_POLICY, SPOT_ALLOCATOR_WARM)
+    init_allocator(app)
+
+    # Reservation times are epoch seconds; templates show them with {{ value | datetime }}
+    app.add_template_filter(format_timestamp, 'datetime')
+
+    # Register blueprints for admin and user routes
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(user_bp)
+    # JSON API for kiosks / fleet integrations (token auth, see controllers/api_controller.py)
+    app.register_blueprint(api_bp)
+
+    # Top-level pages (the endpoint names are what url_for('login') etc. use)
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/login', view_func=login, methods=['GET', 'POST'])
+    app.add_url_rule('/register', view_func=register, methods=['GET', 'POST'])
+    app.add_url_rule('/logout', view_func=logout)
+    app.add_url_rule('/admin/dashboard', view_func=admin_dashboard)
+    app.add_url_rule('/user/dashboard', view_func=user_dashboard)
+
+    for command in (init_db_command, check_counters_command, rebuild_rollups_command, archive_reservations_command,
+                    refresh_snapshot_command, create_api_token_command, revoke_api_token_command):
+        app.cli.add_command(command)
+    return app
+
+# Create or upgrade tables and indexes, and the admin user if it does not exist (and the shard files, if any)
+def init_db(path, password_method=DEFAULT_HASH_METHOD, shard_paths=()):
+    conn = connect(path)
     cursor = conn.cursor()
     
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            full_name TEXT NOT NULL,
-            address TEXT,
-            pin_code TEXT,
-            mobile TEXT,
-            role TEXT DEFAULT 'user'
-        )
-    ''')
-    
-    # Create parking_lots table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS parking_lots (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            prime_location_name TEXT NOT NULL,
-            price REAL NOT NULL,
-            address TEXT NOT NULL,
-            pin_code TEXT NOT NULL,
-            maximum_number_of_spots INTEGER NOT NULL
-        )
-    ''')
-    
-    # Create parking_spots table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS parking_spots (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            lot_id INTEGER NOT NULL,
-            status TEXT DEFAULT 'A',
-            FOREIGN KEY (lot_id) REFERENCES parking_lots (id)
-        )
-    ''')
-    
-    # Create reservations table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reservations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            spot_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            vehicle_number TEXT NOT NULL,
-            parking_timestamp DATETIME NOT NULL,
-            leaving_timestamp DATETIME,
-            parking_cost REAL,
-            status TEXT DEFAULT 'active',
-            FOREIGN KEY (spot_id) REFERENCES parking_spots (id),
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
+    # Create or upgrade tables and indexes (see models/schema.py)
+    applied = migrate(conn)
     
     # Create admin user if not exists
-    cursor.execute("SELECT * FROM users WHERE username = 'admin'")
-    if not cursor.fetchone():
-        admin_password = generate_password_hash('admin123')
+    if not find_user(cursor, 'admin'):
+        admin_password = generate_password_hash('admin123', password_method)
         cursor.execute('''
             INSERT INTO users (username, email, password, full_name, role)
             VALUES (?, ?, ?, ?, ?)
@@ -87,33 +115,144 @@ def init_db():
     
     conn.commit()
     conn.close()
+    
+    # Record the shard layout and migrate every shard (see models/shards.py)
+    prepare_shards(path, list(shard_paths))
+    return applied
+
+# Files holding spots and reservations: every shard, or the one database
+def _storage_paths():
+    return current_app.config['SHARD_PATHS'] or [current_app.config['DATABASE']]
+
+# Full database setup (run once per deploy, before starting workers): flask --app app init-db
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    try:
+        applied = init_db(current_app.config['DATABASE'], current_app.config['PASSWORD_HASH_METHOD'],
+                          current_app.config['SHARD_PATHS'])
+    except ShardLayoutError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Applied migrations {applied}; schema is at version {SCHEMA_VERSION}.' if applied
+               else f'Schema already at version {SCHEMA_VERSION}.')
+
+# Consistency checker for the per-lot counters: flask --app app check-counters [--repair]
+@click.command('check-counters')
+@with_appcontext
+@click.option('--repair', is_flag=True, help='Rebuild the counters of drifted lots.')
+def check_counters_command(repair):
+    drifted = []
+    for path in _storage_paths():
+        conn = connect(path)
+        cursor = conn.cursor()
+        for lot_id, available, occupied, actual_available, actual_occupied in check_lot_counters(cursor):
+            click.echo(f'Lot {lot_id}: stored {available}/{occupied}, actual {actual_available}/{actual_occupied}')
+            drifted.append(lot_id)
+            if repair:
+                rebuild_lot_counters(cursor, lot_id)
+        conn.commit()
+        conn.close()
+    if not drifted:
+        click.echo('All lot counters are consistent.')
+    elif repair:
+        click.echo(f'Rebuilt counters for {len(drifted)} lot(s).')
+
+# Recompute the report rollups from the reservations: flask --app app rebuild-rollups
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    for path in _storage_paths():
+        conn = connect(path)
+        write_transaction(conn, rebuild_rollups)
+        conn.close()
+    click.echo('Report rollups rebuilt.')
+
+# Move old completed reservations to the archive: flask --app app archive-reservations [--days 180]
+@click.command('archive-reservations')
+@with_appcontext
+@click.option('--days', type=int, default=None, help='Archive reservations that ended more than this many days ago.')
+@click.option('--batch-size', type=int, default=5000, help='Reservations moved per transaction.')
+def archive_reservations_command(days, batch_size):
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    moved = hot = archived = 0
+    for path in _storage_paths():
+        conn = connect(path)
+        moved += archive_reservations(conn, archive_cutoff(days), batch_size)
+        shard_hot, shard_archived = archive_stats(conn.cursor())
+        hot, archived = hot + shard_hot, archived + shard_archived
+        conn.close()
+    click.echo(f'Archived {moved} reservation(s) older than {days} days ({hot} hot, {archived} archived).')
+
+# Refresh the reporting snapshot now, e.g. from cron: flask --app app refresh-snapshot
+@click.command('refresh-snapshot')
+@with_appcontext
+def refresh_snapshot_command():
+    snapshots = get_snapshots()
+    if snapshots is None:
+        raise click.ClickException('REPORT_SNAPSHOT is off; reports read the live database.')
+    copied = snapshots.refresh(wait=True)
+    click.echo(f'Copied {copied} database file(s) to the reporting snapshot.')
+
+# API tokens for the JSON API: flask --app app create-api-token USERNAME --name kiosk-1
+@click.command('create-api-token')
+@with_appcontext
+@click.argument('username')
+@click.option('--name', default='default', help='Label for the token, e.g. the kiosk it is installed on.')
+def create_api_token_command(username, name):
+    conn = connect(current_app.config['DATABASE'])
+    cursor = conn.cursor()
+    user = find_user(cursor, username)
+    if not user:
+        conn.close()
+        raise click.ClickException(f'No user named {username}')
+    token = create_token(cursor, user.id, name)
+    conn.commit()
+    conn.close()
+    click.echo(token)
 
-# Initialize the database and create tables if they do not exist
-init_db()
+@click.command('revoke-api-token')
+@with_appcontext
+@click.argument('username')
+@click.option('--name', default=None, help='Only revoke the token with this label.')
+def revoke_api_token_command(username, name):
+    conn = connect(current_app.config['DATABASE'])
+    cursor = conn.cursor()
+    user = find_user(cursor, username)
+    removed = revoke_tokens(cursor, user.id, name) if user else 0
+    conn.commit()
+    conn.close()
+    click.echo(f'Revoked {removed} token(s).')
 
-# Each route below renders a template or redirects to another route
-@app.route('/')
+# Each route below renders a template or redirects to another route (registered in create_app)
 def index():
     return render_template('index.html')
 
-@app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
         
-        conn = sqlite3.connect('parking.db')
+        conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-        user = cursor.fetchone()
-        conn.close()
+        user = find_user(cursor, username)
         
-        if user and check_password_hash(user[3], password):
-            session['user_id'] = user[0]
-            session['username'] = user[1]
-            session['role'] = user[8]
+        # Hash check runs on the bounded password pool; a full pool answers "busy" right away
+        try:
+            ok, new_hash = get_verifier().verify(user.password, password) if user else (False, None)
+        except LoginOverloaded:
+            flash('Too many people are logging in right now. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+        
+        if ok:
+            # Old hash method or cost: store the password again under the current policy
+            if new_hash:
+                cursor.execute('UPDATE users SET password = ? WHERE id = ?', (new_hash, user.id))
+                conn.commit()
+            session['user_id'] = user.id
+            session['username'] = user.username
+            session['role'] = user.role
             flash('Login successful!', 'success')
-            if user[8] == 'admin':
+            if user.role == 'admin':
                 return redirect(url_for('admin_dashboard'))
             else:
                 return redirect(url_for('user_dashboard'))
@@ -122,7 +261,6 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -138,45 +276,43 @@ def register():
             flash('Passwords do not match', 'error')
             return render_template('register.html')
         
-        conn = sqlite3.connect('parking.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # Check if username or email already exists
-        cursor.execute("SELECT * FROM users WHERE username = ? OR email = ?", (username, email))
-        if cursor.fetchone():
+        if user_taken(cursor, username, email):
             flash('Username or email already exists', 'error')
-            conn.close()
             return render_template('register.html')
         
-        # Create new user
-        hashed_password = generate_password_hash(password)
+        # Create new user (hashed on the password pool with the current policy)
+        try:
+            hashed_password = get_verifier().hash(password)
+        except LoginOverloaded:
+            flash('Too many requests right now. Please try again in a moment.', 'error')
+            return render_template('register.html'), 503
         cursor.execute('''
             INSERT INTO users (username, email, password, full_name, address, pin_code, mobile)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (username, email, hashed_password, full_name, address, pin_code, mobile))
         
         conn.commit()
-        conn.close()
         
         flash('Registration successful! Please login.', 'success')
         return redirect(url_for('login'))
     
     return render_template('register.html')
 
-@app.route('/logout')
 def logout():
     session.clear()
     flash('Logged out successfully', 'success')
     return redirect(url_for('index'))
 
-@app.route('/admin/dashboard')
 def admin_dashboard():
     if 'role' not in session or session['role'] != 'admin':
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('login'))
     return redirect(url_for('admin.admin_dashboard'))
 
-@app.route('/user/dashboard')
 def user_dashboard():
     if 'user_id' not in session:
         flash('Please login to access this page.', 'error')
@@ -184,4 +320,7 @@ def user_dashboard():
     return redirect(url_for('user.user_dashboard'))
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    # Development server: set up the database first, like init-db
+    app = create_app({'DEBUG': True})
+    init_db(app.config['DATABASE'], app.config['PASSWORD_HASH_METHOD'], app.config['SHARD_PATHS'])
+    app.run()
@@ -0,0 +1,2 @@
+# Yeh benchmarks folder hai. Yahan performance naapne wale scripts hain (python -m benchmarks.<naam>).
+# Yeh tests nahi hain; inka output numbers hain jo alag-alag config ya machines pe compare kiye jaate hain.
@@ -0,0 +1,104 @@
+# Yeh login_benchmark.py hai. Isse pata chalta hai ki ek hash method ke saath har second kitne login ho sakte hain (per core bhi).
+# Chalane ka tareeka: python -m benchmarks.login_benchmark --method pbkdf2:sha256:600000 --seconds 5
+"""
+login_benchmark.py
+------------------
+Logins per second (and per core) through models.passwords.PasswordVerifier.
+
+For each hash method, a batch of client threads calls verify() for a fixed
+time against a stored hash of that method. The pool size is the verifier's
+(PASSWORD_VERIFY_WORKERS, default: all cores), so the per-core figure is
+throughput / min(pool size, cores). Overloaded (shed) attempts are counted
+separately: they are what a login storm sees instead of a stalled worker.
+
+    python -m benchmarks.login_benchmark
+    python -m benchmarks.login_benchmark --method scrypt:32768:8:1 --method pbkdf2:sha256:260000 --clients 32
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+from werkzeug.security import generate_password_hash
+
+from models.passwords import DEFAULT_HASH_METHOD, LoginOverloaded, PasswordVerifier
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def run(method, seconds, clients, workers=None, max_pending=None):
+    """Hammer one verifier for `seconds`; returns a result dict."""
+    verifier = PasswordVerifier(method, workers, max_pending)
+    stored = generate_password_hash('correct horse', method)
+    verifier.verify(stored, 'correct horse')  # warm the pool and the method normalisation
+    counts = {'ok': 0, 'shed': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        ok = shed = 0
+        while time.perf_counter() < deadline:
+            try:
+                verifier.verify(stored, 'correct horse')
+                ok += 1
+            except LoginOverloaded:
+                shed += 1
+                time.sleep(0.001)
+        with lock:
+            counts['ok'] += ok
+            counts['shed'] += shed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    verifier.shutdown()
+    cores = min(verifier.workers, available_cores())
+    rate = counts['ok'] / elapsed
+    return {
+        'method': verifier.method,
+        'workers': verifier.workers,
+        'cores': cores,
+        'clients': clients,
+        'seconds': round(elapsed, 2),
+        'logins': counts['ok'],
+        'logins_per_second': round(rate, 1),
+        'logins_per_second_per_core': round(rate / cores, 1),
+        'shed': counts['shed'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--method', action='append', help=f'hash method (repeatable, default {DEFAULT_HASH_METHOD})')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--clients', type=int, default=None, help='concurrent login threads (default 4 x cores)')
+    parser.add_argument('--workers', type=int, default=None, help='verify pool size (default: all cores)')
+    parser.add_argument('--queue', type=int, default=None, help='max pending verifications (default 4 x workers)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    clients = args.clients or 4 * available_cores()
+    results = [run(method, args.seconds, clients, args.workers, args.queue)
+               for method in args.method or [DEFAULT_HASH_METHOD]]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(f"{result['method']:<28} {result['logins_per_second']:>9.1f} logins/s  "
+              f"{result['logins_per_second_per_core']:>8.1f} /s/core  "
+              f"({result['workers']} workers, {result['clients']} clients, {result['shed']} shed)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+# Yeh route_benchmark.py hai. Ek bada database seed karke har important route pe ek saath kai workers chalata hai,
+# aur har route ke liye throughput (requests/sec) aur p50/p95/p99 latency batata hai.
+# Result JSON file me save hota hai; --compare se purane run ke saath farak (regression) dikh jaata hai.
+# Chalane ka tareeka: python -m benchmarks.route_benchmark --lots 10000 --reservations 1000000
+"""
+route_benchmark.py
+------------------
+Per-route load test with Flask test clients.
+
+1. Seeds a scaled database (benchmarks/seed.py) in a temporary directory, or
+   reuses --db. The app is built with create_app() against that file.
+2. For each route, --workers threads with their own test client (a seeded
+   user each, or the admin) send --requests requests. Sessions are set
+   directly, so password hashing is not part of any route's numbers.
+3. Reports requests/s and p50/p95/p99/max latency per route and writes them
+   with the dataset and machine details to a JSON file.
+
+`--compare old.json` prints the p95 change per route and exits with status 1
+when any route got slower than --max-regression percent.
+
+    python -m benchmarks.route_benchmark --lots 10000 --users 100000 --reservations 1000000
+    python -m benchmarks.route_benchmark --db big.db --route user_history --compare results/base.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.seed import seed_database
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    """Throughput and latency percentiles (ms) of one route run."""
+    values = sorted(latencies)
+    ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(values) / elapsed, 1) if elapsed else None,
+        'p50_ms': ms(percentile(values, 50)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'max_ms': ms(values[-1] if values else None),
+    }
+
+
+class Worker:
+    """One simulated browser: a test client logged in as one user."""
+
+    def __init__(self, app, user_id, username, role, lot_ids, rng):
+        self.client = app.test_client()
+        self.user_id = user_id
+        self.database = app.config['DATABASE']
+        self.lot_ids = lot_ids
+        self.rng = rng
+        self.pending = []  # reservation id batches for release_multiple
+        with self.client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['username'] = username
+            session['role'] = role
+
+    def active_reservations(self, limit):
+        conn = sqlite3.connect(self.database)
+        try:
+            return [row[0] for row in conn.execute('''
+                SELECT id FROM reservations WHERE user_id = ? AND status = 'active' LIMIT ?
+            ''', (self.user_id, limit))]
+        finally:
+            conn.close()
+
+
+# route name -> (role, request function); a request function returns the response
+def _book(worker):
+    lot_id = worker.rng.choice(worker.lot_ids)
+    return worker.client.post(f'/user/book-parking/{lot_id}', data={
+        'num_spots': '1', 'vehicle_numbers[]': [f'BN{worker.rng.randrange(10 ** 6):06d}']})
+
+
+def _release(worker):
+    ids = worker.pending.pop() if worker.pending else []
+    return worker.client.post('/user/release-multiple', data={'reservation_ids': [str(i) for i in ids]})
+
+
+ROUTES = {
+    'user_dashboard': ('user', lambda worker: worker.client.get('/user/dashboard')),
+    'user_parking_lots': ('user', lambda worker: worker.client.get('/user/parking-lots')),
+    'user_history': ('user', lambda worker: worker.client.get('/user/history')),
+    'user_reports': ('user', lambda worker: worker.client.get('/user/reports')),
+    'book_parking': ('user', _book),
+    'release_multiple': ('user', _release),
+    'admin_dashboard': ('admin', lambda worker: worker.client.get('/admin/dashboard')),
+    'admin_parking_lots': ('admin', lambda worker: worker.client.get('/admin/parking-lots')),
+    'admin_users': ('admin', lambda worker: worker.client.get('/admin/users')),
+    'admin_reports': ('admin', lambda worker: worker.client.get('/admin/reports')),
+}
+
+
+def run_route(workers, request_fn, requests_per_worker):
+    """Run request_fn on every worker concurrently; returns the route summary."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    start_gate = threading.Barrier(len(workers) + 1)
+
+    def loop(worker):
+        mine, failed = [], 0
+        start_gate.wait()
+        for _ in range(requests_per_worker):
+            started = time.perf_counter()
+            response = request_fn(worker)
+            mine.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=loop, args=(worker,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    start_gate.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def load_app(database):
+    """Build the app against `database` after an init-db (adds the admin user), set up like a worker."""
+    from app import create_app, init_db
+    from models.lifecycle import start_worker
+    app = create_app({'DATABASE': database, 'TESTING': True})
+    init_db(database, app.config['PASSWORD_HASH_METHOD'])
+    start_worker(app)
+    return app
+
+
+def run(app, routes, workers, requests_per_worker, seed=0):
+    """Benchmark each route in `routes`; returns {route: summary}."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(app.config['DATABASE'])
+    lot_ids = [row[0] for row in conn.execute('SELECT id FROM parking_lots')]
+    admin = conn.execute("SELECT id, username FROM users WHERE role = 'admin'").fetchone()
+    users = conn.execute("SELECT id, username FROM users WHERE role = 'user'").fetchall()
+    conn.close()
+    users = rng.sample(users, min(workers, len(users)))
+    results = {}
+    for name in routes:
+        role, request_fn = ROUTES[name]
+        pool = [Worker(app, *(admin if role == 'admin' else users[n % len(users)]), role, lot_ids,
+                       random.Random(rng.random())) for n in range(workers)]
+        if name == 'release_multiple':
+            # Give every worker one active reservation per request to release: book them first (not timed)
+            for worker in pool:
+                for _ in range(requests_per_worker):
+                    _book(worker)
+                worker.pending = [[reservation_id] for reservation_id in worker.active_reservations(requests_per_worker)]
+        results[name] = run_route(pool, request_fn, requests_per_worker)
+        print(f"{name:<20} {results[name]['throughput']:>8} req/s  p50 {results[name]['p50_ms']:>8} ms  "
+              f"p95 {results[name]['p95_ms']:>8} ms  p99 {results[name]['p99_ms']:>8} ms"
+              + (f"  ({results[name]['errors']} errors)" if results[name]['errors'] else ''), flush=True)
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """Print the p95 change per route against a previous result file; returns the regressed routes."""
+    regressed = []
+    for name, summary in results.items():
+        before = baseline.get('routes', {}).get(name)
+        if not before or not before.get('p95_ms') or summary['p95_ms'] is None:
+            continue
+        change = (summary['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        flag = ''
+        if change > max_regression:
+            regressed.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<20} p95 {before['p95_ms']:>8} -> {summary['p95_ms']:>8} ms ({change:+.1f}%){flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='benchmark an existing database instead of seeding one')
+    parser.add_argument('--lots', type=int, default=1000)
+    parser.add_argument('--spots-per-lot', type=int, default=50)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--reservations', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=8, help='concurrent clients per route')
+    parser.add_argument('--requests', type=int, default=50, help='requests per worker and route')
+    parser.add_argument('--route', action='append', choices=sorted(ROUTES), help='only these routes (repeatable)')
+    parser.add_argument('--out', help='result file (default benchmarks/results/routes-<time>.json)')
+    parser.add_argument('--compare', help='previous result file to compare p95 latencies with')
+    parser.add_argument('--max-regression', type=float, default=20.0, help='allowed p95 increase in percent')
+    args = parser.parse_args(argv)
+
+    dataset = {'db': args.db}
+    if args.db:
+        database = args.db
+    else:
+        database = os.path.join(tempfile.mkdtemp(prefix='parking-bench-'), 'parking.db')
+        started = time.perf_counter()
+        dataset = seed_database(database, args.lots, args.spots_per_lot, args.users, args.reservations,
+                                seed=args.seed)
+        dataset['seconds'] = round(time.perf_counter() - started, 1)
+        print(f'Seeded {database}: {dataset}', flush=True)
+
+    app = load_app(database)
+    routes = args.route or list(ROUTES)
+    results = run(app, routes, args.workers, args.requests, args.seed)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                    'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'dataset': dataset,
+        'workers': args.workers,
+        'requests_per_worker': args.requests,
+        'routes': results,
+    }
+    out = args.out or os.path.join('benchmarks', 'results', f"routes-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {out}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.max_regression)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
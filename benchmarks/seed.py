@@ -0,0 +1,245 @@
+# Yeh seed.py hai. Capacity planning aur benchmarks ke liye ek bada, realistic parking database banata hai:
+# hazaaron lots, laakhon users aur crore tak reservations. Same --seed dene pe bilkul same database banta hai.
+# Data NumPy se ek saath (vectorized) banta hai aur bade batches me likha jaata hai; password hash sirf ek baar banta hai.
+# Chalane ka tareeka: python -m benchmarks.seed big.db --lots 5000 --users 200000 --reservations 10000000
+"""
+seed.py
+-------
+Synthetic parking.db generator for capacity planning and the benchmarks.
+
+The file gets the normal schema (models.schema.migrate, same as init_db) and:
+
+- lots with lognormal popularity; busier lots are pricier;
+- users with a skewed activity (a few regulars park far more often than the
+  rest), each with one vehicle number;
+- completed reservations laid out per spot, back to back, so one spot never
+  holds two overlapping reservations. Dwell times are lognormal (median
+  about 2 hours); arrival times follow an hourly weekday/weekend profile
+  (morning and evening peaks, quiet nights);
+- `occupancy` of the spots currently taken by an active reservation.
+
+All random draws come from one numpy Generator(seed), so a seed always gives
+the same database. Rows are generated in memory (about 40 bytes per
+reservation), sorted by arrival so ids grow with time like in production, and
+written in `batch_size` transactions with journaling and sync off and the
+reservation indexes dropped; indexes, lot counters and report rollups are
+rebuilt at the end. Every user's password is SEED_PASSWORD, hashed once.
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+from models.counters import rebuild_lot_counters
+from models.db import connect
+from models.passwords import DEFAULT_HASH_METHOD
+from models.rollups import rebuild_rollups
+from models.schema import migrate
+from models.spots import provision_spots
+from models.timestamps import to_epoch
+
+SEED_PASSWORD = 'password'
+DEFAULT_BATCH_SIZE = 500000
+DEFAULT_OCCUPANCY = 0.35
+
+# Relative arrival rate for each hour of the day (weekdays); weekends are flatter and lower
+WEEKDAY_ARRIVALS = np.array([1, 0.5, 0.3, 0.3, 0.5, 1.5, 4, 9, 12, 10, 7, 6,
+                             6.5, 6, 5.5, 6, 7.5, 10, 11, 8, 5, 3.5, 2.5, 1.5])
+WEEKEND_ARRIVALS = np.array([1.5, 1, 0.5, 0.3, 0.3, 0.5, 1, 2, 3.5, 5.5, 7, 7.5,
+                             7.5, 7, 7, 7, 7, 6.5, 6, 5.5, 4.5, 3.5, 2.5, 2])
+
+# Only while seeding: the file is new, so a crash just means seeding again
+LOAD_PRAGMAS = (
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA cache_size = -262144',
+    'PRAGMA temp_store = MEMORY',
+)
+
+
+def _arrival_clock(start, hours):
+    """Map evenly spread seconds onto real seconds so arrivals follow the hourly profile.
+
+    Returns (even_edges, real_edges) for np.interp: the cumulative arrival rate
+    at each hour boundary, scaled to the window length, against the boundary
+    itself. The map is monotonic, so back-to-back reservations stay in order.
+    """
+    hour_of_day = (start.hour + np.arange(hours)) % 24
+    weekday = (start.weekday() + (start.hour + np.arange(hours)) // 24) % 7
+    rate = np.where(weekday < 5, WEEKDAY_ARRIVALS[hour_of_day], WEEKEND_ARRIVALS[hour_of_day])
+    real_edges = np.arange(hours + 1) * 3600.0
+    even_edges = np.concatenate(([0.0], np.cumsum(rate)))
+    return even_edges / even_edges[-1] * real_edges[-1], real_edges
+
+
+def _timestamps(start, seconds):
+    """Epoch-second timestamps (as stored by the app) for offsets in seconds from start."""
+    return (to_epoch(start) + seconds.astype(np.int64)).tolist()
+
+
+def _insert_batched(conn, sql, rows, total, batch_size, progress, label):
+    """executemany(sql, rows(batch)) for consecutive slices of range(total), one transaction each."""
+    for offset in range(0, total, batch_size):
+        batch = slice(offset, min(offset + batch_size, total))
+        conn.execute('BEGIN')
+        conn.executemany(sql, rows(batch))
+        conn.commit()
+        progress(f'{label}: {batch.stop}/{total}')
+
+
+def seed_database(path, lots=100, spots_per_lot=50, users=1000, reservations=100000, occupancy=DEFAULT_OCCUPANCY,
+                  days=90, seed=0, password_method=DEFAULT_HASH_METHOD, batch_size=DEFAULT_BATCH_SIZE,
+                  now=None, progress=lambda message: None):
+    """Create and fill a synthetic database at `path` (must be new or empty); returns the row counts.
+
+    History ends at `now` (default: the current time); pass it too for a byte-identical rerun.
+    """
+    rng = np.random.default_rng(seed)
+    conn = connect(path)
+    migrate(conn)
+    if conn.execute('SELECT COUNT(*) FROM parking_lots').fetchone()[0]:
+        conn.close()
+        raise ValueError(f'{path} already has parking lots; seed into a new file')
+    for pragma in LOAD_PRAGMAS:
+        conn.execute(pragma)
+
+    # Lots: popularity decides how often their spots turn over, and the price
+    popularity = rng.lognormal(0, 0.6, lots)
+    prices = np.round(np.clip(20 * popularity, 10, 150) / 5) * 5
+    conn.execute('BEGIN')
+    conn.executemany('''
+        INSERT INTO parking_lots (prime_location_name, price, address, pin_code, maximum_number_of_spots)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(f'Lot {n}', float(prices[n - 1]), f'{n} Synthetic Road', f'{110001 + n % 899:06d}', spots_per_lot)
+          for n in range(1, lots + 1)])
+    lot_ids = [row[0] for row in conn.execute('SELECT id FROM parking_lots ORDER BY id')]
+    cursor = conn.cursor()
+    for lot_id in lot_ids:
+        provision_spots(cursor, lot_id, spots_per_lot)
+    conn.commit()
+    spot_ids = np.array([row[0] for row in conn.execute('SELECT id FROM parking_spots ORDER BY lot_id, id')])
+    spot_lot = np.repeat(np.arange(lots), spots_per_lot)
+    spot_count = len(spot_ids)
+    progress(f'lots: {lots}, spots: {spot_count}')
+
+    # Users: one shared password hash, a vehicle each, and a skewed share of the reservations
+    password = generate_password_hash(SEED_PASSWORD, password_method)
+    first_user = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+    plates = [f'{("MH", "DL", "KA", "TN", "UP")[n % 5]}{n % 50 + 1:02d}{chr(65 + n // 50 % 26)}{chr(65 + n // 1300 % 26)}'
+              f'{n % 9973:04d}' for n in range(users)]
+    _insert_batched(conn, '''
+        INSERT INTO users (id, username, email, password, full_name, address, pin_code, mobile)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', lambda batch: ((first_user + n, f'user{n}', f'user{n}@example.com', password, f'User {n}',
+                         f'{n % 500 + 1} Residency Lane', f'{110001 + n % 899:06d}', f'9{n:09d}')
+                        for n in range(batch.start, batch.stop)), users, batch_size, progress, 'users')
+    user_weights = rng.lognormal(0, 1.2, users)
+    user_weights /= user_weights.sum()
+
+    # Completed reservations, back to back per spot on an evenly spread clock
+    now = (now or datetime.now()).replace(microsecond=0)
+    start = (now - timedelta(days=days)).replace(minute=0, second=0)
+    window = (now - start).total_seconds()
+    spot_weights = popularity[spot_lot] / popularity[spot_lot].sum()
+    per_spot = rng.multinomial(reservations, spot_weights)
+    spot_of = np.repeat(np.arange(spot_count), per_spot)
+    dwell = np.clip(rng.lognormal(np.log(2 * 3600), 0.8, reservations), 300, 72 * 3600)
+    mean_gap = np.maximum(window / np.maximum(per_spot, 1) - dwell.mean(), 600)
+    step = rng.exponential(1.0, reservations) * mean_gap[spot_of] + dwell
+    ends = np.cumsum(step)
+    used = per_spot > 0
+    first = (np.cumsum(per_spot) - per_spot)[used]
+    offset = np.zeros(spot_count)
+    offset[used] = ends[first] - step[first]
+    ends -= np.repeat(offset, per_spot)
+    starts = ends - dwell
+    # Spots with more reservations than fit are squeezed so their last one ends an hour before now
+    even_edges, real_edges = _arrival_clock(start, int(np.ceil(window / 3600)))
+    limit = np.interp(window - 3600, real_edges, even_edges)
+    last = np.zeros(spot_count)
+    last[used] = ends[first + per_spot[used] - 1]
+    squeeze = np.minimum(1.0, limit / np.maximum(last, 1))[spot_of]
+    starts = np.interp(starts * squeeze, even_edges, real_edges)
+    ends = np.interp(ends * squeeze, even_edges, real_edges)
+    last_end = np.zeros(spot_count)
+    np.maximum.at(last_end, spot_of, ends)
+    del step, dwell, squeeze, last, offset
+
+    order = np.argsort(starts, kind='stable')
+    starts, ends, spot_of = starts[order], ends[order], spot_of[order]
+    del order
+    user_of = rng.choice(users, reservations, p=user_weights)
+    starts, ends = np.floor(starts), np.floor(ends)
+    costs = (ends - starts) / 3600 * prices[spot_lot[spot_of]]
+
+    # Reservation indexes are rebuilt once at the end, which is much faster than row by row
+    indexes = conn.execute('''
+        SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'reservations' AND sql IS NOT NULL
+    ''').fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX {name}')
+    _insert_batched(conn, '''
+        INSERT INTO reservations (spot_id, user_id, vehicle_number, parking_timestamp,
+                                  leaving_timestamp, parking_cost, status)
+        VALUES (?, ?, ?, ?, ?, ?, 'completed')
+    ''', lambda batch: zip(spot_ids[spot_of[batch]].tolist(), (user_of[batch] + first_user).tolist(),
+                           [plates[n] for n in user_of[batch].tolist()], _timestamps(start, starts[batch]),
+                           _timestamps(start, ends[batch]), costs[batch].round(2).tolist()),
+       reservations, batch_size, progress, 'completed reservations')
+    del starts, ends, spot_of, user_of, costs
+
+    # Active reservations: parked after the spot's last completed one, still there now
+    taken = np.sort(rng.choice(spot_count, int(round(occupancy * spot_count)), replace=False))
+    parked_for = np.minimum(rng.lognormal(np.log(3600), 0.9, len(taken)), window - last_end[taken])
+    parked = np.floor(window - parked_for)
+    active_users = rng.choice(users, len(taken), p=user_weights)
+    conn.execute('BEGIN')
+    conn.executemany('''
+        INSERT INTO reservations (spot_id, user_id, vehicle_number, parking_timestamp) VALUES (?, ?, ?, ?)
+    ''', zip(spot_ids[taken].tolist(), (active_users + first_user).tolist(),
+             [plates[n] for n in active_users.tolist()], _timestamps(start, parked)))
+    conn.executemany("UPDATE parking_spots SET status = 'O' WHERE id = ?", ((spot_id,) for spot_id in spot_ids[taken].tolist()))
+    conn.commit()
+
+    progress('rebuilding indexes, counters and rollups')
+    conn.execute('BEGIN')
+    for _, sql in indexes:
+        conn.execute(sql)
+    rebuild_lot_counters(cursor)
+    rebuild_rollups(cursor)
+    conn.commit()
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.close()
+    return {'lots': lots, 'spots': spot_count, 'users': users,
+            'reservations': reservations + len(taken), 'active': len(taken)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='database file to create')
+    parser.add_argument('--lots', type=int, default=1000)
+    parser.add_argument('--spots-per-lot', type=int, default=100)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--reservations', type=int, default=1000000, help='completed reservations')
+    parser.add_argument('--occupancy', type=float, default=DEFAULT_OCCUPANCY, help='share of spots taken right now')
+    parser.add_argument('--days', type=int, default=90, help='history length')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='rows per transaction')
+    parser.add_argument('--password-method', default=DEFAULT_HASH_METHOD)
+    parser.add_argument('--now', type=datetime.fromisoformat, help='end of the history (default: current time)')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    log = lambda message: print(f'[{time.perf_counter() - started:7.1f}s] {message}', flush=True)
+    counts = seed_database(args.path, args.lots, args.spots_per_lot, args.users, args.reservations, args.occupancy,
+                           args.days, args.seed, args.password_method, args.batch_size, args.now, log)
+    log(f'done: {counts}')
+    print(f"Every user's password is '{SEED_PASSWORD}'. Add the admin account with "
+          f"`PARKING_DB={args.path} flask --app app init-db`.")
+
+
+if __name__ == '__main__':
+    main()
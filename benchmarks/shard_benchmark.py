@@ -0,0 +1,150 @@
+# Yeh shard_benchmark.py hai. Booking + release ka write throughput alag-alag SHARD_COUNT pe naapta hai:
+# kai processes ek saath random lots pe spot book karke turant release karte hain, jaise rush hour me hota hai.
+# Ek file me sab writers ek hi write lock ke liye line lagate hain; shards me har file ka apna lock hai.
+# Chalane ka tareeka: python -m benchmarks.shard_benchmark --shards 0,2,4 --writers 8 --seconds 10
+"""
+shard_benchmark.py
+------------------
+Write throughput of bookings and releases per shard count.
+
+For every value of --shards, a fresh database is set up in a temporary
+directory with app.init_db() (0 = the single-file layout) and --lots lots
+are created in their shards (models/shards.py). Then --writers processes
+each loop for --seconds: pick a random lot, book one spot there with
+book_spots() on that lot's shard and release it with release_reservations(),
+two write transactions per cycle. Reports transactions/s and p50/p95/p99
+latency per transaction for each shard count and writes them as JSON to
+benchmarks/results/.
+
+Sharding only helps while writers wait on one file's lock: with fewer cores
+than writers the CPU is the limit and the shard counts come out close.
+
+    python -m benchmarks.shard_benchmark --shards 0,2,4 --writers 8 --seconds 10
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from app import init_db
+from benchmarks.route_benchmark import summarize
+from models.db import DatabaseBusy, connect
+from models.reservations import AllocationError, book_spots, release_reservations
+from models.shards import shard_paths
+from models.spots import provision_spots
+
+BENCH_PASSWORD_METHOD = 'pbkdf2:sha256:1000'
+LOT_SQL = '''
+    INSERT INTO parking_lots (id, prime_location_name, price, address, pin_code,
+                              maximum_number_of_spots, available_spots, occupied_spots)
+    VALUES (?, ?, 10.0, 'Bench Road', '000000', ?, ?, 0)
+'''
+
+
+def setup(directory, shards, lots, spots_per_lot):
+    """A new database with `lots` lots placed in their shards; returns (user id, storage paths)."""
+    path = os.path.join(directory, f'shards{shards}.db')
+    paths = shard_paths(path, shards)
+    init_db(path, BENCH_PASSWORD_METHOD, paths)
+    conn = connect(path)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (username, email, password, full_name) VALUES ('bench', 'bench@x', '-', 'Bench')")
+    user_id = cursor.lastrowid
+    shard_conns = [connect(shard) for shard in paths]
+    for lot_id in range(1, lots + 1):
+        row = (lot_id, f'Lot {lot_id}', spots_per_lot, spots_per_lot)
+        # Catalogue row in the directory; the shard keeps its own copy with the counters
+        cursor.execute(LOT_SQL, row)
+        shard = shard_conns[lot_id % shards] if shards else conn
+        if shard is not conn:
+            shard.execute(LOT_SQL, row)
+        provision_spots(shard.cursor(), lot_id, spots_per_lot)
+    for storage in [conn] + shard_conns:
+        storage.commit()
+        storage.close()
+    return user_id, paths or [path]
+
+
+def _writer(paths, user_id, lots, seconds, seed, results):
+    conns = [connect(path) for path in paths]
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        lot_id = rng.randint(1, lots)
+        conn = conns[lot_id % len(conns)]
+        try:
+            started = time.perf_counter()
+            booked = book_spots(conn, lot_id, user_id, ['BENCH'])
+            latencies.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            release_reservations(conn, user_id, [booked[0][0]])
+            latencies.append(time.perf_counter() - started)
+        except (AllocationError, DatabaseBusy):
+            errors += 1
+    for conn in conns:
+        conn.close()
+    results.put((latencies, errors))
+
+
+def run(directory, shards, writers, seconds, lots, spots_per_lot):
+    """Transactions/s and latency of `writers` processes booking and releasing for `seconds`."""
+    user_id, paths = setup(directory, shards, lots, spots_per_lot)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_writer, args=(paths, user_id, lots, seconds, seed, results))
+                 for seed in range(writers)]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    summary = summarize([latency for latencies, _ in collected for latency in latencies],
+                        sum(errors for _, errors in collected), elapsed)
+    summary['shards'] = shards
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', default='0,2,4', help='comma-separated shard counts (0 = single file)')
+    parser.add_argument('--writers', type=int, default=8, help='concurrent writer processes')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--lots', type=int, default=64)
+    parser.add_argument('--spots-per-lot', type=int, default=50)
+    parser.add_argument('--out', help='result file (default benchmarks/results/shards-<time>.json)')
+    args = parser.parse_args(argv)
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix='parking-shards-') as directory:
+        for shards in (int(value) for value in args.shards.split(',')):
+            result = run(directory, shards, args.writers, args.seconds, args.lots, args.spots_per_lot)
+            runs.append(result)
+            print(f"shards {shards:<3} {result['throughput']:>9} tx/s  p50 {result['p50_ms']:>8} ms  "
+                  f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  busy {result['errors']}")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'writers': args.writers,
+        'seconds': args.seconds,
+        'lots': args.lots,
+        'spots_per_lot': args.spots_per_lot,
+        'runs': runs,
+    }
+    out = args.out or os.path.join('benchmarks', 'results', f"shards-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# Yeh startup_benchmark.py hai. Ek naya (cold) worker process boot hone me kitna time leta hai, yeh naapta hai:
+# app import, create_app(), per-worker setup (schema check, allocator) aur pehli request, har ek alag.
+# Har run ek bilkul naye Python process me hota hai, taaki import cache ka fayda na mile.
+# Chalane ka tareeka: python -m benchmarks.startup_benchmark --runs 10 [--db big.db] [--warm-allocator]
+"""
+startup_benchmark.py
+--------------------
+Cold worker boot time, phase by phase.
+
+Each run starts a fresh Python interpreter that imports app.py, calls
+create_app(), runs the per-worker setup (models.lifecycle.start_worker) and
+serves one request for `/`, timing every phase. The parent also times the
+whole process from spawn to exit. Reports median/p95 per phase over --runs and
+writes them as JSON to benchmarks/results/.
+
+Without --db, a small database is seeded in a temporary directory. Use
+--warm-allocator to include loading every lot's spots (SPOT_ALLOCATOR_WARM).
+
+    python -m benchmarks.startup_benchmark --runs 10
+    python -m benchmarks.startup_benchmark --db big.db --warm-allocator
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.route_benchmark import percentile
+from benchmarks.seed import seed_database
+
+PHASES = ('import', 'create_app', 'worker_start', 'first_request', 'process')
+
+# Runs in the fresh interpreter: prints the phase timings as JSON
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+from models.lifecycle import start_worker
+imported = time.perf_counter()
+app = create_app({'DATABASE': sys.argv[1], 'SPOT_ALLOCATOR_WARM': sys.argv[2] == '1', 'SECRET_KEY': 'benchmark'})
+created = time.perf_counter()
+start_worker(app)
+worker = time.perf_counter()
+status = app.test_client().get('/').status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'worker_start': worker - created, 'first_request': served - worker, 'status': status}))
+'''
+
+
+def boot(database, warm_allocator=False):
+    """Boot one cold worker process; returns its phase timings in seconds."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD, database, '1' if warm_allocator else '0'],
+                            cwd=root, capture_output=True, text=True, check=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings['process'] = time.perf_counter() - started
+    if timings.pop('status') != 200:
+        raise RuntimeError(f'First request failed on {database}')
+    return timings
+
+
+def run(database, runs, warm_allocator=False):
+    """Median/p95/max per phase (ms) over `runs` cold boots."""
+    samples = [boot(database, warm_allocator) for _ in range(runs)]
+    summary = {}
+    for phase in PHASES:
+        values = sorted(sample[phase] for sample in samples)
+        summary[phase] = {'p50_ms': round(percentile(values, 50) * 1000, 1),
+                          'p95_ms': round(percentile(values, 95) * 1000, 1),
+                          'max_ms': round(values[-1] * 1000, 1)}
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='boot against an existing (migrated) database')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--warm-allocator', action='store_true', help='load every lot at worker start')
+    parser.add_argument('--out', help='result file (default benchmarks/results/startup-<time>.json)')
+    args = parser.parse_args(argv)
+
+    database = args.db
+    if not database:
+        database = os.path.join(tempfile.mkdtemp(prefix='parking-startup-'), 'parking.db')
+        seed_database(database, lots=100, spots_per_lot=50, users=1000, reservations=10000)
+    results = run(database, args.runs, args.warm_allocator)
+    for phase in PHASES:
+        print(f"{phase:<14} p50 {results[phase]['p50_ms']:>8} ms  p95 {results[phase]['p95_ms']:>8} ms  "
+              f"max {results[phase]['max_ms']:>8} ms")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'db': args.db,
+        'runs': args.runs,
+        'warm_allocator': args.warm_allocator,
+        'phases': results,
+    }
+    out = args.out or os.path.join('benchmarks', 'results', f"startup-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,27 @@
 # Jaise dashboard, users, parking lots, reports, sab kuch yahin handle hota hai.
 # Agar admin ka koi naya feature banana hai toh yahin function add karo.
 # Neeche har function ke upar bhi simple comments milenge.
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-import sqlite3
-from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, Response
+from datetime import datetime, timedelta
+
+from models.db import get_db, write_transaction
+from models.spots import lot_size_error, provision_spots, resize_lot
+from models.allocator import get_allocator
+from models.pagination import page_size, split_page
+from models.exports import FORMATS, ExportFilterError, parse_filters, stream_export
+from models.rollups import daily_revenue, lot_revenue
+from models.analytics import DEFAULT_WINDOW_DAYS, combine, get_analytics, occupancy_report
+from models.cache import cached_page, get_cache, lot_availability
+from models.feed import get_feed, spots_changed
+from models.jobs import JOBS, configured_jobs, get_scheduler, job_overview, run_soon
+from models.metrics import get_metrics
+from models.passwords import get_verifier
+from models.tokens import find_token_user
+from models.repository import (active_reservation_count, get_lot, get_users, spot_page, user_page,
+                               user_role_counts)
+from models.shards import fan_out, get_router, lot_db, lot_dbs, merge_newest, sum_rows
+from models.snapshot import report_db, report_fan_out, report_freshness, report_lots, report_sources
+from models.timestamps import now_epoch
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -22,35 +40,23 @@ def admin_required(f):
 @admin_bp.route('/admin/dashboard')
 @admin_required
 def admin_dashboard():
-    conn = sqlite3.connect('parking.db')
-    cursor = conn.cursor()
-    
-    # Get parking lots with spot counts
-    cursor.execute('''
-        SELECT pl.*, 
-               COUNT(ps.id) as total_spots,
-               SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END) as available_spots,
-               SUM(CASE WHEN ps.status = 'O' THEN 1 ELSE 0 END) as occupied_spots
-        FROM parking_lots pl
-        LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
-        GROUP BY pl.id
-    ''')
-    parking_lots = cursor.fetchall()
+    # Get parking lots with their maintained spot counters (cached, see models/cache.py)
+    parking_lots = lot_availability().rows
     
-    # Get recent parking history
-    cursor.execute('''
-        SELECT r.id, u.full_name, pl.prime_location_name, ps.id as spot_id,
+    # Get recent parking history: newest 10 of every shard, merged, then the users' names in one lookup
+    recent = merge_newest(fan_out(lambda conn: conn.execute('''
+        SELECT r.id, r.user_id, pl.prime_location_name, ps.id as spot_id,
                r.parking_timestamp, r.leaving_timestamp, r.parking_cost
         FROM reservations r
-        JOIN users u ON r.user_id = u.id
         JOIN parking_spots ps ON r.spot_id = ps.id
         JOIN parking_lots pl ON ps.lot_id = pl.id
         ORDER BY r.parking_timestamp DESC
         LIMIT 10
-    ''')
-    recent_history = cursor.fetchall()
-    
-    conn.close()
+    ''').fetchall()), key=lambda row: row['parking_timestamp'], limit=10)
+    users = get_users(get_db().cursor(), {row['user_id'] for row in recent})
+    # The rows with the parker's name added (deleted users are skipped)
+    recent_history = [{**dict(row), 'full_name': users[row['user_id']].full_name}
+                      for row in recent if row['user_id'] in users]
     
     return render_template('admin/dashboard.html', 
                          parking_lots=parking_lots, 
@@ -59,22 +65,10 @@ def admin_dashboard():
 @admin_bp.route('/admin/parking-lots')
 @admin_required
 def admin_parking_lots():
-    conn = sqlite3.connect('parking.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT pl.*, 
-               COUNT(ps.id) as total_spots,
-               SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END) as available_spots,
-               SUM(CASE WHEN ps.status = 'O' THEN 1 ELSE 0 END) as occupied_spots
-        FROM parking_lots pl
-        LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
-        GROUP BY pl.id
-    ''')
-    parking_lots = cursor.fetchall()
-    
-    conn.close()
-    return render_template('admin/parking_lots.html', parking_lots=parking_lots)
+    # Cached page with ETag/Last-Modified: an unchanged listing is answered with 304
+    snapshot = lot_availability()
+    return cached_page('admin_parking_lots', snapshot,
+                       lambda: render_template('admin/parking_lots.html', parking_lots=snapshot.rows))
 
 @admin_bp.route('/admin/add-parking-lot', methods=['GET', 'POST'])
 @admin_required
@@ -85,27 +79,50 @@ def add_parking_lot():
         address = request.form['address']
         pin_code = request.form['pin_code']
         maximum_number_of_spots = int(request.form['maximum_number_of_spots'])
+        entrance_index = int(request.form.get('entrance_index') or 0)
         
-        conn = sqlite3.connect('parking.db')
-        cursor = conn.cursor()
-        
-        # Insert parking lot
-        cursor.execute('''
-            INSERT INTO parking_lots (prime_location_name, price, address, pin_code, maximum_number_of_spots)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (prime_location_name, price, address, pin_code, maximum_number_of_spots))
+        error = lot_size_error(maximum_number_of_spots)
+        if error:
+            flash(error, 'error')
+            return redirect(url_for('admin.add_parking_lot'))
         
-        lot_id = cursor.lastrowid
+        conn = get_db()
+        lot_row = (prime_location_name, price, address, pin_code, maximum_number_of_spots, maximum_number_of_spots,
+                   entrance_index)
         
-        # Create parking spots
-        for i in range(maximum_number_of_spots):
+        def add_lot(cursor):
+            # Insert parking lot (the catalogue row gives the lot its id)
             cursor.execute('''
-                INSERT INTO parking_spots (lot_id, status)
-                VALUES (?, 'A')
-            ''', (lot_id,))
+                INSERT INTO parking_lots (prime_location_name, price, address, pin_code, maximum_number_of_spots,
+                                          available_spots, occupied_spots, entrance_index)
+                VALUES (?, ?, ?, ?, ?, ?, 0, ?)
+            ''', lot_row)
+            lot_id = cursor.lastrowid
+            shard = lot_db(lot_id)
+            if shard is conn:
+                provision_spots(cursor, lot_id, maximum_number_of_spots)
+                return lot_id
+            
+            # With sharded storage the lot's shard gets its own copy of the row, with the counters and the spots.
+            # It commits while the catalogue row is still uncommitted: if the shard write fails, the catalogue
+            # rolls back too. Rows the shard already has under this new id are left from an add that stopped
+            # between the two commits, so they are replaced.
+            def add_copy(shard_cursor):
+                shard_cursor.execute('DELETE FROM parking_spots WHERE lot_id = ?', (lot_id,))
+                shard_cursor.execute('DELETE FROM parking_lots WHERE id = ?', (lot_id,))
+                shard_cursor.execute('''
+                    INSERT INTO parking_lots (id, prime_location_name, price, address, pin_code,
+                                              maximum_number_of_spots, available_spots, occupied_spots, entrance_index)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)
+                ''', (lot_id, *lot_row))
+                # Create all parking spots in one bulk insert
+                provision_spots(shard_cursor, lot_id, maximum_number_of_spots)
+            
+            write_transaction(shard, add_copy)
+            return lot_id
         
-        conn.commit()
-        conn.close()
+        lot_id = write_transaction(conn, add_lot)
+        spots_changed([lot_id])
         
         flash('Parking lot added successfully!', 'success')
         return redirect(url_for('admin.admin_parking_lots'))
@@ -115,7 +132,8 @@ def add_parking_lot():
 @admin_bp.route('/admin/edit-parking-lot/<int:lot_id>', methods=['GET', 'POST'])
 @admin_required
 def edit_parking_lot(lot_id):
-    conn = sqlite3.connect('parking.db')
+    # Spots and counters live in the lot's shard (the directory itself when not sharded)
+    conn = lot_db(lot_id)
     cursor = conn.cursor()
     
     if request.method == 'POST':
@@ -124,45 +142,43 @@ def edit_parking_lot(lot_id):
         address = request.form['address']
         pin_code = request.form['pin_code']
         maximum_number_of_spots = int(request.form['maximum_number_of_spots'])
+        entrance_index = int(request.form.get('entrance_index') or 0)
         
-        # Check if any spots are occupied
-        cursor.execute('''
-            SELECT COUNT(*) FROM parking_spots 
-            WHERE lot_id = ? AND status = 'O'
-        ''', (lot_id,))
-        occupied_spots = cursor.fetchone()[0]
-        
-        if occupied_spots > 0:
-            flash('Cannot edit parking lot with occupied spots', 'error')
+        lot = get_lot(cursor, lot_id)
+        if not lot:
+            flash('Parking lot not found', 'error')
             return redirect(url_for('admin.admin_parking_lots'))
+        error = lot_size_error(maximum_number_of_spots)
+        if error:
+            flash(error, 'error')
+            return redirect(url_for('admin.edit_parking_lot', lot_id=lot_id))
         
-        # Update parking lot
-        cursor.execute('''
-            UPDATE parking_lots 
-            SET prime_location_name = ?, price = ?, address = ?, pin_code = ?, maximum_number_of_spots = ?
-            WHERE id = ?
-        ''', (prime_location_name, price, address, pin_code, maximum_number_of_spots, lot_id))
+        # Only add or remove the difference; a metadata-only edit leaves the spots alone
+        if maximum_number_of_spots != lot.maximum_number_of_spots:
+            error = resize_lot(cursor, lot_id, maximum_number_of_spots)
+            if error:
+                conn.rollback()
+                flash(error, 'error')
+                return redirect(url_for('admin.edit_parking_lot', lot_id=lot_id))
         
-        # Delete existing spots
-        cursor.execute('DELETE FROM parking_spots WHERE lot_id = ?', (lot_id,))
-        
-        # Create new spots
-        for i in range(maximum_number_of_spots):
-            cursor.execute('''
-                INSERT INTO parking_spots (lot_id, status)
-                VALUES (?, 'A')
-            ''', (lot_id,))
-        
-        conn.commit()
-        conn.close()
+        # Update parking lot (catalogue and, when sharded, the shard's copy)
+        for lot_conn in lot_dbs(lot_id):
+            lot_conn.execute('''
+                UPDATE parking_lots 
+                SET prime_location_name = ?, price = ?, address = ?, pin_code = ?, maximum_number_of_spots = ?,
+                    entrance_index = ?
+                WHERE id = ?
+            ''', (prime_location_name, price, address, pin_code, maximum_number_of_spots, entrance_index, lot_id))
+            lot_conn.commit()
+        # Spots or entrance may have changed: the allocator reloads this lot on its next booking
+        get_allocator().invalidate(lot_id)
+        spots_changed([lot_id])
         
         flash('Parking lot updated successfully!', 'success')
         return redirect(url_for('admin.admin_parking_lots'))
     
     # Get parking lot details
-    cursor.execute('SELECT * FROM parking_lots WHERE id = ?', (lot_id,))
-    parking_lot = cursor.fetchone()
-    conn.close()
+    parking_lot = get_lot(cursor, lot_id)
     
     if not parking_lot:
         flash('Parking lot not found', 'error')
@@ -173,29 +189,36 @@ def edit_parking_lot(lot_id):
 @admin_bp.route('/admin/delete-parking-lot/<int:lot_id>', methods=['POST'])
 @admin_required
 def delete_parking_lot(lot_id):
-    conn = sqlite3.connect('parking.db')
-    cursor = conn.cursor()
-    
-    # Check if any spots are occupied
-    cursor.execute('''
-        SELECT COUNT(*) FROM parking_spots 
-        WHERE lot_id = ? AND status = 'O'
-    ''', (lot_id,))
-    occupied_spots = cursor.fetchone()[0]
-    
-    if occupied_spots > 0:
+    conn = lot_db(lot_id)
+    directory = get_db()
+    
+    def delete_lot(cursor):
+        # The occupied check and the delete hold the shard's write lock together, so no booking lands in between
+        lot = get_lot(cursor, lot_id)
+        if lot and lot.occupied_spots > 0:
+            return False
+        cursor.execute('DELETE FROM parking_spots WHERE lot_id = ?', (lot_id,))
+        cursor.execute('DELETE FROM parking_lots WHERE id = ?', (lot_id,))
+        return True
+    
+    def delete_everywhere(directory_cursor):
+        # With sharded storage the shard commits first, inside the catalogue's transaction: a catalogue row
+        # is only removed once the lot is gone from the shard that lists and books it
+        deleted = write_transaction(conn, delete_lot)
+        if deleted:
+            directory_cursor.execute('DELETE FROM parking_lots WHERE id = ?', (lot_id,))
+        return deleted
+    
+    if directory is conn:
+        deleted = write_transaction(conn, delete_lot)
+    else:
+        deleted = write_transaction(directory, delete_everywhere)
+    if not deleted:
         flash('Cannot delete parking lot with occupied spots', 'error')
-        conn.close()
         return redirect(url_for('admin.admin_parking_lots'))
     
-    # Delete parking spots
-    cursor.execute('DELETE FROM parking_spots WHERE lot_id = ?', (lot_id,))
-    
-    # Delete parking lot
-    cursor.execute('DELETE FROM parking_lots WHERE id = ?', (lot_id,))
-    
-    conn.commit()
-    conn.close()
+    get_allocator().invalidate(lot_id)
+    spots_changed([lot_id])
     
     flash('Parking lot deleted successfully!', 'success')
     return redirect(url_for('admin.admin_parking_lots'))
@@ -203,38 +226,41 @@ def delete_parking_lot(lot_id):
 @admin_bp.route('/admin/users')
 @admin_required
 def admin_users():
-    conn = sqlite3.connect('parking.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT id, username, email, full_name, mobile, role FROM users WHERE role != "admin"')
-    users = cursor.fetchall()
+    # Keyset page: users after the last id shown on the previous page
+    size = page_size()
+    after = request.args.get('after', 0, type=int)
+    users, has_next = split_page(user_page(cursor, after, size + 1), size)
+    
+    # Counts over all accounts (not just this page), only on the first page
+    user_count = admin_count = regular_count = None
+    if not after:
+        admin_count, regular_count = user_role_counts(cursor)
+        user_count = admin_count + regular_count
     
-    conn.close()
-    return render_template('admin/users.html', users=users)
+    return render_template('admin/users.html', users=users, has_next=has_next,
+                         is_first_page=not after, user_count=user_count,
+                         admin_count=admin_count, regular_count=regular_count)
 
 @admin_bp.route('/admin/delete-user/<int:user_id>', methods=['POST'])
 @admin_required
 def delete_user(user_id):
-    conn = sqlite3.connect('parking.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    # Check if user has active reservations
-    cursor.execute('''
-        SELECT COUNT(*) FROM reservations 
-        WHERE user_id = ? AND status = 'active'
-    ''', (user_id,))
-    active_reservations = cursor.fetchone()[0]
+    # Check if user has active reservations (in any shard)
+    active_reservations, = sum_rows(fan_out(lambda shard: (active_reservation_count(shard.cursor(), user_id),)))
     
     if active_reservations > 0:
         flash('Cannot delete user with active reservations', 'error')
-        conn.close()
         return redirect(url_for('admin.admin_users'))
     
     # Delete user
     cursor.execute('DELETE FROM users WHERE id = ? AND role != "admin"', (user_id,))
     
     conn.commit()
-    conn.close()
     
     flash('User deleted successfully!', 'success')
     return redirect(url_for('admin.admin_users'))
@@ -242,39 +268,32 @@ def delete_user(user_id):
 @admin_bp.route('/admin/parking-spots/<int:lot_id>')
 @admin_required
 def view_parking_spots(lot_id):
-    conn = sqlite3.connect('parking.db')
+    conn = lot_db(lot_id)
     cursor = conn.cursor()
     
     # Get parking lot details
-    cursor.execute('SELECT * FROM parking_lots WHERE id = ?', (lot_id,))
-    parking_lot = cursor.fetchone()
+    parking_lot = get_lot(cursor, lot_id)
     
     if not parking_lot:
         flash('Parking lot not found', 'error')
-        conn.close()
         return redirect(url_for('admin.admin_parking_lots'))
     
-    # Get parking spots with reservation details
-    cursor.execute('''
-        SELECT ps.*, r.vehicle_number, r.parking_timestamp, u.full_name
-        FROM parking_spots ps
-        LEFT JOIN reservations r ON ps.id = r.spot_id AND r.status = 'active'
-        LEFT JOIN users u ON r.user_id = u.id
-        WHERE ps.lot_id = ?
-        ORDER BY ps.id
-    ''', (lot_id,))
-    parking_spots = cursor.fetchall()
-    
-    conn.close()
+    # Get one keyset page of parking spots with reservation details
+    size = page_size()
+    after = request.args.get('after', 0, type=int)
+    parking_spots, has_next = split_page(spot_page(cursor, lot_id, after, size + 1, get_db().cursor()), size)
     
     return render_template('admin/parking_spots.html', 
                          parking_lot=parking_lot, 
-                         parking_spots=parking_spots)
+                         parking_spots=parking_spots,
+                         has_next=has_next,
+                         is_first_page=not after)
 
 @admin_bp.route('/admin/reports')
 @admin_required
 def admin_reports():
-    conn = sqlite3.connect('parking.db')
+    # Everything below reads the reporting snapshot when REPORT_SNAPSHOT is on (models/snapshot.py)
+    conn = report_db()
     cursor = conn.cursor()
     
     # Get summary statistics
@@ -286,30 +305,112 @@ def admin_reports():
     ''')
     lot_stats = cursor.fetchone()
     
-    cursor.execute('''
-        SELECT 
-            COUNT(*) as total_spots,
-            SUM(CASE WHEN status = 'A' THEN 1 ELSE 0 END) as available_spots,
-            SUM(CASE WHEN status = 'O' THEN 1 ELSE 0 END) as occupied_spots
-        FROM parking_spots
-    ''')
-    spot_stats = cursor.fetchone()
-    
-    # Get parking lot wise statistics
-    cursor.execute('''
-        SELECT pl.prime_location_name,
-               COUNT(ps.id) as total_spots,
-               SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END) as available_spots,
-               SUM(CASE WHEN ps.status = 'O' THEN 1 ELSE 0 END) as occupied_spots
-        FROM parking_lots pl
-        LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
-        GROUP BY pl.id
-    ''')
-    lot_wise_stats = cursor.fetchall()
-    
-    conn.close()
+    # Spot counters are kept with the spots (in the shards when sharded): take them from the lot availability
+    lots = report_lots()
+    spot_stats = {'total_spots': sum(lot.total_spots for lot in lots),
+                  'available_spots': sum(lot.available_spots for lot in lots),
+                  'occupied_spots': sum(lot.occupied_spots for lot in lots)}
+    
+    # Revenue of the last 30 days from the per-lot daily rollups (each shard has its own, merged here)
+    since = (datetime.now() - timedelta(days=29)).date().isoformat()
+    revenue_by_day, revenue_by_lot = {}, []
+    for days_rows, lot_rows in report_fan_out(lambda shard: (daily_revenue(shard.cursor(), since),
+                                                             lot_revenue(shard.cursor(), since))):
+        for day, reservations, revenue in days_rows:
+            count, total = revenue_by_day.get(day, (0, 0))
+            revenue_by_day[day] = (count + reservations, total + revenue)
+        revenue_by_lot.extend(lot_rows)
+    revenue_by_day = [{'day': day, 'reservations': revenue_by_day[day][0], 'revenue': revenue_by_day[day][1]}
+                      for day in sorted(revenue_by_day, reverse=True)]
+    revenue_by_lot.sort(key=lambda row: row['revenue'], reverse=True)
+    
+    # Occupancy analytics over the cached reservation columns (only new completions are loaded, per shard)
+    days = min(max(request.args.get('days', DEFAULT_WINDOW_DAYS, type=int), 1), 366)
+    parts = [get_analytics(index) for index in range(len(get_router()))]
+    report_fan_out(lambda index, shard: parts[index].refresh(shard), indexed=True)
+    analytics = occupancy_report(combine(parts), [(lot.id, lot.prime_location_name, lot.total_spots) for lot in lots], days=days)
+    
+    # Lots for the export filter
+    cursor.execute('SELECT id, prime_location_name FROM parking_lots ORDER BY prime_location_name')
+    export_lots = cursor.fetchall()
     
     return render_template('admin/reports.html', 
+                         revenue_by_day=revenue_by_day,
+                         analytics=analytics,
+                         cache_stats=get_cache().stats(),
+                         feed_stats=get_feed().stats(),
+                         revenue_by_lot=revenue_by_lot,
+                         export_lots=export_lots,
                          lot_stats=lot_stats,
+                         snapshot=report_freshness(),
                          spot_stats=spot_stats,
-                         lot_wise_stats=lot_wise_stats) 
\ No newline at end of file
+                         lot_wise_stats=lots)
+
+@admin_bp.route('/admin/export/<kind>')
+@admin_required
+def admin_export(kind):
+    # kind: 'reservations' or 'occupancy'; ?format=csv|ndjson, optional ?from=&to=&lot_id=
+    fmt = request.args.get('format', 'csv')
+    if kind not in ('reservations', 'occupancy') or fmt not in FORMATS:
+        flash('Unknown export type or format', 'error')
+        return redirect(url_for('admin.admin_reports'))
+    try:
+        start, end, lot_id = parse_filters(request.args)
+    except ExportFilterError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin.admin_reports'))
+    
+    # Rows are generated batch by batch while the client downloads (a lot filter only needs the lot's shard)
+    router = get_router()
+    sources = report_sources()
+    shard_paths = None
+    if router.sharded:
+        shard_paths = [sources.storage[router.for_lot(lot_id)]] if lot_id is not None else sources.storage
+    chunks = stream_export(sources.directory, kind, fmt, start, end, lot_id, shard_paths=shard_paths,
+                           connector=sources.connect)
+    filename = f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return Response(chunks, mimetype=FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@admin_bp.route('/admin/jobs')
+@admin_required
+def admin_jobs():
+    # Background maintenance jobs: last run of each, recent runs and which worker holds the scheduler lease
+    scheduler = get_scheduler()
+    jobs = scheduler.jobs if scheduler else configured_jobs(current_app)
+    jobs, runs, lease = job_overview(get_db().cursor(), jobs)
+    return render_template('admin/jobs.html', jobs=jobs, runs=runs, lease=lease, enabled=scheduler is not None,
+                           now=now_epoch())
+
+@admin_bp.route('/admin/jobs/<name>/run', methods=['POST'])
+@admin_required
+def admin_run_job(name):
+    if name not in {job.name for job in JOBS}:
+        flash('Unknown job', 'error')
+    else:
+        run_soon(get_db(), name)
+        flash(f'Job {name} will start on the scheduler\'s next tick.', 'success')
+    return redirect(url_for('admin.admin_jobs'))
+
+@admin_bp.route('/admin/metrics')
+def admin_metrics():
+    """Prometheus scrape endpoint: admin login session, or an admin's API token as a Bearer header."""
+    if session.get('role') != 'admin':
+        header = request.headers.get('Authorization', '')
+        user = find_token_user(get_db().cursor(), header[7:].strip()) if header.startswith('Bearer ') else None
+        if user is None or user['role'] != 'admin':
+            return Response('forbidden\n', status=403, mimetype='text/plain')
+    metrics = get_metrics()
+    if metrics is None:
+        return Response('metrics are disabled (set METRICS_ENABLED)\n', status=404, mimetype='text/plain')
+    cache, feed = get_cache().stats(), get_feed().stats()
+    extra = (
+        ('parking_cache_hits_total', 'counter', 'Lot cache hits.', cache['hits']),
+        ('parking_cache_misses_total', 'counter', 'Lot cache misses.', cache['misses']),
+        ('parking_cache_entries', 'gauge', 'Entries in the lot cache.', cache['entries']),
+        ('parking_feed_subscribers', 'gauge', 'Open live availability streams.', feed['subscribers']),
+        ('parking_feed_dropped_total', 'counter', 'Feed events dropped for slow screens.', feed['dropped']),
+        ('parking_login_rejected_total', 'counter', 'Logins refused because the password pool was full.',
+         get_verifier().rejected),
+    )
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
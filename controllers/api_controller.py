@@ -0,0 +1,169 @@
+# Yeh api_controller.py file hai. Gate kiosks aur fleet systems ke liye JSON API yahin hai (/api/v1/...).
+# Login cookie ki jagah "Authorization: Bearer <token>" header lagta hai (token: models/tokens.py).
+# Booking aur release wahi model functions use karte hain jo HTML pages (book_parking, release_multiple) karte hain.
+# Responses chhote JSON hain, koi template render nahi hota.
+"""
+api_controller.py
+-----------------
+Versioned JSON API for kiosks and fleet integrations.
+
+Endpoints (all need an API token):
+- GET  /api/v1/lots                  lot availability (ETag aware, 304 when unchanged)
+- GET  /api/v1/lots/<lot_id>         one lot
+- POST /api/v1/lots/<lot_id>/bookings  {"vehicle_numbers": [...], "allow_partial": false}
+- POST /api/v1/releases              {"reservation_ids": [<integer>, ...]}
+- GET  /api/v1/lots/stream?lots=1,2  Server-Sent Events: a snapshot, then one
+  event per availability change (models/feed.py). Also accepts the web login
+  session, which a same-origin EventSource sends; never a token in the URL.
+
+Booking and release go through models.reservations (book_spots, and
+release_reservations routed per shard by models.shards.release_everywhere)
+with the shared allocator and cache invalidation, exactly like the HTML routes. Errors are {"error": "<code>", ...} with a
+matching HTTP status.
+"""
+
+import json
+
+from flask import Blueprint, Response, current_app, g, request, session
+
+from models.db import DatabaseBusy, get_db
+from models.reservations import AllocationError, book_spots
+from models.allocator import get_allocator
+from models.cache import lot_availability
+from models.feed import get_feed, spots_changed, stream
+from models.repository import get_lot
+from models.shards import get_router, lot_db, release_everywhere
+from models.tokens import find_token_user
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Upper bound on vehicles / reservations in one request, so one call stays one short transaction
+MAX_BATCH = 200
+
+
+def _json(payload, status=200):
+    # Compact separators: kiosks on slow links pay for every byte
+    return Response(json.dumps(payload, separators=(',', ':')), status=status, mimetype='application/json')
+
+
+def _error(code, status, **details):
+    return _json({'error': code, **details}, status)
+
+
+def _bearer_token():
+    """The token of an `Authorization: Bearer <token>` header, or None."""
+    header = request.headers.get('Authorization', '')
+    return header[7:].strip() if header.startswith('Bearer ') else None
+
+
+def token_required(f):
+    """Decorator: authenticate the request by its Bearer token and set g.api_user."""
+    def decorated_function(*args, **kwargs):
+        user = find_token_user(get_db().cursor(), _bearer_token())
+        if user is None:
+            return _error('unauthorized', 401)
+        g.api_user = user
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+
+def _lot_json(lot):
+    # lot is a LotAvailability row (models/repository.py)
+    return {'id': lot.id, 'name': lot.prime_location_name, 'price': lot.price, 'total': lot.total_spots,
+            'available': lot.available_spots}
+
+
+@api_bp.route('/lots')
+@token_required
+def api_lots():
+    """All lots with live availability; send If-None-Match to get 304 when nothing changed."""
+    snapshot = lot_availability()
+    response = _json({'lots': [_lot_json(lot) for lot in snapshot.rows]})
+    response.set_etag(snapshot.etag)
+    response.last_modified = snapshot.last_modified
+    return response.make_conditional(request)
+
+
+@api_bp.route('/lots/<int:lot_id>')
+@token_required
+def api_lot(lot_id):
+    for lot in lot_availability().rows:
+        if lot.id == lot_id:
+            return _json(_lot_json(lot))
+    return _error('lot_not_found', 404)
+
+
+@api_bp.route('/lots/<int:lot_id>/bookings', methods=['POST'])
+@token_required
+def api_book(lot_id):
+    """Book one spot per vehicle number (same path as book_parking)."""
+    body = request.get_json(silent=True) or {}
+    vehicle_numbers = body.get('vehicle_numbers')
+    if (not isinstance(vehicle_numbers, list) or not vehicle_numbers
+            or not all(isinstance(number, str) and number.strip() for number in vehicle_numbers)):
+        return _error('invalid_vehicle_numbers', 400)
+    if len(vehicle_numbers) > MAX_BATCH:
+        return _error('too_many_vehicles', 400, max=MAX_BATCH)
+    vehicle_numbers = [number.strip() for number in vehicle_numbers]
+    conn = lot_db(lot_id)
+    try:
+        booked = book_spots(conn, lot_id, g.api_user['id'], vehicle_numbers,
+                            allow_partial=bool(body.get('allow_partial')), allocator=get_allocator())
+    except AllocationError as e:
+        # A lot that does not exist has no free spots either; only a failed booking pays for the lookup
+        if get_lot(conn.cursor(), lot_id) is None:
+            return _error('lot_not_found', 404)
+        return _error('not_enough_spots', 409, requested=e.requested, available=e.available)
+    except DatabaseBusy:
+        return _error('busy', 503)
+    spots_changed([lot_id])
+    return _json({'reservations': [
+        {'id': reservation_id, 'spot_id': spot_id, 'vehicle_number': vehicle_number}
+        for reservation_id, spot_id, vehicle_number in booked
+    ]}, 201)
+
+
+@api_bp.route('/releases', methods=['POST'])
+@token_required
+def api_release():
+    """Release a list of the token owner's reservations (same path as release_multiple)."""
+    body = request.get_json(silent=True) or {}
+    reservation_ids = body.get('reservation_ids')
+    # Only real integers: int() would turn 1.9 or true into reservation 1
+    if (not isinstance(reservation_ids, list) or not reservation_ids
+            or not all(isinstance(value, int) and not isinstance(value, bool) for value in reservation_ids)):
+        return _error('invalid_reservation_ids', 400)
+    if len(reservation_ids) > MAX_BATCH:
+        return _error('too_many_reservations', 400, max=MAX_BATCH)
+    try:
+        results = release_everywhere(g.api_user['id'], reservation_ids, allocator=get_allocator())
+    except DatabaseBusy:
+        return _error('busy', 503)
+    released = [result for result in results if result.status == 'released']
+    if released:
+        spots_changed({result.lot_id for result in released})
+    return _json({
+        'results': [{'id': result.reservation_id, 'status': result.status,
+                     'cost': None if result.parking_cost is None else round(result.parking_cost, 2)}
+                    for result in results],
+        'total_cost': round(sum(result.parking_cost for result in released), 2),
+    })
+
+
+@api_bp.route('/lots/stream')
+def api_lot_stream():
+    """Live availability feed for lobby screens and the user dashboard."""
+    # Bearer header or the session cookie (same-origin EventSource) only: a token in the URL ends up in access logs
+    if 'user_id' not in session and find_token_user(get_db().cursor(), _bearer_token()) is None:
+        return _error('unauthorized', 401)
+    lot_ids = {int(lot_id) for lot_id in request.args.get('lots', '').split(',') if lot_id.strip().isdigit()}
+    feed = get_feed()
+    # Counters are read from every shard (or the one database) on a full sync
+    router = get_router()
+    chunks = stream(feed, lot_ids, lambda: [router.connect(path) for path in router.paths],
+                    current_app.config['FEED_HEARTBEAT'])
+    response = Response(chunks, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass events through immediately
+    return response
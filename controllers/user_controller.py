@@ -8,7 +8,9 @@ user_controller.py
 This file contains all user-related routes and logic for the Vehicle Parking System Flask app.
 
 - Each function is a route handler for a user action (dashboard, booking, releasing, history, etc).
-- Database access is via sqlite3; now uses named access for clarity.
+- Database access is via the pooled connection from models/db.py (get_db), with named row access.
+  Spots and reservations may live in shard files: book/release go to the lot's or
+  reservation's shard, lists are read from every shard and merged (models/shards.py).
 - To add or change user features, add or modify functions here.
 
 How to make changes:
@@ -21,16 +23,19 @@ All functions now include comments explaining their purpose and key steps.
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-import sqlite3
-from datetime import datetime
 
-user_bp = Blueprint('user', __name__)
+from models.db import DatabaseBusy, get_db
+from models.reservations import AllocationError, ReleaseResult, book_spots
+from models.archive import newest_reservations_sql
+from models.allocator import get_allocator
+from models.pagination import page_size, split_page
+from models.rollups import user_monthly_report, user_totals
+from models.shards import fan_out, get_router, lot_db, merge_newest, release_everywhere, shard_db, sum_rows
+from models.cache import cached_page, lot_availability
+from models.feed import spots_changed
+from models.repository import active_reservation, active_reservation_count, get_lot, get_user
 
-def get_db_connection():
-    """Helper to get a DB connection with named row access."""
-    conn = sqlite3.connect('parking.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+user_bp = Blueprint('user', __name__)
 
 def user_required(f):
     """Decorator to ensure user is logged in before accessing a route."""
@@ -48,10 +53,9 @@ def user_required(f):
 @user_required
 def user_dashboard():
     """Show the user's dashboard with recent history and available lots."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # Get user's recent parking history
-    cursor.execute('''
+    user_id = session['user_id']  # read here: fan_out may run the query on another thread
+    # Get user's recent parking history (newest 10 of every shard, merged)
+    recent_history = merge_newest(fan_out(lambda conn: conn.execute('''
         SELECT r.id, pl.prime_location_name, ps.id as spot_id,
                r.parking_timestamp, r.leaving_timestamp, r.parking_cost, r.vehicle_number
         FROM reservations r
@@ -60,20 +64,9 @@ def user_dashboard():
         WHERE r.user_id = ?
         ORDER BY r.parking_timestamp DESC
         LIMIT 10
-    ''', (session['user_id'],))
-    recent_history = cursor.fetchall()
-    # Get available parking lots
-    cursor.execute('''
-        SELECT pl.*, 
-               COUNT(ps.id) as total_spots,
-               SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END) as available_spots
-        FROM parking_lots pl
-        LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
-        GROUP BY pl.id
-        HAVING available_spots > 0
-    ''')
-    available_lots = cursor.fetchall()
-    conn.close()
+    ''', (user_id,)).fetchall()), key=lambda row: row['parking_timestamp'], limit=10)
+    # Get available parking lots from the cached lot availability (models/cache.py)
+    available_lots = [lot for lot in lot_availability().rows if lot.available_spots > 0]
     # Renders the dashboard template and passes recent_history and available_lots to it
     # The template is in templates/user/dashboard.html
     return render_template('user/dashboard.html', 
@@ -84,77 +77,51 @@ def user_dashboard():
 @user_required
 def user_parking_lots():
     """Show all parking lots with their availability."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT pl.*, 
-               COUNT(ps.id) as total_spots,
-               SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END) as available_spots
-        FROM parking_lots pl
-        LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
-        GROUP BY pl.id
-    ''')
-    parking_lots = cursor.fetchall()
-    conn.close()
-    return render_template('user/parking_lots.html', parking_lots=parking_lots)
+    # Cached page with ETag/Last-Modified: an unchanged listing is answered with 304
+    snapshot = lot_availability()
+    return cached_page('user_parking_lots', snapshot,
+                       lambda: render_template('user/parking_lots.html', parking_lots=snapshot.rows))
 
 @user_bp.route('/user/book-parking/<int:lot_id>', methods=['GET', 'POST'])
 @user_required
 def book_parking(lot_id):
     """Allow the user to book one or more spots in a lot, entering a vehicle number for each."""
-    conn = get_db_connection()
+    # The lot's spots, reservations and counters are in its shard
+    conn = lot_db(lot_id)
     cursor = conn.cursor()
     if request.method == 'POST':
         try:
             num_spots = int(request.form['num_spots'])
         except (KeyError, ValueError):
             flash('Invalid number of spots requested.', 'error')
-            conn.close()
             return redirect(url_for('user.user_parking_lots'))
         vehicle_numbers = request.form.getlist('vehicle_numbers[]')
         if len(vehicle_numbers) != num_spots:
             flash('Please enter a vehicle number for each spot you want to book.', 'error')
-            conn.close()
             return redirect(url_for('user.book_parking', lot_id=lot_id))
-        # Find enough available spots in the lot
-        cursor.execute('''
-            SELECT id FROM parking_spots 
-            WHERE lot_id = ? AND status = 'A'
-            LIMIT ?
-        ''', (lot_id, num_spots))
-        available_spots = cursor.fetchall()
-        if not available_spots or len(available_spots) < num_spots:
+        if num_spots < 1:
+            flash('Invalid number of spots requested.', 'error')
+            return redirect(url_for('user.user_parking_lots'))
+        # Claim the spots atomically (see models/reservations.py)
+        try:
+            book_spots(conn, lot_id, session['user_id'], vehicle_numbers, allocator=get_allocator())
+        except AllocationError:
             flash('Not enough available spots in this parking lot.', 'error')
-            conn.close()
             return redirect(url_for('user.user_parking_lots'))
-        parking_timestamp = datetime.now().isoformat()
-        for spot, vehicle_number in zip(available_spots, vehicle_numbers):
-            spot_id = spot['id']
-            cursor.execute('''
-                INSERT INTO reservations (spot_id, user_id, vehicle_number, parking_timestamp)
-                VALUES (?, ?, ?, ?)
-            ''', (spot_id, session['user_id'], vehicle_number, parking_timestamp))
-            cursor.execute('''
-                UPDATE parking_spots SET status = 'O' WHERE id = ?
-            ''', (spot_id,))
-        conn.commit()
-        conn.close()
+        except DatabaseBusy:
+            flash('The parking system is busy right now, please try again.', 'error')
+            return redirect(url_for('user.book_parking', lot_id=lot_id))
+        # Drop cached lot pages and push the new count to live screens
+        spots_changed([lot_id])
         flash(f'{num_spots} parking spot(s) booked successfully!', 'success')
         return redirect(url_for('user.user_dashboard'))
     # Get parking lot details
-    cursor.execute('SELECT * FROM parking_lots WHERE id = ?', (lot_id,))
-    parking_lot = cursor.fetchone()
+    parking_lot = get_lot(cursor, lot_id)
     if not parking_lot:
         flash('Parking lot not found', 'error')
-        conn.close()
         return redirect(url_for('user.user_parking_lots'))
-    # Check availability
-    cursor.execute('''
-        SELECT COUNT(*) FROM parking_spots 
-        WHERE lot_id = ? AND status = 'A'
-    ''', (lot_id,))
-    available_spots = cursor.fetchone()[0]
-    conn.close()
+    # Check availability from the lot's counter
+    available_spots = parking_lot.available_spots
     if available_spots == 0:
         flash('No available spots in this parking lot', 'error')
         return redirect(url_for('user.user_parking_lots'))
@@ -168,55 +135,26 @@ def book_parking(lot_id):
 @user_required
 def release_parking(reservation_id):
     """Release a single parking spot and calculate cost based on duration."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    if request.method == 'POST':
+        # Same release path as release_multiple, for a batch of one
+        try:
+            result, = release_everywhere(session['user_id'], [reservation_id], allocator=get_allocator())
+        except DatabaseBusy:
+            flash('The parking system is busy right now, please try again.', 'error')
+            return redirect(url_for('user.release_parking', reservation_id=reservation_id))
+        if result.status == 'invalid_timestamp':
+            flash('Invalid parking timestamp for this reservation.', 'error')
+        elif result.status == 'not_found':
+            flash('Reservation not found or already released', 'error')
+        else:
+            spots_changed([result.lot_id])
+            flash(f'Parking spot released successfully! Total cost: ₹{result.parking_cost:.2f}', 'success')
+        return redirect(url_for('user.user_dashboard'))
+    cursor = shard_db(get_router().for_id(reservation_id)).cursor()
     # Get reservation details
-    cursor.execute('''
-        SELECT r.*, ps.id as spot_id, pl.price
-        FROM reservations r
-        JOIN parking_spots ps ON r.spot_id = ps.id
-        JOIN parking_lots pl ON ps.lot_id = pl.id
-        WHERE r.id = ? AND r.user_id = ? AND r.status = 'active'
-    ''', (reservation_id, session['user_id']))
-    reservation = cursor.fetchone()
+    reservation = active_reservation(cursor, reservation_id, session['user_id'])
     if not reservation:
         flash('Reservation not found or already released', 'error')
-        conn.close()
-        return redirect(url_for('user.user_dashboard'))
-    if request.method == 'POST':
-        leaving_timestamp = datetime.now().isoformat()
-        ts = reservation['parking_timestamp']
-        print(f"DEBUG: reservation['parking_timestamp'] value is: {repr(ts)}")
-        if ts and isinstance(ts, str):
-            ts = ts.replace('\n', ' ').replace('\r', ' ').strip()
-            if 'T' not in ts and ' ' in ts:
-                ts = ts.replace(' ', 'T', 1)
-            try:
-                parking_timestamp = datetime.fromisoformat(ts)
-            except Exception:
-                flash('Invalid parking timestamp for this reservation.', 'error')
-                conn.close()
-                return redirect(url_for('user.user_dashboard'))
-        else:
-            flash('Invalid parking timestamp for this reservation.', 'error')
-            conn.close()
-            return redirect(url_for('user.user_dashboard'))
-        duration = datetime.fromisoformat(leaving_timestamp) - parking_timestamp
-        hours = duration.total_seconds() / 3600
-        parking_cost = hours * reservation['price']  # price per hour
-        # Update reservation
-        cursor.execute('''
-            UPDATE reservations 
-            SET leaving_timestamp = ?, parking_cost = ?, status = 'completed'
-            WHERE id = ?
-        ''', (leaving_timestamp, parking_cost, reservation['id']))
-        # Update spot status to available
-        cursor.execute('''
-            UPDATE parking_spots SET status = 'A' WHERE id = ?
-        ''', (reservation['spot_id'],))
-        conn.commit()
-        conn.close()
-        flash(f'Parking spot released successfully! Total cost: ₹{parking_cost:.2f}', 'success')
         return redirect(url_for('user.user_dashboard'))
     # Renders the release parking template and passes reservation details to it
     # The template is in templates/user/release_parking.html
@@ -225,24 +163,43 @@ def release_parking(reservation_id):
 @user_bp.route('/user/history')
 @user_required
 def user_history():
-    """Show all parking history for the user."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    """Show the user's parking history, newest first, one keyset page at a time."""
+    size = page_size()
+    # Cursor = (parking_timestamp, id) of the last row on the previous page
+    before_ts = request.args.get('before_ts', type=int)
+    before_id = request.args.get('before_id', type=int)
+    if before_ts is not None and before_id is not None:
+        where, where_params = 'user_id = ? AND (parking_timestamp, id) < (?, ?)', (session['user_id'], before_ts, before_id)
+    else:
+        where, where_params = 'user_id = ?', (session['user_id'],)
+    keyset = len(where_params) > 1
+    # Newest rows of the hot table and of the archive, one page each, merged here (and across shards)
+    pages = fan_out(lambda conn: conn.execute(f'''
         SELECT r.id, pl.prime_location_name, ps.id as spot_id,
                r.parking_timestamp, r.leaving_timestamp, r.parking_cost, r.vehicle_number,
                r.status
-        FROM reservations r
+        FROM {newest_reservations_sql(where)} r
         JOIN parking_spots ps ON r.spot_id = ps.id
         JOIN parking_lots pl ON ps.lot_id = pl.id
-        WHERE r.user_id = ?
-        ORDER BY r.parking_timestamp DESC
-    ''', (session['user_id'],))
-    history = cursor.fetchall()
-    conn.close()
-    # Renders the history template and passes the history list to it
+        ORDER BY r.parking_timestamp DESC, r.id DESC
+        LIMIT ?
+    ''', (*where_params, size + 1) * 2 + (size + 1,)).fetchall())
+    history, has_next = split_page(merge_newest(pages, key=lambda row: (row['parking_timestamp'], row['id']), limit=size + 1), size)
+    # Summary over the whole history, only on the first page
+    summary = None
+    if not keyset:
+        totals = sum_rows(fan_out(lambda conn: conn.execute('''
+            SELECT COUNT(*) as total_reservations,
+                   COALESCE(SUM(CASE WHEN status = 'active' THEN 1 ELSE 0 END), 0) as active_reservations,
+                   COALESCE(SUM(parking_cost), 0) as total_spent
+            FROM all_reservations
+            WHERE user_id = ?
+        ''', where_params).fetchone()))
+        summary = dict(zip(('total_reservations', 'active_reservations', 'total_spent'), totals))
+    # Renders the history template and passes the history page to it
     # The template is in templates/user/history.html
-    return render_template('user/history.html', history=history)
+    return render_template('user/history.html', history=history, has_next=has_next,
+                           is_first_page=not keyset, summary=summary)
 
 @user_bp.route('/user/release-multiple', methods=['POST'])
 @user_required
@@ -252,75 +209,48 @@ def release_multiple():
     if not reservation_ids:
         flash('No reservations selected for release.', 'error')
         return redirect(url_for('user.user_history'))
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    released_count = 0
-    for res_id in reservation_ids:
-        # Get reservation details
-        cursor.execute('''
-            SELECT r.*, ps.id as spot_id, pl.price
-            FROM reservations r
-            JOIN parking_spots ps ON r.spot_id = ps.id
-            JOIN parking_lots pl ON ps.lot_id = pl.id
-            WHERE r.id = ? AND r.user_id = ? AND r.status = 'active'
-        ''', (res_id, session['user_id']))
-        reservation = cursor.fetchone()
-        if not reservation:
-            continue
-        leaving_timestamp = datetime.now().isoformat()
-        ts = reservation['parking_timestamp']
-        print(f"DEBUG: reservation['parking_timestamp'] value is: {repr(ts)} (reservation id: {res_id})")
-        if ts and isinstance(ts, str):
-            ts = ts.replace('\n', ' ').replace('\r', ' ').strip()
-            if 'T' not in ts and ' ' in ts:
-                ts = ts.replace(' ', 'T', 1)
-            try:
-                parking_timestamp = datetime.fromisoformat(ts)
-            except Exception:
-                continue
-        else:
-            continue
-        duration = datetime.fromisoformat(leaving_timestamp) - parking_timestamp
-        hours = duration.total_seconds() / 3600
-        parking_cost = hours * reservation['price']  # price per hour
-        # Update reservation
-        cursor.execute('''
-            UPDATE reservations 
-            SET leaving_timestamp = ?, parking_cost = ?, status = 'completed'
-            WHERE id = ?
-        ''', (leaving_timestamp, parking_cost, reservation['id']))
-        # Update spot status to available
-        cursor.execute('''
-            UPDATE parking_spots SET status = 'A' WHERE id = ?
-        ''', (reservation['spot_id'],))
-        released_count += 1
-    conn.commit()
-    conn.close()
-    if released_count:
-        flash(f'{released_count} reservation(s) released successfully!', 'success')
+    # One bulk fetch, one leaving time and bulk updates for the whole selection (per shard)
+    try:
+        results = release_everywhere(session['user_id'], reservation_ids, allocator=get_allocator())
+    except DatabaseBusy:
+        flash('The parking system is busy right now, please try again.', 'error')
+        return redirect(url_for('user.user_history'))
+    released = [result for result in results if result.status == 'released']
+    if released:
+        spots_changed({result.lot_id for result in released})
+        total_cost = sum(result.parking_cost for result in released)
+        flash(f'{len(released)} reservation(s) released successfully! Total cost: ₹{total_cost:.2f}', 'success')
     else:
         flash('No reservations were released.', 'error')
-    return redirect(url_for('user.user_history'))
+    # Per-reservation outcome table, in the order the reservations were selected. It is kept in the
+    # session and shown by a GET page, so refreshing the summary does not post the release again.
+    session['release_summary'] = [list(result) for result in results]
+    return redirect(url_for('user.release_summary'))
+
+@user_bp.route('/user/release-summary')
+@user_required
+def release_summary():
+    """Show the outcome of the user's last "Release Selected"."""
+    summary = session.get('release_summary')
+    if summary is None:
+        return redirect(url_for('user.user_history'))
+    # The template is in templates/user/release_summary.html
+    return render_template('user/release_summary.html', results=[ReleaseResult(*row) for row in summary])
 
 @user_bp.route('/user/profile')
 @user_required
 def user_profile():
     """Show the user's profile information."""
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT username, email, full_name, address, pin_code, mobile
-        FROM users WHERE id = ?
-    ''', (session['user_id'],))
-    user = cursor.fetchone()
-    conn.close()
+    user = get_user(cursor, session['user_id'])
     return render_template('user/profile.html', user=user)
 
 @user_bp.route('/user/edit-profile', methods=['GET', 'POST'])
 @user_required
 def edit_profile():
     """Allow the user to edit their profile information."""
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     if request.method == 'POST':
         full_name = request.form['full_name']
@@ -333,49 +263,35 @@ def edit_profile():
             WHERE id = ?
         ''', (full_name, address, pin_code, mobile, session['user_id']))
         conn.commit()
-        conn.close()
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('user.user_profile'))
     # Get current user data
-    cursor.execute('''
-        SELECT username, email, full_name, address, pin_code, mobile
-        FROM users WHERE id = ?
-    ''', (session['user_id'],))
-    user = cursor.fetchone()
-    conn.close()
+    user = get_user(cursor, session['user_id'])
     return render_template('user/edit_profile.html', user=user)
 
 @user_bp.route('/user/reports')
 @user_required
 def user_reports():
     """Show user's parking statistics and monthly report."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # Get user's parking statistics
-    cursor.execute('''
-        SELECT 
-            COUNT(*) as total_reservations,
-            SUM(CASE WHEN status = 'active' THEN 1 ELSE 0 END) as active_reservations,
-            SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed_reservations,
-            SUM(parking_cost) as total_spent
-        FROM reservations 
-        WHERE user_id = ?
-    ''', (session['user_id'],))
-    stats = cursor.fetchone()
-    # Get monthly parking data for charts
-    cursor.execute('''
-        SELECT 
-            strftime('%Y-%m', parking_timestamp) as month,
-            COUNT(*) as reservations,
-            SUM(parking_cost) as total_cost
-        FROM reservations 
-        WHERE user_id = ? AND status = 'completed'
-        GROUP BY strftime('%Y-%m', parking_timestamp)
-        ORDER BY month DESC
-        LIMIT 12
-    ''', (session['user_id'],))
-    monthly_data = cursor.fetchall()
-    conn.close()
+    user_id = session['user_id']
+    # Completed totals come from the monthly rollups (models/rollups.py), only active ones are counted live;
+    # every shard has its own rollups, so the per-shard numbers are added up
+    completed_reservations, total_spent, active_reservations = sum_rows(fan_out(
+        lambda conn: user_totals(conn.cursor(), user_id) + (active_reservation_count(conn.cursor(), user_id),)))
+    stats = {
+        'total_reservations': completed_reservations + active_reservations,
+        'active_reservations': active_reservations,
+        'completed_reservations': completed_reservations,
+        'total_spent': total_spent,
+    }
+    # Monthly data for charts: at most 12 pre-aggregated rows (months that appear in several shards are added up)
+    months = {}
+    for rows in fan_out(lambda conn: user_monthly_report(conn.cursor(), user_id)):
+        for month, reservations, total_cost in rows:
+            count, cost = months.get(month, (0, 0))
+            months[month] = (count + reservations, cost + total_cost)
+    monthly_data = [{'month': month, 'reservations': months[month][0], 'total_cost': months[month][1]}
+                    for month in sorted(months, reverse=True)[:12]]
     return render_template('user/reports.html', 
                          stats=stats,
-                         monthly_data=monthly_data) 
\ No newline at end of file
+                         monthly_data=monthly_data)
@@ -0,0 +1,258 @@
+# Yeh allocator.py file hai. Har lot ke free spots memory me ek chhote bitmap me rakhe jaate hain,
+# taaki booking ke time pe parking_spots table scan na karni pade.
+# Policy config se aati hai: 'lowest' (sabse chhota id), 'spread' (poore lot me baari-baari se), 'nearest' (entrance ke paas).
+# Agar memory aur database me farak (drift) dikhe toh poora lot dubara load nahi hota: doosre worker ke book kiye spots
+# claim fail hone pe yahan bhi occupied ho jaate hain, aur kam pade ya farak bada ho toh sirf free spots dubara padhe jaate hain.
+"""
+allocator.py
+------------
+In-memory free-spot allocator, one compact structure per lot.
+
+Each lot keeps its spot ids in a sorted array('q') and a bytearray bitmap of
+free positions, so picking a spot is a C-level bytearray.find() from a hint
+instead of a query over parking_spots. The database stays the source of truth:
+
+- allocate() runs inside the booking's write transaction. The chosen ids are
+  claimed with a conditional UPDATE; ids that turn out to be taken (booked by
+  another worker) stay marked taken here and the shortfall is picked again, so
+  small drift is corrected spot by spot.
+- Spots freed by other workers are not seen that way. When the lot's free
+  count differs from parking_lots.available_spots by more than RESYNC_DRIFT,
+  or this worker runs out of spots the database still has free, only the
+  lot's free ids are re-read (idx_parking_spots_lot_status) and the bitmap is
+  reset from them. The whole lot is reloaded only if a free id is unknown
+  here, i.e. the lot was resized by another worker.
+"""
+
+import threading
+from array import array
+from bisect import bisect_left
+
+from flask import current_app
+
+from models.lifecycle import on_worker_start
+
+POLICIES = ('lowest', 'spread', 'nearest')
+# Drift up to this many spots is fixed while claiming; beyond it the lot's free spots are re-read first
+RESYNC_DRIFT = 8
+
+
+class _LotSlots:
+    """Spot ids of one lot (sorted) and a bitmap of which positions are free."""
+
+    __slots__ = ('spot_ids', 'free', 'free_count', 'low', 'next', 'entrance')
+
+    def __init__(self, rows, entrance=0):
+        self.spot_ids = array('q', (row[0] for row in rows))
+        self.free = bytearray(1 if row[1] == 'A' else 0 for row in rows)
+        self.free_count = sum(self.free)
+        self.low = 0     # no free position below this one ('lowest')
+        self.next = 0    # next-fit cursor ('spread')
+        self.entrance = min(max(entrance or 0, 0), max(len(self.spot_ids) - 1, 0))
+
+    def position(self, spot_id):
+        pos = bisect_left(self.spot_ids, spot_id)
+        if pos < len(self.spot_ids) and self.spot_ids[pos] == spot_id:
+            return pos
+        return -1
+
+    def pick(self, policy):
+        """Return a free position according to the policy, or -1 if the lot is full."""
+        free = self.free
+        if policy == 'spread':
+            pos = free.find(1, self.next)
+            if pos == -1:
+                pos = free.find(1, 0, self.next)
+            self.next = pos + 1
+        elif policy == 'nearest':
+            right = free.find(1, self.entrance)
+            left = free.rfind(1, 0, self.entrance)
+            if left == -1 or (right != -1 and right - self.entrance <= self.entrance - left):
+                pos = right
+            else:
+                pos = left
+        else:
+            pos = free.find(1, self.low)
+            self.low = pos + 1 if pos != -1 else len(free)
+        return pos
+
+    def resync(self, free_ids):
+        """Mark exactly these spot ids free; returns False (changing nothing) if one is not in this lot."""
+        free = bytearray(len(self.spot_ids))
+        for spot_id in free_ids:
+            pos = self.position(spot_id)
+            if pos == -1:
+                return False
+            free[pos] = 1
+        self.free = free
+        self.free_count = len(free_ids)
+        self.low = 0
+        return True
+
+    def take(self, pos):
+        self.free[pos] = 0
+        self.free_count -= 1
+
+    def give_back(self, pos):
+        if not self.free[pos]:
+            self.free[pos] = 1
+            self.free_count += 1
+            if pos < self.low:
+                self.low = pos
+
+
+class SpotAllocator:
+    """Free-spot structures for every lot, shared by all requests of a worker."""
+
+    def __init__(self, policy='lowest'):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown spot allocation policy: {policy}')
+        self.policy = policy
+        self._lots = {}
+        self._lock = threading.Lock()
+
+    def warm(self, *cursors):
+        """Load every lot from the database, or from every shard's cursor (at startup or after a restart)."""
+        entrances, spots = {}, {}
+        for cursor in cursors:
+            cursor.execute('SELECT id, entrance_index FROM parking_lots')
+            entrances.update(cursor.fetchall())
+            cursor.execute('SELECT lot_id, id, status FROM parking_spots ORDER BY lot_id, id')
+            for lot_id, spot_id, status in cursor.fetchall():
+                spots.setdefault(lot_id, []).append((spot_id, status))
+        with self._lock:
+            self._lots = {lot_id: _LotSlots(spots.get(lot_id, ()), entrance)
+                          for lot_id, entrance in entrances.items()}
+
+    def load_lot(self, cursor, lot_id, entrance=None):
+        """(Re)build one lot from the database."""
+        if entrance is None:
+            cursor.execute('SELECT entrance_index FROM parking_lots WHERE id = ?', (lot_id,))
+            row = cursor.fetchone()
+            entrance = row[0] if row else 0
+        cursor.execute('SELECT id, status FROM parking_spots WHERE lot_id = ? ORDER BY id', (lot_id,))
+        slots = _LotSlots(cursor.fetchall(), entrance)
+        with self._lock:
+            self._lots[lot_id] = slots
+        return slots
+
+    def invalidate(self, lot_id=None):
+        """Forget one lot (or all); it is reloaded on its next booking."""
+        with self._lock:
+            if lot_id is None:
+                self._lots.clear()
+            else:
+                self._lots.pop(lot_id, None)
+
+    def free_count(self, lot_id):
+        slots = self._lots.get(lot_id)
+        return slots.free_count if slots else None
+
+    def _take(self, slots, count):
+        with self._lock:
+            picked = []
+            while len(picked) < count:
+                pos = slots.pick(self.policy)
+                if pos == -1:
+                    break
+                slots.take(pos)
+                picked.append(slots.spot_ids[pos])
+            return picked
+
+    def resync(self, cursor, lot_id, slots, entrance=None):
+        """Reset a lot's bitmap from its free spots in the database (a full reload if the lot was resized)."""
+        cursor.execute("SELECT id FROM parking_spots WHERE lot_id = ? AND status = 'A'", (lot_id,))
+        free_ids = [row[0] for row in cursor.fetchall()]
+        with self._lock:
+            if slots.resync(free_ids):
+                return slots
+        return self.load_lot(cursor, lot_id, entrance)
+
+    def allocate(self, cursor, lot_id, count):
+        """Claim up to `count` free spots of a lot; call inside a write transaction.
+
+        Returns the claimed spot ids (fewer than `count` if the lot is short).
+        """
+        cursor.execute('SELECT available_spots, entrance_index FROM parking_lots WHERE id = ?', (lot_id,))
+        lot = cursor.fetchone()
+        if not lot:
+            return []
+        available, entrance = lot
+        slots = self._lots.get(lot_id)
+        if slots is None:
+            slots = self.load_lot(cursor, lot_id, entrance)
+        elif abs(slots.free_count - available) > RESYNC_DRIFT or slots.free_count < min(count, available):
+            slots = self.resync(cursor, lot_id, slots, entrance)
+        claimed = self._claim_free(cursor, lot_id, slots, count)
+        if len(claimed) < min(count, available):
+            # The database has free spots this worker has not seen (released elsewhere): re-read and pick again
+            slots = self.resync(cursor, lot_id, slots, entrance)
+            claimed += self._claim_free(cursor, lot_id, slots, count - len(claimed))
+        return sorted(claimed)
+
+    def _claim_free(self, cursor, lot_id, slots, count):
+        claimed = []
+        while len(claimed) < count:
+            picked = self._take(slots, count - len(claimed))
+            if not picked:
+                break
+            # Picked spots that fail the claim were booked by another worker and stay marked taken
+            claimed += self._claim(cursor, lot_id, picked)
+        return claimed
+
+    def _claim(self, cursor, lot_id, spot_ids):
+        if not spot_ids:
+            return []
+        placeholders = ', '.join('?' * len(spot_ids))
+        cursor.execute(f'''
+            UPDATE parking_spots SET status = 'O'
+            WHERE id IN ({placeholders}) AND lot_id = ? AND status = 'A'
+            RETURNING id
+        ''', (*spot_ids, lot_id))
+        return [row[0] for row in cursor.fetchall()]
+
+    def release(self, lot_id, spot_ids):
+        """Mark spots free again after their release (or a rolled-back booking) is final."""
+        slots = self._lots.get(lot_id)
+        if slots is None:
+            return
+        with self._lock:
+            for spot_id in spot_ids:
+                pos = slots.position(spot_id)
+                if pos == -1:
+                    # Spot unknown to us: the lot changed elsewhere, reload it lazily
+                    self._lots.pop(lot_id, None)
+                    return
+                slots.give_back(pos)
+
+
+def get_allocator():
+    """Return the current app's allocator."""
+    return current_app.extensions['spot_allocator']
+
+
+def _warm(app):
+    # Spots live in the shard files when storage is sharded (models/shards.py)
+    router = app.extensions['shard_router']
+    conns = [router.connect(path) for path in router.paths]
+    try:
+        app.extensions['spot_allocator'].warm(*(conn.cursor() for conn in conns))
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+def init_app(app):
+    """Create the app's allocator (SPOT_ALLOCATION_POLICY).
+
+    Lots are loaded on their first booking in each worker. With
+    SPOT_ALLOCATOR_WARM every lot is loaded up front instead, once per worker
+    process (models/lifecycle.py), never at import time.
+    """
+    app.config.setdefault('SPOT_ALLOCATION_POLICY', 'lowest')
+    app.config.setdefault('SPOT_ALLOCATOR_WARM', False)
+    allocator = SpotAllocator(app.config['SPOT_ALLOCATION_POLICY'])
+    app.extensions['spot_allocator'] = allocator
+    if app.config['SPOT_ALLOCATOR_WARM']:
+        on_worker_start(app, _warm)
+    return allocator
@@ -0,0 +1,225 @@
+# Yeh analytics.py file hai. Admin reports ke heatmap, dwell-time histogram, revenue aur turnover yahin se bante hain.
+# Completed reservations ek baar NumPy arrays me load hoti hain (start, end, lot, cost) aur memory me rakhi jaati hain;
+# refresh pe sirf naye complete hue reservations add hote hain. Saara hisaab vectorized hai, har row pe Python loop nahi.
+"""
+analytics.py
+------------
+Columnar occupancy analytics over completed reservations.
+
+ReservationColumns holds the completed reservations as parallel NumPy arrays
+(epoch start/end seconds, lot id, spot id, cost). refresh() appends only the
+rows completed since the last load, using the newest leaving_timestamp and
+the ids already loaded with it as the watermark: leaving times are taken under
+the write lock of the release transaction, so they never go backwards in
+commit order, but several releases can share one second.
+
+occupancy_report() computes, for a trailing window of days:
+
+- heatmap: average occupied spots per lot and hour of day, from an exact
+  interval sweep. G(t) = total parked seconds before t is evaluated at every
+  hour boundary with searchsorted over the sorted starts/ends and their prefix
+  sums; np.diff(G) is the parked seconds in each hour.
+- dwell histogram: completed reservations per lot and duration bucket.
+- revenue per spot-hour and turnover (completions per spot per day) per lot.
+
+With sharded storage every shard keeps its own ReservationColumns
+(get_analytics(index)) and combine() joins them for the report.
+
+Timestamps are stored as epoch seconds (models/timestamps.py). They are loaded
+as local wall-clock seconds (SQLite's 'localtime', DST included), so hours of
+day are in the same local time as the app.
+"""
+
+import calendar
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+from flask import current_app
+
+HOUR = 3600
+DAY = 24 * HOUR
+LOAD_BATCH_SIZE = 50000
+DEFAULT_WINDOW_DAYS = 90
+
+# Dwell-time bucket edges in seconds: 15m, 30m, 1h, 2h, 4h, 8h, 24h
+DWELL_EDGES = np.array([15 * 60, 30 * 60, HOUR, 2 * HOUR, 4 * HOUR, 8 * HOUR, DAY])
+DWELL_LABELS = ('< 15m', '15-30m', '30m-1h', '1-2h', '2-4h', '4-8h', '8-24h', '> 24h')
+
+
+class ReservationColumns:
+    """Completed reservations as NumPy columns, appended to incrementally."""
+
+    def __init__(self):
+        self.starts = np.empty(0, dtype=np.int64)
+        self.ends = np.empty(0, dtype=np.int64)
+        self.lot_ids = np.empty(0, dtype=np.int64)
+        self.spot_ids = np.empty(0, dtype=np.int64)
+        self.costs = np.empty(0, dtype=np.float64)
+        self.watermark = (0, [])  # (newest leaving_timestamp loaded, ids loaded with that leaving time)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def refresh(self, conn, batch_size=LOAD_BATCH_SIZE):
+        """Append reservations completed since the last refresh; returns how many were added."""
+        with self._lock:
+            since, seen = self.watermark
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT leaving_timestamp FROM all_reservations
+                WHERE status = 'completed' AND leaving_timestamp >= ?
+                ORDER BY leaving_timestamp DESC
+                LIMIT 1
+            ''', (since,))
+            latest = cursor.fetchone()
+            if latest is None:
+                return 0
+            latest = latest[0]
+            # Plain tuples load straight into a float array (epoch seconds and ids are exact in float64)
+            cursor.row_factory = None
+            cursor.execute('''
+                SELECT CAST(strftime('%s', r.parking_timestamp, 'unixepoch', 'localtime') AS INTEGER) AS parked_at,
+                       CAST(strftime('%s', r.leaving_timestamp, 'unixepoch', 'localtime') AS INTEGER) AS left_at,
+                       ps.lot_id, r.spot_id, COALESCE(r.parking_cost, 0), r.leaving_timestamp, r.id
+                FROM all_reservations r
+                JOIN parking_spots ps ON r.spot_id = ps.id
+                WHERE r.status = 'completed'
+                  AND r.leaving_timestamp >= ? AND r.leaving_timestamp <= ?
+                  AND r.id NOT IN (SELECT value FROM json_each(?))
+                  AND parked_at IS NOT NULL AND left_at IS NOT NULL
+            ''', (since, latest, json.dumps(seen)))
+            chunks = []
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                chunks.append(np.array(rows, dtype=np.float64))
+            if not chunks:
+                return 0
+            block = np.concatenate(chunks)
+            # Two releases can share a second, so remember every id loaded at the newest one
+            at_latest = block[block[:, 5] == latest, 6].astype(np.int64).tolist()
+            self.watermark = (latest, (seen if latest == since else []) + at_latest)
+            self.starts = np.concatenate((self.starts, block[:, 0].astype(np.int64)))
+            self.ends = np.concatenate((self.ends, block[:, 1].astype(np.int64)))
+            self.lot_ids = np.concatenate((self.lot_ids, block[:, 2].astype(np.int64)))
+            self.spot_ids = np.concatenate((self.spot_ids, block[:, 3].astype(np.int64)))
+            self.costs = np.concatenate((self.costs, block[:, 4]))
+            return len(block)
+
+
+def combine(parts):
+    """One ReservationColumns holding the rows of all `parts` (the part itself if there is only one)."""
+    if len(parts) == 1:
+        return parts[0]
+    combined = ReservationColumns()
+    for name in ('starts', 'ends', 'lot_ids', 'spot_ids', 'costs'):
+        setattr(combined, name, np.concatenate([getattr(part, name) for part in parts]))
+    return combined
+
+
+def parked_seconds_before(starts, ends, boundaries):
+    """G(t) for every t in boundaries: total seconds parked before t over all intervals.
+
+    G(t) = sum(t - s for s < t) - sum(t - e for e < t), evaluated with
+    searchsorted over the sorted starts/ends and their prefix sums. All int64,
+    so the result is exact.
+    """
+    total = np.zeros(len(boundaries), dtype=np.int64)
+    for points, sign in ((starts, 1), (ends, -1)):
+        points = np.sort(points)
+        prefix = np.concatenate(([0], np.cumsum(points)))
+        count = np.searchsorted(points, boundaries, side='left')
+        total += sign * (count * boundaries - prefix[count])
+    return total
+
+
+def _lot_index(lot_ids, keys):
+    """Position of every lot id in `keys` (-1 for lots that are not listed, e.g. deleted ones)."""
+    if not len(keys):
+        return np.full(len(lot_ids), -1, dtype=np.int64)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    pos = np.clip(np.searchsorted(sorted_keys, lot_ids), 0, len(keys) - 1)
+    return np.where(sorted_keys[pos] == lot_ids, order[pos], -1)
+
+
+def occupancy_report(columns, lots, days=DEFAULT_WINDOW_DAYS, now=None):
+    """Window metrics per lot.
+
+    `lots` is a list of (lot_id, name, total_spots). Returns a dict with the
+    hour-of-day heatmap, dwell histograms and per-lot revenue/turnover rows.
+    All lots are swept at once: lot k's clipped intervals are shifted into
+    their own segment [k * span, (k + 1) * span], so one G(t) evaluation over
+    every lot's hour boundaries gives the parked seconds of every bucket.
+    """
+    now = int(now if now is not None else _local_epoch())
+    window_end = (now // HOUR + 1) * HOUR
+    window_start = window_end - days * DAY
+    span = days * DAY
+    hours = days * 24
+    keys = np.array([lot[0] for lot in lots], dtype=np.int64)
+    capacity = np.array([lot[2] or 0 for lot in lots], dtype=np.float64)
+    lot_count = len(lots)
+
+    starts, ends, costs = columns.starts, columns.ends, columns.costs
+    lot_index = _lot_index(columns.lot_ids, keys)
+
+    # Occupancy: intervals touching the window, clipped to it and shifted into their lot's segment
+    touching = (lot_index >= 0) & (ends > window_start) & (starts < window_end)
+    offsets = lot_index[touching] * span
+    clipped_starts = np.clip(starts[touching] - window_start, 0, span) + offsets
+    clipped_ends = np.clip(ends[touching] - window_start, 0, span) + offsets
+    boundaries = (np.arange(lot_count, dtype=np.int64)[:, None] * span
+                  + np.arange(0, span + 1, HOUR, dtype=np.int64)[None, :])
+    parked_before = parked_seconds_before(clipped_starts, clipped_ends, boundaries.ravel())
+    parked = np.diff(parked_before.reshape(lot_count, hours + 1), axis=1)
+    # Fold the window's hourly buckets into hours of day (bucket j is hour (first_hour + j) % 24)
+    first_hour = (window_start // HOUR) % 24
+    by_hour = np.roll(parked.reshape(lot_count, days, 24).sum(axis=1), first_hour, axis=1) / (days * HOUR)
+    utilization = np.divide(by_hour * 100, capacity[:, None], out=np.zeros_like(by_hour),
+                            where=capacity[:, None] > 0)
+
+    # Completions (revenue, turnover, dwell) are counted by leaving time
+    completed = (lot_index >= 0) & (ends >= window_start) & (ends < window_end)
+    done_lots = lot_index[completed]
+    buckets = len(DWELL_LABELS)
+    dwell_bucket = np.searchsorted(DWELL_EDGES, (ends - starts)[completed], side='right')
+    dwell = np.bincount(done_lots * buckets + dwell_bucket, minlength=lot_count * buckets).reshape(lot_count, buckets)
+    counts = np.bincount(done_lots, minlength=lot_count)
+    revenue = np.bincount(done_lots, weights=costs[completed], minlength=lot_count)
+    revenue_per_spot_hour = np.divide(revenue, capacity * hours, out=np.zeros(lot_count), where=capacity > 0)
+    turnover = np.divide(counts, capacity * days, out=np.zeros(lot_count), where=capacity > 0)
+    occupied_hours = parked.sum(axis=1) / HOUR
+
+    heatmap, dwell_rows, lot_rows = [], [], []
+    for k, (lot_id, name, _) in enumerate(lots):
+        heatmap.append({'lot_id': lot_id, 'name': name,
+                        'occupied': by_hour[k].round(2).tolist(),
+                        'utilization': utilization[k].round(1).tolist()})
+        dwell_rows.append({'lot_id': lot_id, 'name': name, 'counts': dwell[k].tolist()})
+        lot_rows.append({'lot_id': lot_id, 'name': name,
+                         'completed': int(counts[k]),
+                         'revenue': float(revenue[k]),
+                         'revenue_per_spot_hour': float(revenue_per_spot_hour[k]),
+                         'turnover': float(turnover[k]),
+                         'occupied_hours': float(occupied_hours[k])})
+    return {'days': days, 'heatmap': heatmap, 'dwell': dwell_rows, 'dwell_labels': DWELL_LABELS,
+            'lots': lot_rows}
+
+
+def _local_epoch():
+    # Local wall clock as if it were UTC, matching the 'localtime' seconds the columns are loaded as
+    return calendar.timegm(datetime.now().timetuple())
+
+
+def get_analytics(index=0):
+    """Return the current app's cached reservation columns of one shard (created on first use)."""
+    shards = current_app.extensions.setdefault('reservation_columns', {})
+    columns = shards.get(index)
+    if columns is None:
+        columns = shards.setdefault(index, ReservationColumns())
+    return columns
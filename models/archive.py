@@ -0,0 +1,112 @@
+# Yeh archive.py file hai. Purani completed reservations 'reservations' table se 'reservations_archive' me shift hoti hain,
+# taaki active reservations wali (hot) table chhoti rahe aur uske lookups tez rahein.
+# History, exports aur reports dono tables padhte hain (all_reservations view), isliye user ko koi farak nahi dikhta.
+# Chalane ka tareeka: flask --app app archive-reservations --days 180
+"""
+archive.py
+----------
+Archival of completed reservations.
+
+- reservations_archive has the reservation columns and ids, with its own
+  indexes for the history, export and completion lookups. all_reservations is
+  a UNION ALL view over both tables; SQLite pushes filters into each side,
+  so the read paths keep using indexes. Paged history reads use
+  newest_reservations_sql(), which limits each side before merging.
+- archive_reservations() moves completed reservations that left before a
+  cutoff in batches of ARCHIVE_BATCH_SIZE, each its own short write
+  transaction (copy, then delete), so bookings are never blocked for long.
+  Ids are kept, and the reservations table is AUTOINCREMENT, so they are never
+  reused.
+- Active reservations are never archived: everything that looks up active
+  rows (release, spot listing, user deletion) only reads the hot table.
+"""
+
+import json
+
+from models.db import write_transaction
+from models.timestamps import now_epoch
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 180
+ARCHIVE_BATCH_SIZE = 5000
+
+COLUMNS = 'id, spot_id, user_id, vehicle_number, parking_timestamp, leaving_timestamp, parking_cost, status'
+
+
+def create_archive_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reservations_archive (
+            id INTEGER PRIMARY KEY,
+            spot_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            vehicle_number TEXT NOT NULL,
+            parking_timestamp DATETIME NOT NULL,
+            leaving_timestamp DATETIME,
+            parking_cost REAL,
+            status TEXT DEFAULT 'completed'
+        )
+    ''')
+    # Same lookups as the hot table: history, lot exports, date-range exports, analytics loads
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_archive_user_parked ON reservations_archive (user_id, parking_timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_archive_spot_parked ON reservations_archive (spot_id, parking_timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_archive_parked ON reservations_archive (parking_timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_archive_left ON reservations_archive (leaving_timestamp)')
+    cursor.execute(f'''
+        CREATE VIEW IF NOT EXISTS all_reservations AS
+        SELECT {COLUMNS} FROM reservations
+        UNION ALL
+        SELECT {COLUMNS} FROM reservations_archive
+    ''')
+
+
+def newest_reservations_sql(where):
+    """Subquery over hot and archived reservations matching `where`, newest first, LIMIT ? per table.
+
+    Each table walks its own (user_id, parking_timestamp) style index for at most
+    LIMIT rows, so a history page sorts no more than two pages of rows. Pass the
+    parameters of `where` followed by the limit, once per table.
+    """
+    return f'''(
+        SELECT * FROM (SELECT {COLUMNS} FROM reservations WHERE {where}
+                       ORDER BY parking_timestamp DESC, id DESC LIMIT ?)
+        UNION ALL
+        SELECT * FROM (SELECT {COLUMNS} FROM reservations_archive WHERE {where}
+                       ORDER BY parking_timestamp DESC, id DESC LIMIT ?)
+    )'''
+
+
+def archive_cutoff(days, now=None):
+    """Epoch seconds before which completed reservations are archived (`now` in epoch seconds too)."""
+    return (now_epoch() if now is None else now) - days * 24 * 3600
+
+
+def archive_reservations(conn, before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move completed reservations that left before `before` to the archive; returns how many moved."""
+    moved = 0
+
+    def move_batch(cursor):
+        cursor.execute('''
+            SELECT id FROM reservations
+            WHERE status = 'completed' AND leaving_timestamp < ?
+            ORDER BY leaving_timestamp
+            LIMIT ?
+        ''', (before, batch_size))
+        ids = json.dumps([row[0] for row in cursor.fetchall()])
+        cursor.execute(f'''
+            INSERT INTO reservations_archive ({COLUMNS})
+            SELECT {COLUMNS} FROM reservations WHERE id IN (SELECT value FROM json_each(?))
+        ''', (ids,))
+        cursor.execute('DELETE FROM reservations WHERE id IN (SELECT value FROM json_each(?))', (ids,))
+        return cursor.rowcount
+
+    while True:
+        count = write_transaction(conn, move_batch)
+        moved += count
+        if count < batch_size:
+            return moved
+
+
+def archive_stats(cursor):
+    """(rows in the hot table, rows in the archive)."""
+    hot = cursor.execute('SELECT COUNT(*) FROM reservations').fetchone()[0]
+    archived = cursor.execute('SELECT COUNT(*) FROM reservations_archive').fetchone()[0]
+    return hot, archived
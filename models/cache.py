@@ -0,0 +1,190 @@
+# Yeh cache.py file hai. Parking lots ki list aur availability bahut baar padhi jaati hai, par badalti kam hai,
+# isliye woh (aur uske rendered pages) memory me cache hote hain.
+# Booking, release ya lot add/edit/delete hote hi lots_changed() cache saaf kar deta hai; TTL ke baad bhi entry apne aap purani ho jaati hai
+# (doosre worker ke changes ke liye). Pages pe ETag/Last-Modified lagta hai, taaki browser/kiosk ko 304 mil sake.
+"""
+cache.py
+--------
+Event-invalidated cache for lot availability and the pages built from it.
+
+- TTLCache is a size-bounded LRU (OrderedDict) with a TTL fallback. Entries carry
+  tags; invalidate(tag) drops exactly the entries with that tag. Hit, miss,
+  eviction, expiry and invalidation counts are kept for stats().
+- lot_availability() returns the LotAvailability rows with an ETag (hash of
+  the rows) and the time they last changed, cached under the 'lots' tag. With
+  sharded storage the rows are read from every shard and merged by lot id.
+- lots_changed() is called after every booking, release and lot add/edit/delete
+  commit; changes made by another worker are picked up when the TTL runs out.
+- cached_page() serves a rendered page from the cache with ETag and
+  Last-Modified headers and answers conditional requests with 304.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+
+from flask import current_app, make_response, request, session
+
+from models.repository import lot_availability_rows
+from models.shards import fan_out
+
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_CACHE_TTL = 5.0
+
+# Lot rows plus their validators: etag changes whenever the rows do
+LotSnapshot = namedtuple('LotSnapshot', ['rows', 'etag', 'last_modified'])
+
+_MISSING = object()
+
+
+class TTLCache:
+    """A thread-safe LRU cache with per-entry TTL and tag-based invalidation."""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at, tags)
+        self._tags = {}                # tag -> set of keys
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_load(self, key, load, tags=()):
+        """Return the cached value, or call load() and cache its result."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = load()
+            self.set(key, value, tags)
+        return value
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of the tags; returns how many were dropped."""
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+
+class ResponseCache(TTLCache):
+    """The app's cache; also remembers when each snapshot's content last changed."""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        super().__init__(max_entries, ttl)
+        self._versions = {}  # snapshot name -> (etag, last_modified)
+
+    def version(self, name, etag):
+        """Last-Modified for a snapshot: unchanged while its etag stays the same."""
+        with self._lock:
+            current = self._versions.get(name)
+            if current is None or current[0] != etag:
+                current = self._versions[name] = (etag, datetime.now(timezone.utc).replace(microsecond=0))
+            return current[1]
+
+
+def get_cache():
+    """Return the current app's response cache."""
+    return current_app.extensions['response_cache']
+
+
+def init_app(app):
+    """Create the app's response cache (RESPONSE_CACHE_SIZE entries, RESPONSE_CACHE_TTL seconds)."""
+    app.config.setdefault('RESPONSE_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+    app.config.setdefault('RESPONSE_CACHE_TTL', DEFAULT_CACHE_TTL)
+    cache = ResponseCache(app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_TTL'])
+    app.extensions['response_cache'] = cache
+    return cache
+
+
+def lot_availability():
+    """All lots as LotAvailability rows (by id) in a cached LotSnapshot."""
+    cache = get_cache()
+
+    def load():
+        shards = fan_out(lambda conn: lot_availability_rows(conn.cursor()))
+        rows = sorted((row for rows in shards for row in rows), key=lambda row: row.id)
+        etag = hashlib.sha1(repr(rows).encode()).hexdigest()[:16]
+        return LotSnapshot(rows, etag, cache.version('lot_availability', etag))
+
+    return cache.get_or_load('lot_availability', load, tags=('lots',))
+
+
+def lots_changed():
+    """Drop everything built from lot availability; call after the change is committed."""
+    get_cache().invalidate('lots')
+
+
+def cached_page(name, snapshot, render):
+    """Serve a page built only from `snapshot` (and the logged-in user), with validators.
+
+    The rendered HTML is cached per (page, user, etag). A pending flash message
+    is part of the page, so then the page is rendered fresh and not cached.
+    """
+    if session.get('_flashes'):
+        return render()
+    etag = f"{snapshot.etag}-{session.get('user_id')}"
+    html = get_cache().get_or_load(('page', name, etag), render, tags=('lots',))
+    response = make_response(html)
+    response.set_etag(etag)
+    response.last_modified = snapshot.last_modified
+    # Browsers may keep the page but must revalidate it (cheap 304) before reuse
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
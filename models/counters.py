@@ -0,0 +1,65 @@
+# Yeh counters.py file hai. Har parking lot ke available/occupied spots ka count yahin maintain hota hai.
+# Booking, release aur lot add/edit ke time pe counters yahin ke functions se update hote hain.
+# Agar counters galat ho jaayein toh rebuild_lot_counters() se dubara ban jaate hain.
+"""
+counters.py
+-----------
+Per-lot availability counters stored on parking_lots (available_spots, occupied_spots).
+
+Listing pages read the counters instead of running COUNT/SUM over parking_spots,
+so they cost O(lots) instead of O(spots) (models.repository.lot_availability_rows). Every code path that changes spot
+status calls adjust_lot_counters() inside the same transaction as the spot update.
+check_lot_counters() / rebuild_lot_counters() find and repair any drift.
+"""
+
+# Actual counts per lot, computed from the spot rows
+_ACTUAL_COUNTS_SQL = '''
+    SELECT pl.id,
+           COALESCE(SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END), 0) AS available_spots,
+           COALESCE(SUM(CASE WHEN ps.status = 'O' THEN 1 ELSE 0 END), 0) AS occupied_spots
+    FROM parking_lots pl
+    LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
+'''
+
+
+def ensure_counter_columns(cursor):
+    """Add the counter columns to an older parking_lots table and fill them in."""
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(parking_lots)')]
+    if 'available_spots' in columns:
+        return
+    cursor.execute('ALTER TABLE parking_lots ADD COLUMN available_spots INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('ALTER TABLE parking_lots ADD COLUMN occupied_spots INTEGER NOT NULL DEFAULT 0')
+    rebuild_lot_counters(cursor)
+
+
+def adjust_lot_counters(cursor, lot_id, available_delta=0, occupied_delta=0):
+    """Shift a lot's counters; call inside the transaction that changes the spots."""
+    cursor.execute('''
+        UPDATE parking_lots
+        SET available_spots = available_spots + ?, occupied_spots = occupied_spots + ?
+        WHERE id = ?
+    ''', (available_delta, occupied_delta, lot_id))
+
+
+def check_lot_counters(cursor):
+    """Return (lot_id, stored available, stored occupied, actual available, actual occupied) for drifted lots."""
+    cursor.execute(f'''
+        SELECT pl.id, pl.available_spots, pl.occupied_spots,
+               actual.available_spots, actual.occupied_spots
+        FROM parking_lots pl
+        JOIN ({_ACTUAL_COUNTS_SQL} GROUP BY pl.id) actual ON actual.id = pl.id
+        WHERE pl.available_spots != actual.available_spots
+           OR pl.occupied_spots != actual.occupied_spots
+    ''')
+    return [tuple(row) for row in cursor.fetchall()]
+
+
+def rebuild_lot_counters(cursor, lot_id=None):
+    """Recompute the counters from parking_spots, for one lot or for all of them."""
+    where, params = ('WHERE pl.id = ?', (lot_id,)) if lot_id is not None else ('', ())
+    cursor.execute(f'{_ACTUAL_COUNTS_SQL} {where} GROUP BY pl.id', params)
+    rows = [(row[1], row[2], row[0]) for row in cursor.fetchall()]
+    cursor.executemany('''
+        UPDATE parking_lots SET available_spots = ?, occupied_spots = ? WHERE id = ?
+    ''', rows)
+    return len(rows)
@@ -0,0 +1,193 @@
+# Yeh db.py file hai. Saare routes ka database connection yahin se aata hai.
+# Har request ko pool se ek connection milta hai, aur request khatam hone pe wapas pool me chala jata hai.
+# Database ka path app.config['DATABASE'] (ya PARKING_DB env variable) se set hota hai.
+"""
+db.py
+-----
+Shared SQLite connection layer for the Vehicle Parking System.
+
+- connect() opens a connection with WAL journaling and tuned pragmas, so readers
+  never wait on booking writes.
+- ConnectionPool keeps idle connections per database file, so a request does not
+  pay for sqlite3.connect() and pragma setup every time. Pools belong to the
+  process that opened them: after a fork the child starts with no pools and
+  never touches the parent's connections.
+- get_db() hands out one pooled connection per app context (stored on flask.g);
+  close_db() returns it to the pool when the app context is torn down.
+- write_transaction() runs a unit of work under BEGIN IMMEDIATE with bounded retry
+  when another writer holds the lock.
+"""
+
+import os
+import pathlib
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g
+
+DEFAULT_DATABASE = 'parking.db'
+DEFAULT_POOL_SIZE = 8
+WRITE_RETRIES = 5
+# Compiled statements kept per connection; the app's distinct queries (models/repository.py and friends) all fit
+STATEMENT_CACHE_SIZE = 256
+
+# Applied to every new connection. journal_mode is stored in the database file,
+# the rest are per-connection settings.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 134217728',
+)
+
+
+def connect(path=DEFAULT_DATABASE, factory=sqlite3.Connection):
+    """Open a new tuned connection with named row access (factory: a sqlite3.Connection subclass)."""
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False, factory=factory,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def connect_readonly(path):
+    """Open an existing database read-only, without pragmas (sqlite3.OperationalError if it is missing)."""
+    conn = sqlite3.connect(pathlib.Path(path).resolve().as_uri() + '?mode=ro', uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class DatabaseBusy(Exception):
+    """Raised when a write transaction could not get the lock after all retries."""
+
+
+def _is_busy(error):
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+def write_transaction(conn, work, retries=WRITE_RETRIES):
+    """Run work(cursor) in one BEGIN IMMEDIATE transaction and return its result.
+
+    The write lock is taken up front, so nothing read inside `work` can change
+    before the commit. If the lock stays busy (beyond busy_timeout), the whole
+    unit is retried with jittered backoff, then DatabaseBusy is raised. Any
+    other exception rolls back and propagates.
+    """
+    for attempt in range(retries + 1):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            result = work(conn.cursor())
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as error:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _is_busy(error):
+                raise
+            if attempt == retries:
+                raise DatabaseBusy(str(error)) from error
+            time.sleep(0.01 * (2 ** attempt) * (1 + random.random()))
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+class ConnectionPool:
+    """A bounded pool of idle connections to one database file."""
+
+    def __init__(self, path, size=DEFAULT_POOL_SIZE, factory=sqlite3.Connection):
+        self.path = path
+        self.factory = factory
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        """Return an idle connection, or open a new one if none is free."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.path, self.factory)
+        if hasattr(conn, 'take_stats'):
+            # Metrics connection (models/metrics.py): whatever the last borrower ran is not ours
+            conn.take_stats()
+        return conn
+
+    def release(self, conn):
+        """Give a connection back; anything left uncommitted is rolled back."""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown and in tests)."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Pools inherited through fork(): kept referenced so their connections are never closed (or used) here
+_inherited_pools = []
+
+
+def _forget_pools_after_fork():
+    # SQLite connections must not cross fork(): the child starts with fresh pools
+    global _pools, _pools_lock
+    _inherited_pools.append(_pools)
+    _pools, _pools_lock = {}, threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_pools_after_fork)
+
+
+def get_pool(path, size=DEFAULT_POOL_SIZE, factory=sqlite3.Connection):
+    """Return the shared pool for a database file and connection class, creating it on first use."""
+    key = (path, factory)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(path, size, factory)
+    return pool
+
+
+def get_db():
+    """Return this request's pooled connection (opened lazily on first call)."""
+    if 'db' not in g:
+        pool = get_pool(current_app.config['DATABASE'], current_app.config['DB_POOL_SIZE'],
+                        current_app.config['DB_CONNECTION_FACTORY'])
+        g.db_pool = pool
+        g.db = pool.acquire()
+    return g.db
+
+
+def close_db(exception=None):
+    """Return the request's connection to its pool at app context teardown."""
+    conn = g.pop('db', None)
+    pool = g.pop('db_pool', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+def init_app(app):
+    """Set the database config defaults and register the teardown hook."""
+    app.config.setdefault('DATABASE', os.environ.get('PARKING_DB', DEFAULT_DATABASE))
+    app.config.setdefault('DB_POOL_SIZE', DEFAULT_POOL_SIZE)
+    # Connection class for request connections; models/metrics.py swaps in an instrumented one
+    app.config.setdefault('DB_CONNECTION_FACTORY', sqlite3.Connection)
+    app.teardown_appcontext(close_db)
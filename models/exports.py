@@ -0,0 +1,234 @@
+# Yeh exports.py file hai. Admin yahan se reservations aur lot occupancy CSV ya NDJSON me download karta hai.
+# Rows ek saath memory me load nahi hoti: cursor se fixed batch me padh ke seedha response me likhi jaati hain,
+# isliye laakhon rows ka export bhi kam memory me chal jaata hai.
+"""
+exports.py
+----------
+Streaming CSV / NDJSON exports for the admin reports page.
+
+- reservation_rows() and occupancy_rows() are generators that read their cursor
+  with fetchmany(EXPORT_BATCH_SIZE), so at most one batch is held in memory.
+- Date-range filters are index range seeks (idx_reservations_parked); a lot
+  filter walks the lot's spots (idx_parking_spots_lot_id) and each spot's
+  reservations in time order (idx_reservations_spot_parked), so no export ever
+  needs a temporary sort.
+- Reservation times are exported as stored, in epoch seconds.
+- Reservation exports read the hot table and the archive (models/archive.py)
+  with the same query each, and merge the two sorted streams.
+- stream_export() opens its own connection for the lifetime of the download:
+  the export reads one consistent WAL snapshot and does not hold a pooled
+  connection while the client is downloading.
+- With sharded storage (models/shards.py) it opens one connection per shard
+  and merges their sorted streams the same way; usernames and full names,
+  which live in the directory database, are filled in per batch.
+"""
+
+import csv
+import heapq
+import io
+import json
+from datetime import date, timedelta
+
+from models.db import connect
+from models.repository import get_users
+from models.timestamps import to_epoch
+
+EXPORT_BATCH_SIZE = 1000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+RESERVATION_COLUMNS = (
+    'reservation_id', 'lot_id', 'prime_location_name', 'spot_id', 'user_id', 'username',
+    'full_name', 'vehicle_number', 'parking_timestamp', 'leaving_timestamp', 'parking_cost', 'status',
+)
+
+OCCUPANCY_COLUMNS = (
+    'lot_id', 'prime_location_name', 'price', 'total_spots', 'available_spots', 'occupied_spots',
+    'utilization',
+)
+
+
+class ExportFilterError(ValueError):
+    """A date or lot filter from the query string could not be parsed."""
+
+
+def parse_filters(args):
+    """Read `from`, `to` (YYYY-MM-DD, inclusive) and `lot_id` from request args.
+
+    Returns (start, end, lot_id) with start and end as the epoch seconds of local
+    midnight on `from` and on the day after `to`, ready for a half-open
+    `parking_timestamp >= start AND parking_timestamp < end` range.
+    """
+    try:
+        start = to_epoch(date.fromisoformat(args['from'])) if args.get('from') else None
+        end = to_epoch(date.fromisoformat(args['to']) + timedelta(days=1)) if args.get('to') else None
+    except ValueError:
+        raise ExportFilterError('Dates must be in YYYY-MM-DD format')
+    try:
+        lot_id = int(args['lot_id']) if args.get('lot_id') else None
+    except ValueError:
+        raise ExportFilterError('Lot id must be a number')
+    return start, end, lot_id
+
+
+def _batches(cursor, batch_size):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def reservation_query(start=None, end=None, lot_id=None, table='reservations'):
+    """Build the (sql, params) of a filtered reservation export over one table (hot or archive)."""
+    conditions, params = [], []
+    if lot_id is not None:
+        conditions.append('ps.lot_id = ?')
+        params.append(lot_id)
+    if start is not None:
+        conditions.append('r.parking_timestamp >= ?')
+        params.append(start)
+    if end is not None:
+        conditions.append('r.parking_timestamp < ?')
+        params.append(end)
+    where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+    # Ordering follows the index the filter uses, so rows stream straight off it
+    order = 'ps.id, r.parking_timestamp, r.id' if lot_id is not None else 'r.parking_timestamp, r.id'
+    sql = f'''
+        SELECT r.id, ps.lot_id, pl.prime_location_name, r.spot_id, r.user_id, u.username,
+               u.full_name, r.vehicle_number, r.parking_timestamp, r.leaving_timestamp,
+               r.parking_cost, r.status
+        FROM parking_spots ps
+        JOIN {table} r ON r.spot_id = ps.id
+        JOIN parking_lots pl ON ps.lot_id = pl.id
+        LEFT JOIN users u ON r.user_id = u.id
+        {where}
+        ORDER BY {order}
+    '''
+    return sql, params
+
+
+def _table_rows(conn, table, start, end, lot_id, batch_size):
+    cursor = conn.cursor()
+    cursor.execute(*reservation_query(start, end, lot_id, table))
+    for rows in _batches(cursor, batch_size):
+        yield from (tuple(row) for row in rows)
+
+
+def reservation_rows(conn, start=None, end=None, lot_id=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield batches of reservation tuples (RESERVATION_COLUMNS order) joined with lot and user.
+
+    `conn` may be a list of shard connections; their rows are merged in order.
+    """
+    # Same order as reservation_query: (spot, parked, id) with a lot filter, else (parked, id)
+    if lot_id is not None:
+        key = lambda row: (row[3], row[8], row[0])
+    else:
+        key = lambda row: (row[8], row[0])
+    conns = conn if isinstance(conn, list) else [conn]
+    merged = heapq.merge(*(_table_rows(shard, table, start, end, lot_id, batch_size)
+                           for shard in conns
+                           for table in ('reservations_archive', 'reservations')), key=key)
+    batch = []
+    for row in merged:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _with_user_names(batches, cursor):
+    # Shards have no users: look up the names of a batch in the directory at once
+    for rows in batches:
+        missing = {row[4] for row in rows if row[5] is None and row[4] is not None}
+        users = get_users(cursor, missing) if missing else {}
+        yield [row[:5] + (users[row[4]].username, users[row[4]].full_name) + row[7:] if row[4] in users else row
+               for row in rows]
+
+
+def _lot_occupancy_rows(conn, lot_id):
+    where, params = ('WHERE id = ?', (lot_id,)) if lot_id is not None else ('', ())
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, prime_location_name, price,
+               available_spots + occupied_spots AS total_spots,
+               available_spots, occupied_spots,
+               ROUND(CASE WHEN available_spots + occupied_spots > 0
+                          THEN occupied_spots * 100.0 / (available_spots + occupied_spots)
+                          ELSE 0 END, 1) AS utilization
+        FROM parking_lots
+        {where}
+        ORDER BY id
+    ''', params)
+    for row in cursor:
+        yield tuple(row)
+
+
+def occupancy_rows(conn, lot_id=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield batches of per-lot occupancy tuples (OCCUPANCY_COLUMNS order) from the lot counters.
+
+    `conn` may be a list of shard connections; lots are merged by id.
+    """
+    conns = conn if isinstance(conn, list) else [conn]
+    merged = heapq.merge(*(_lot_occupancy_rows(shard, lot_id) for shard in conns), key=lambda row: row[0])
+    batch = []
+    for row in merged:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def csv_lines(columns, batches):
+    """Encode batches as CSV text: one header chunk, then one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def ndjson_lines(columns, batches):
+    """Encode batches as newline-delimited JSON objects, one chunk per batch."""
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+def stream_export(path, kind, fmt, start=None, end=None, lot_id=None, batch_size=EXPORT_BATCH_SIZE,
+                  shard_paths=None, connector=connect):
+    """Yield the encoded chunks of a 'reservations' or 'occupancy' export from its own connection(s).
+
+    `path` is the (directory) database; pass `shard_paths` when storage is sharded.
+    Files are opened with `connector` (e.g. models.snapshot.connect_snapshot).
+    """
+    conn = connector(path)
+    shards = [connector(shard_path) for shard_path in shard_paths] if shard_paths else [conn]
+    try:
+        if kind == 'reservations':
+            columns = RESERVATION_COLUMNS
+            batches = reservation_rows(shards, start, end, lot_id, batch_size)
+            if shard_paths:
+                batches = _with_user_names(batches, conn.cursor())
+        else:
+            columns = OCCUPANCY_COLUMNS
+            batches = occupancy_rows(shards, lot_id, batch_size)
+        encode = csv_lines if fmt == 'csv' else ndjson_lines
+        # One read transaction per file: every batch of a shard comes from the same snapshot
+        for opened in {id(shard): shard for shard in shards + [conn]}.values():
+            opened.execute('BEGIN')
+        yield from encode(columns, batches)
+    finally:
+        for opened in {id(shard): shard for shard in shards + [conn]}.values():
+            opened.rollback()
+            opened.close()
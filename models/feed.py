@@ -0,0 +1,233 @@
+# Yeh feed.py file hai. Lobby screens aur user dashboard ko live free-spot count yahin se milta hai (Server-Sent Events).
+# Booking/release ke baad spots_changed() ek hi query se badle hue lots padhta hai aur sab subscribers ko event bhej deta hai,
+# isliye sau screens ka kharcha ek broadcast hai, sau queries nahi.
+# Har client ki queue chhoti (bounded) hai; agar client peeche reh jaaye toh queue bharne pe usse poora snapshot dobara milta hai.
+"""
+feed.py
+-------
+Live lot availability fan-out for the SSE endpoint (/api/v1/lots/stream).
+
+- AvailabilityFeed keeps the last known counters of every lot and a set of
+  Subscriptions, each with a bounded queue. load() updates the state and puts
+  each delta on every interested subscriber queue without blocking.
+- A subscriber whose queue is full is marked overflowed instead of blocking
+  the publisher; its stream drops the backlog and resends a snapshot from the
+  in-memory state (deltas are absolute counts, so nothing is lost).
+- spots_changed() is called after a booking, release or lot change commits:
+  it invalidates the lot cache and reads the changed lots once, from the
+  shard that holds them (models/shards.py).
+- sync() re-reads all lot counters at most every FEED_SYNC_INTERVAL seconds
+  (idle streams poll it every min(FEED_HEARTBEAT, FEED_SYNC_INTERVAL) seconds),
+  so changes committed by another worker process reach this worker's
+  subscribers within about FEED_SYNC_INTERVAL. It reads every shard.
+"""
+
+import json
+import queue
+import threading
+import time
+
+from flask import current_app
+
+from models.cache import lots_changed
+from models.shards import get_router, shard_db
+
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_HEARTBEAT = 15.0
+DEFAULT_SYNC_INTERVAL = 5.0
+
+
+class Subscription:
+    """One connected screen: a bounded queue of deltas for the lots it watches."""
+
+    def __init__(self, lot_ids=None, maxsize=DEFAULT_QUEUE_SIZE):
+        self.lot_ids = set(lot_ids) if lot_ids else None
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+        self.dropped = 0
+
+    def wants(self, lot_id):
+        return self.lot_ids is None or lot_id in self.lot_ids
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+            self.dropped += 1
+
+    def drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class AvailabilityFeed:
+    """Last known lot counters plus the subscribers that receive their changes."""
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.queue_size = queue_size
+        self.sync_interval = sync_interval
+        self.state = None            # lot_id -> {'lot_id', 'available', 'occupied'}
+        self.subscribers = set()
+        self.published = 0
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def subscribe(self, lot_ids=None):
+        subscription = Subscription(lot_ids, self.queue_size)
+        with self._lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscribers.discard(subscription)
+
+    def load(self, conn, lot_ids=None):
+        """Read lot counters (all lots, or only lot_ids) and publish the ones that changed.
+
+        `conn` is one connection, or a list of them (every shard) for a full read.
+        """
+        if lot_ids is None:
+            conns = conn if isinstance(conn, list) else [conn]
+            rows = [row for shard in conns
+                    for row in shard.execute('SELECT id, available_spots, occupied_spots FROM parking_lots')]
+        else:
+            lot_ids = sorted(set(lot_ids))
+            placeholders = ', '.join('?' * len(lot_ids))
+            rows = conn.execute(f'''
+                SELECT id, available_spots, occupied_spots FROM parking_lots WHERE id IN ({placeholders})
+            ''', lot_ids).fetchall() if lot_ids else []
+        current = {row[0]: {'lot_id': row[0], 'available': row[1], 'occupied': row[2]} for row in rows}
+        with self._lock:
+            first_load = self.state is None
+            if first_load:
+                self.state = {}
+            checked = self.state.keys() | current.keys() if lot_ids is None else lot_ids
+            changes = []
+            for lot_id in list(checked):
+                new, old = current.get(lot_id), self.state.get(lot_id)
+                if new == old:
+                    continue
+                if new is None:
+                    del self.state[lot_id]
+                    new = {'lot_id': lot_id, 'removed': True}
+                else:
+                    self.state[lot_id] = new
+                changes.append(new)
+            if lot_ids is None:
+                self._last_sync = time.monotonic()
+            if not first_load:
+                self._broadcast(changes)
+        return changes
+
+    def _broadcast(self, changes):
+        # Called with the lock held: one non-blocking put per subscriber and delta
+        for change in changes:
+            self.published += 1
+            for subscription in self.subscribers:
+                if subscription.wants(change['lot_id']):
+                    subscription.push(change)
+
+    def snapshot(self, subscription):
+        with self._lock:
+            return [lot for lot_id, lot in sorted((self.state or {}).items()) if subscription.wants(lot_id)]
+
+    def sync(self, connect_db):
+        """Re-read all lots if the last full read is older than sync_interval (or never happened).
+
+        connect_db() opens a new connection, or a list of them (one per shard).
+        """
+        if self.state is not None and time.monotonic() - self._last_sync < self.sync_interval:
+            return
+        # One stream does the read; the others keep waiting on their queues
+        # (only the very first read is waited for, so every stream starts from a real snapshot)
+        if not self._sync_lock.acquire(blocking=self.state is None):
+            return
+        try:
+            conn = connect_db()
+            try:
+                self.load(conn)
+            finally:
+                for opened in conn if isinstance(conn, list) else [conn]:
+                    opened.close()
+        finally:
+            self._sync_lock.release()
+
+    def stats(self):
+        return {
+            'subscribers': len(self.subscribers),
+            'published': self.published,
+            'dropped': sum(subscription.dropped for subscription in list(self.subscribers)),
+        }
+
+
+def get_feed():
+    """Return the current app's availability feed."""
+    return current_app.extensions['availability_feed']
+
+
+def init_app(app):
+    """Create the app's feed (FEED_QUEUE_SIZE, FEED_HEARTBEAT, FEED_SYNC_INTERVAL)."""
+    app.config.setdefault('FEED_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+    app.config.setdefault('FEED_HEARTBEAT', DEFAULT_HEARTBEAT)
+    app.config.setdefault('FEED_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL)
+    feed = AvailabilityFeed(app.config['FEED_QUEUE_SIZE'], app.config['FEED_SYNC_INTERVAL'])
+    app.extensions['availability_feed'] = feed
+    return feed
+
+
+def spots_changed(lot_ids):
+    """After a committed booking/release/lot change: drop cached lot pages and push the new counts."""
+    lots_changed()
+    feed = get_feed()
+    if feed.state is not None:
+        router = get_router()
+        by_shard = {}
+        for lot_id in lot_ids:
+            by_shard.setdefault(router.for_lot(lot_id), []).append(lot_id)
+        for index, shard_lots in by_shard.items():
+            feed.load(shard_db(index), shard_lots)
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+def stream(feed, lot_ids, connect_db, heartbeat=DEFAULT_HEARTBEAT):
+    """Yield the SSE stream of one subscriber: a snapshot, then deltas, with heartbeats.
+
+    An idle stream wakes every min(heartbeat, sync_interval) seconds to sync(), so
+    changes from other workers arrive within FEED_SYNC_INTERVAL; it pings only
+    after `heartbeat` seconds without output.
+    """
+    subscription = feed.subscribe(lot_ids)
+    poll = min(heartbeat, feed.sync_interval)
+    last_sent = time.monotonic()
+    try:
+        feed.sync(connect_db)
+        yield 'retry: 3000\n\n'
+        yield _sse('snapshot', feed.snapshot(subscription))
+        while True:
+            if subscription.overflowed:
+                # Fell behind: the backlog is stale anyway, resend the current state
+                subscription.drain()
+                subscription.overflowed = False
+                yield _sse('snapshot', feed.snapshot(subscription))
+            try:
+                change = subscription.queue.get(timeout=poll)
+            except queue.Empty:
+                feed.sync(connect_db)
+                if time.monotonic() - last_sent >= heartbeat:
+                    last_sent = time.monotonic()
+                    yield ': ping\n\n'
+                continue
+            last_sent = time.monotonic()
+            yield _sse('availability', change)
+    finally:
+        # Runs when the client disconnects and the server closes the generator
+        feed.unsubscribe(subscription)
@@ -0,0 +1,443 @@
+# Yeh jobs.py file hai. Maintenance ka kaam (rollups, counters ki jaanch, archive, ANALYZE/vacuum/checkpoint,
+# bahut purani 'active' reservations dhoondhna) ab request ke andar nahi, background scheduler me chalta hai.
+# Har worker process me ek chhota scheduler thread hota hai, par jobs sirf wahi process chalata hai jiske paas
+# database me "lease" hai (leader); leader band ho jaaye toh lease khatam hone pe koi doosra worker le leta hai.
+# Har job kab chala, kitna time laga, kya result aaya: sab job_state/job_runs tables me save hota hai aur /admin/jobs pe dikhta hai.
+"""
+jobs.py
+-------
+In-process background scheduler for maintenance jobs.
+
+- JOBS lists the jobs: name, default interval (seconds) and func(app). Each
+  job opens its own connections, outside any request. JOB_INTERVALS in the
+  config overrides intervals by name; 0 turns a job off.
+- Every worker process runs a Scheduler thread (with JOBS_ENABLED) that wakes
+  every JOB_TICK seconds. Only the process holding the `scheduler` row of
+  scheduler_lease runs jobs: it takes or renews the lease (JOB_LEASE_TTL
+  seconds) with one conditional UPSERT in a write transaction, so exactly one
+  process wins. If the leader dies, another worker takes over once its lease
+  expires.
+- Due jobs run on a small thread pool (JOB_WORKERS). Before a job starts, its
+  next run time is moved forward in job_state, so a job never runs twice at
+  once even across a leader change. Each run is recorded in job_state (last
+  run) and job_runs (the last RUNS_KEPT runs per job), which the admin jobs
+  page shows. A job's first run is one interval after the scheduler first
+  sees it.
+- run_soon(conn, name) makes a job due now; the leader picks it up on its
+  next tick.
+
+All state lives in the directory database (DATABASE); the jobs themselves
+work through every storage file (every shard, or the one database).
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from models.archive import archive_cutoff, archive_reservations
+from models.counters import check_lot_counters, rebuild_lot_counters
+from models.db import connect, write_transaction
+from models.rollups import rebuild_rollups_in_batches
+from models.timestamps import now_epoch
+
+DEFAULT_TICK = 10
+DEFAULT_LEASE_TTL = 60
+DEFAULT_WORKERS = 2
+DEFAULT_STALE_ACTIVE_HOURS = 72
+# Vacuum only files with at least this share of free pages
+VACUUM_FREE_RATIO = 0.2
+# PRAGMA auto_vacuum value set by migration 13 (models/schema.py)
+INCREMENTAL_VACUUM = 2
+# Free pages returned per write transaction, and the pause that lets bookings in between
+VACUUM_STEP_PAGES = 500
+VACUUM_STEP_PAUSE = 0.05
+ANALYSIS_LIMIT = 1000
+RUNS_KEPT = 50
+LEASE_NAME = 'scheduler'
+
+job_log = logging.getLogger('parking.jobs')
+
+Job = namedtuple('Job', ['name', 'interval', 'func', 'description'])
+
+
+def create_job_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_state (
+            name TEXT PRIMARY KEY,
+            next_run INTEGER NOT NULL DEFAULT 0,
+            last_started INTEGER,
+            last_finished INTEGER,
+            last_status TEXT,
+            last_result TEXT,
+            last_duration_ms REAL,
+            runs INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            started INTEGER NOT NULL,
+            duration_ms REAL NOT NULL,
+            status TEXT NOT NULL,
+            result TEXT,
+            owner TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_runs_name ON job_runs (name, id)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_lease (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _database_paths(app):
+    return [app.config['DATABASE']] + list(app.config['SHARD_PATHS'])
+
+
+def _storage_paths(app):
+    return list(app.config['SHARD_PATHS']) or [app.config['DATABASE']]
+
+
+def _each(app, paths, work):
+    """[work(conn) for each file], one connection per file (of the app's connection class, see models/shards.py)."""
+    router = app.extensions['shard_router']
+    results = []
+    for path in paths:
+        conn = router.connect(path)
+        try:
+            results.append(work(conn))
+        finally:
+            conn.close()
+    return results
+
+
+def rollups_job(app):
+    batches = sum(_each(app, _storage_paths(app), rebuild_rollups_in_batches))
+    return f'Report rollups rebuilt in {batches} batch(es).'
+
+
+def counters_job(app):
+    def repair(conn):
+        # The full check is a plain read; only the drifted lots are rebuilt, one short write transaction each
+        drifted = [row[0] for row in check_lot_counters(conn.cursor())]
+        for lot_id in drifted:
+            write_transaction(conn, lambda cursor, lot_id=lot_id: rebuild_lot_counters(cursor, lot_id))
+        return drifted
+
+    drifted = [lot_id for lots in _each(app, _storage_paths(app), repair) for lot_id in lots]
+    if drifted:
+        job_log.warning('Rebuilt drifted counters of lot(s) %s', drifted)
+        return f'Rebuilt counters for {len(drifted)} lot(s): {drifted}'
+    return 'All lot counters are consistent.'
+
+
+def archive_job(app):
+    days = app.config['ARCHIVE_AFTER_DAYS']
+    moved = sum(_each(app, _storage_paths(app), lambda conn: archive_reservations(conn, archive_cutoff(days))))
+    return f'Archived {moved} reservation(s) older than {days} days.'
+
+
+def analyze_job(app):
+    def analyze(conn):
+        # analysis_limit samples each index instead of reading it whole
+        conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+        conn.execute('ANALYZE')
+        conn.commit()
+
+    files = _each(app, _database_paths(app), analyze)
+    return f'Analyzed {len(files)} database file(s).'
+
+
+def vacuum_job(app):
+    def vacuum(conn):
+        # No full VACUUM here: it holds the write lock for as long as it rewrites the file
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != INCREMENTAL_VACUUM:
+            return 0
+        pages = conn.execute('PRAGMA page_count').fetchone()[0]
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if not pages or free / pages < VACUUM_FREE_RATIO:
+            return 0
+        freed = 0
+        while free:
+            # One write transaction per step. executescript runs the pragma to the end; execute() frees one page
+            conn.executescript(f'PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})')
+            left = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if left >= free:
+                break
+            freed, free = freed + free - left, left
+            time.sleep(VACUUM_STEP_PAUSE if free else 0)
+        return freed
+
+    freed = [pages for pages in _each(app, _database_paths(app), vacuum) if pages]
+    return f'Vacuumed {len(freed)} file(s), {sum(freed)} free page(s) returned.' if freed else 'Nothing to vacuum.'
+
+
+def checkpoint_job(app):
+    # PASSIVE never waits on readers or blocks writers; it copies what it can and lets the WAL be reused
+    frames = _each(app, _database_paths(app),
+                   lambda conn: tuple(conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()))
+    pending = sum(log - done for _, log, done in frames if log > 0)
+    return f'Checkpointed {len(frames)} file(s); {pending} WAL frame(s) still in use by readers.'
+
+
+def stale_active_job(app):
+    hours = app.config['STALE_ACTIVE_HOURS']
+    before = now_epoch() - hours * 3600
+    stale = [row for rows in _each(app, _storage_paths(app), lambda conn: conn.execute('''
+        SELECT id FROM reservations
+        WHERE status = 'active' AND parking_timestamp < ?
+        ORDER BY parking_timestamp
+    ''', (before,)).fetchall()) for row in rows]
+    if not stale:
+        return f'No reservation has been active for more than {hours} hours.'
+    ids = [row[0] for row in stale]
+    job_log.warning('%d reservation(s) active for more than %d hours: %s', len(ids), hours, ids[:20])
+    return f'{len(ids)} reservation(s) active for more than {hours} hours: {ids[:20]}'
+
+
+def snapshot_job(app):
+    snapshots = app.extensions.get('report_snapshots')
+    if snapshots is None:
+        return 'REPORT_SNAPSHOT is off.'
+    return f'Copied {snapshots.refresh()} database file(s) to the reporting snapshot.'
+
+
+JOBS = (
+    Job('checkpoint', 300, checkpoint_job, 'WAL checkpoint of every database file'),
+    Job('counters', 3600, counters_job, 'Check lot availability counters and rebuild drifted ones'),
+    Job('stale-active', 3600, stale_active_job, 'Find reservations active for more than STALE_ACTIVE_HOURS'),
+    Job('archive', 86400, archive_job, 'Move completed reservations older than ARCHIVE_AFTER_DAYS to the archive'),
+    Job('rollups', 86400, rollups_job, 'Rebuild the report rollups from the reservations'),
+    Job('analyze', 86400, analyze_job, 'Refresh query planner statistics (ANALYZE)'),
+    Job('vacuum', 7 * 86400, vacuum_job, 'Return the free pages of files with many, a few at a time'),
+    Job('report-snapshot', None, snapshot_job, 'Refresh the reporting snapshot (every REPORT_SNAPSHOT_MAX_AGE)'),
+)
+
+
+def configured_jobs(app):
+    """JOBS with the app's intervals (JOB_INTERVALS); jobs with interval 0 are left out."""
+    intervals = app.config['JOB_INTERVALS']
+    jobs = []
+    for job in JOBS:
+        interval = intervals.get(job.name, job.interval)
+        if job.name == 'report-snapshot' and interval is None:
+            interval = app.config['REPORT_SNAPSHOT_MAX_AGE'] if app.config['REPORT_SNAPSHOT'] else 0
+        if interval:
+            jobs.append(job._replace(interval=interval))
+    return jobs
+
+
+def take_lease(conn, owner, ttl, now=None):
+    """Take or renew the scheduler lease; True if `owner` holds it now."""
+    now = now_epoch() if now is None else now
+
+    def work(cursor):
+        cursor.execute('''
+            INSERT INTO scheduler_lease (name, owner, expires) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+            WHERE scheduler_lease.owner = excluded.owner OR scheduler_lease.expires < ?
+        ''', (LEASE_NAME, owner, now + ttl, now))
+        return cursor.rowcount == 1
+
+    return write_transaction(conn, work)
+
+
+def drop_lease(conn, owner):
+    """Give up the lease (if held) so another worker can take over at once."""
+    write_transaction(conn, lambda cursor: cursor.execute(
+        'UPDATE scheduler_lease SET expires = 0 WHERE name = ? AND owner = ?', (LEASE_NAME, owner)))
+
+
+def claim_due(conn, jobs, now=None):
+    """Jobs due at `now`, each with its next run already moved forward (so no one else starts them).
+
+    A job seen for the first time is not due: it is scheduled one interval from
+    now, so a deploy does not start every job on its first tick.
+    """
+    now = now_epoch() if now is None else now
+
+    def work(cursor):
+        next_runs = dict(cursor.execute('SELECT name, next_run FROM job_state').fetchall())
+        cursor.executemany('INSERT INTO job_state (name, next_run) VALUES (?, ?)',
+                           [(job.name, now + job.interval) for job in jobs if job.name not in next_runs])
+        due = [job for job in jobs if job.name in next_runs and next_runs[job.name] <= now]
+        for job in due:
+            cursor.execute('''
+                INSERT INTO job_state (name, next_run, last_started, last_status) VALUES (?, ?, ?, 'running')
+                ON CONFLICT (name) DO UPDATE SET next_run = excluded.next_run, last_started = excluded.last_started,
+                                                 last_status = 'running'
+            ''', (job.name, now + job.interval, now))
+        return due
+
+    return write_transaction(conn, work)
+
+
+def record_run(conn, name, started, duration_ms, status, result, owner=None):
+    """Store one finished run in job_state and job_runs (keeping the last RUNS_KEPT per job)."""
+    def work(cursor):
+        cursor.execute('''
+            UPDATE job_state
+            SET last_finished = ?, last_status = ?, last_result = ?, last_duration_ms = ?,
+                runs = runs + 1, failures = failures + ?
+            WHERE name = ?
+        ''', (now_epoch(), status, result, duration_ms, status == 'failed', name))
+        cursor.execute('''
+            INSERT INTO job_runs (name, started, duration_ms, status, result, owner) VALUES (?, ?, ?, ?, ?, ?)
+        ''', (name, started, duration_ms, status, result, owner))
+        cursor.execute('''
+            DELETE FROM job_runs WHERE name = ? AND id <= (
+                SELECT id FROM job_runs WHERE name = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+            )
+        ''', (name, name, RUNS_KEPT))
+
+    write_transaction(conn, work)
+
+
+def run_soon(conn, name):
+    """Make a job due now (the leader starts it on its next tick)."""
+    write_transaction(conn, lambda cursor: cursor.execute('''
+        INSERT INTO job_state (name, next_run) VALUES (?, 0)
+        ON CONFLICT (name) DO UPDATE SET next_run = 0
+    ''', (name,)))
+
+
+def job_overview(cursor, jobs):
+    """(state rows by name, recent runs, lease row) for the admin jobs page."""
+    state = {row['name']: row for row in cursor.execute('SELECT * FROM job_state')}
+    runs = cursor.execute('SELECT * FROM job_runs ORDER BY id DESC LIMIT 30').fetchall()
+    lease = cursor.execute('SELECT owner, expires FROM scheduler_lease WHERE name = ?', (LEASE_NAME,)).fetchone()
+    return [(job, state.get(job.name)) for job in jobs], runs, lease
+
+
+class Scheduler:
+    """One process's scheduler: a ticker thread that runs due jobs on a pool while it holds the lease."""
+
+    def __init__(self, app, jobs, workers=DEFAULT_WORKERS, tick=DEFAULT_TICK, lease_ttl=DEFAULT_LEASE_TTL):
+        self.app = app
+        self.jobs = list(jobs)
+        self.workers = workers
+        self.tick_seconds = tick
+        self.lease_ttl = lease_ttl
+        self.owner = None
+        self.leader = False
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = None
+        self._thread = None
+
+    def start(self):
+        """Start this process's ticker thread (called once per worker process)."""
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._running = set()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='job')
+        self._thread = threading.Thread(target=self._loop, name='job-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """Stop ticking, let running jobs finish (wait=True) and give up the lease."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+        if self.leader:
+            conn = connect(self.app.config['DATABASE'])
+            try:
+                drop_lease(conn, self.owner)
+            finally:
+                conn.close()
+            self.leader = False
+
+    def _loop(self):
+        conn = connect(self.app.config['DATABASE'])
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.tick(conn)
+                except Exception:
+                    job_log.exception('Scheduler tick failed')
+                self._stop.wait(self.tick_seconds)
+        finally:
+            conn.close()
+
+    def tick(self, conn, now=None):
+        """Renew the lease and start the due jobs; returns the names started."""
+        self.leader = take_lease(conn, self.owner, self.lease_ttl, now)
+        if not self.leader:
+            return []
+        with self._lock:
+            idle = [job for job in self.jobs if job.name not in self._running]
+        started = []
+        for job in claim_due(conn, idle, now):
+            with self._lock:
+                self._running.add(job.name)
+            self._executor.submit(self._run, job)
+            started.append(job.name)
+        return started
+
+    def _run(self, job):
+        started = now_epoch()
+        clock = time.perf_counter()
+        try:
+            result, status = job.func(self.app), 'ok'
+        except Exception as error:
+            job_log.exception('Job %s failed', job.name)
+            result, status = f'{type(error).__name__}: {error}', 'failed'
+        duration_ms = round((time.perf_counter() - clock) * 1000, 1)
+        try:
+            conn = connect(self.app.config['DATABASE'])
+            try:
+                record_run(conn, job.name, started, duration_ms, status, result, self.owner)
+            finally:
+                conn.close()
+        except Exception:
+            job_log.exception('Could not record the run of job %s', job.name)
+        finally:
+            with self._lock:
+                self._running.discard(job.name)
+
+
+def get_scheduler():
+    """Return the current app's Scheduler, or None when JOBS_ENABLED is off."""
+    return current_app.extensions.get('scheduler')
+
+
+def _start_scheduler(app):
+    app.extensions['scheduler'].start()
+
+
+def init_app(app):
+    """Set up the job scheduler if JOBS_ENABLED (JOB_WORKERS, JOB_TICK, JOB_LEASE_TTL, JOB_INTERVALS, STALE_ACTIVE_HOURS).
+
+    Call after models.lifecycle.init_app and models.snapshot.init_app: the
+    scheduler thread starts with the rest of the per-worker setup.
+    """
+    app.config.setdefault('JOBS_ENABLED', os.environ.get('PARKING_JOBS', '').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('JOB_WORKERS', DEFAULT_WORKERS)
+    app.config.setdefault('JOB_TICK', DEFAULT_TICK)
+    app.config.setdefault('JOB_LEASE_TTL', DEFAULT_LEASE_TTL)
+    app.config.setdefault('JOB_INTERVALS', {})
+    app.config.setdefault('STALE_ACTIVE_HOURS', DEFAULT_STALE_ACTIVE_HOURS)
+    if not app.config['JOBS_ENABLED']:
+        return None
+    scheduler = Scheduler(app, configured_jobs(app), app.config['JOB_WORKERS'], app.config['JOB_TICK'],
+                          app.config['JOB_LEASE_TTL'])
+    app.extensions['scheduler'] = scheduler
+    # Imported here: models.lifecycle imports models.schema, which imports this module for its tables
+    from models.lifecycle import on_worker_start
+    on_worker_start(app, _start_scheduler)
+    return scheduler
@@ -0,0 +1,84 @@
+# Yeh lifecycle.py file hai. create_app() sirf config aur routes set karta hai, database ko haath nahi lagata,
+# isliye app import/bana na turant hota hai (gunicorn master, tests, CLI sab ke liye).
+# Database wala kaam (schema version check, allocator warm-up) har worker process me ek baar chalta hai:
+# gunicorn ke post_worker_init hook se, ya us process ki pehli request pe.
+"""
+lifecycle.py
+------------
+Per-worker startup for the app factory.
+
+create_app() does no database work and starts no threads, so it is safe to
+call in a pre-forking master (gunicorn --preload). Everything that opens the
+database runs in the process that will use it:
+
+- on_worker_start(app, func) registers func(app) to run once per process.
+- start_worker(app) runs the registered functions: the schema check first
+  (models.schema.check_schema over a read-only connection, for the directory
+  and every shard, along with the shard layout), then e.g. the allocator
+  warm-up. Call it from gunicorn's post_worker_init hook; otherwise
+  the first request of each process runs it.
+- Runs are keyed on os.getpid(), so a worker forked from a process that had
+  already started still does its own setup. If a step fails (say the schema
+  is outdated), the next request tries again.
+
+Pooled connections and the password pool handle fork() themselves
+(models/db.py, models/passwords.py).
+"""
+
+import os
+import sqlite3
+import threading
+
+from flask import current_app
+
+from models.db import connect_readonly
+from models.schema import SchemaOutdated, check_schema
+from models.shards import check_layout
+
+
+def on_worker_start(app, func):
+    """Run func(app) once in every process that serves requests, before its first request."""
+    app.extensions['worker_start']['setup'].append(func)
+
+
+def start_worker(app):
+    """Run the per-process setup now (no-op if it already ran in this process)."""
+    state = app.extensions['worker_start']
+    if state['pid'] == os.getpid():
+        return False
+    with state['lock']:
+        if state['pid'] == os.getpid():
+            return False
+        for func in state['setup']:
+            func(app)
+        state['pid'] = os.getpid()
+    return True
+
+
+def _check_schema(app):
+    if not app.config['SCHEMA_CHECK']:
+        return
+    count = len(app.config['SHARD_PATHS'])
+    files = [(app.config['DATABASE'], None)] + [(path, index) for index, path in enumerate(app.config['SHARD_PATHS'])]
+    for path, index in files:
+        try:
+            conn = connect_readonly(path)
+        except sqlite3.OperationalError:
+            # Missing file: nothing has been migrated yet
+            raise SchemaOutdated(0)
+        try:
+            check_schema(conn)
+            check_layout(conn, count, index)
+        finally:
+            conn.close()
+
+
+def _start_before_request():
+    start_worker(current_app._get_current_object())
+
+
+def init_app(app):
+    """Set up per-worker startup (SCHEMA_CHECK: verify migrations before serving, default on)."""
+    app.config.setdefault('SCHEMA_CHECK', True)
+    app.extensions['worker_start'] = {'pid': None, 'lock': threading.Lock(), 'setup': [_check_schema]}
+    app.before_request(_start_before_request)
@@ -0,0 +1,281 @@
+# Yeh metrics.py file hai. Har request kitni der chali, usme kitni SQL queries chali aur unme kitna time laga, yeh yahin naapa jaata hai.
+# Sab numbers memory me histograms me jama hote hain aur /admin/metrics pe Prometheus format me milte hain.
+# Slow request / slow query (threshold config se) 'parking.slow' logger me likhi jaati hai.
+# METRICS_ENABLED band ho toh kuch bhi wrap nahi hota, isliye koi extra kharcha nahi.
+"""
+metrics.py
+----------
+Request and SQL instrumentation with a Prometheus text endpoint.
+
+- InstrumentedConnection / InstrumentedCursor (sqlite3 subclasses, used for the
+  request connections handed out by models.db.get_db) time every statement, including
+  the fetches that follow it, and count statements per request.
+- Metrics holds the in-process histograms: request duration per endpoint,
+  SQL statements and SQL time per request, and statement duration per kind
+  (SELECT, INSERT, ...). render() writes them in the Prometheus text format.
+- Requests slower than SLOW_REQUEST_MS and statements slower than
+  SLOW_QUERY_MS are logged to the 'parking.slow' logger.
+
+Only when METRICS_ENABLED is set (config or environment) does init_app()
+install the request hooks and the connection class; otherwise connections
+are plain sqlite3 connections and nothing is measured.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, request
+
+DEFAULT_SLOW_REQUEST_MS = 500
+DEFAULT_SLOW_QUERY_MS = 100
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+slow_log = logging.getLogger('parking.slow')
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style) with one series per label tuple."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values[-1]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def statement_kind(sql):
+    """First keyword of a statement (SELECT, INSERT, ...), the label for statement metrics."""
+    words = sql.split(None, 1)
+    return words[0].upper() if words else 'EMPTY'
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports the time of its statements and fetches to its connection."""
+
+    def execute(self, sql, parameters=()):
+        self.connection._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection._spent(time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection._spent(time.perf_counter() - started)
+
+    # SQLite does most of a SELECT's work while stepping rows, so fetches count towards the statement
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self.connection._spent(time.perf_counter() - started)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            self.connection._spent(time.perf_counter() - started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self.connection._spent(time.perf_counter() - started)
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            self.connection._spent(time.perf_counter() - started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection that counts and times statements; subclassed per Metrics with `metrics` set."""
+
+    metrics = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self._statement = None
+        self._statement_seconds = 0.0
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # sqlite3's execute shortcuts skip Python-level cursor methods, so send them through one
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        self._start('COMMIT')
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self._spent(time.perf_counter() - started)
+
+    def _start(self, sql):
+        self._finish()
+        self._statement = sql
+        self.queries += 1
+
+    def _spent(self, seconds):
+        self._statement_seconds += seconds
+        self.sql_seconds += seconds
+
+    def _finish(self):
+        if self._statement is not None:
+            self.metrics.observe_statement(self._statement, self._statement_seconds)
+            self._statement = None
+            self._statement_seconds = 0.0
+
+    def take_stats(self):
+        """Return (statements, SQL seconds) since the last call and reset them."""
+        self._finish()
+        stats = (self.queries, self.sql_seconds)
+        self.queries, self.sql_seconds = 0, 0.0
+        return stats
+
+
+class Metrics:
+    """The app's request and SQL histograms plus the slow-request/slow-query log."""
+
+    def __init__(self, slow_request_ms=DEFAULT_SLOW_REQUEST_MS, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+        self.slow_request = slow_request_ms / 1000
+        self.slow_query = slow_query_ms / 1000
+        self.requests = Histogram('parking_http_request_duration_seconds', 'Time to build a response.',
+                                  ('endpoint', 'method', 'status'), DURATION_BUCKETS)
+        self.request_queries = Histogram('parking_http_request_sql_statements', 'SQL statements per request.',
+                                         ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.request_sql = Histogram('parking_http_request_sql_seconds', 'SQL time per request.',
+                                     ('endpoint',), DURATION_BUCKETS)
+        self.statements = Histogram('parking_sql_statement_duration_seconds', 'SQL statement time, fetches included.',
+                                    ('statement',), DURATION_BUCKETS)
+        self.slow_requests = 0
+        self.slow_statements = 0
+        # sqlite3.connect(factory=...) class whose connections report here
+        self.connection_factory = type('InstrumentedConnection', (InstrumentedConnection,), {'metrics': self})
+
+    def observe_statement(self, sql, seconds):
+        self.statements.observe((statement_kind(sql),), seconds)
+        if seconds >= self.slow_query:
+            self.slow_statements += 1
+            slow_log.warning('slow query %.1f ms: %s', seconds * 1000, ' '.join(sql.split())[:500])
+
+    def observe_request(self, endpoint, method, status, seconds, statements, sql_seconds):
+        self.requests.observe((endpoint, method, str(status)), seconds)
+        self.request_queries.observe((endpoint,), statements)
+        self.request_sql.observe((endpoint,), sql_seconds)
+        if seconds >= self.slow_request:
+            self.slow_requests += 1
+            slow_log.warning('slow request %.1f ms: %s %s -> %s (%d SQL statements, %.1f ms SQL)', seconds * 1000,
+                             method, endpoint, status, statements, sql_seconds * 1000)
+
+    def render(self, extra=()):
+        """All metrics in the Prometheus text exposition format; `extra` is (name, type, help, value) gauges."""
+        lines = []
+        for histogram in (self.requests, self.request_queries, self.request_sql, self.statements):
+            lines.extend(histogram.render())
+        counters = (('parking_slow_requests_total', 'counter', 'Requests over SLOW_REQUEST_MS.', self.slow_requests),
+                    ('parking_slow_sql_statements_total', 'counter', 'SQL statements over SLOW_QUERY_MS.',
+                     self.slow_statements))
+        for name, kind, help_text, value in counters + tuple(extra):
+            lines.extend((f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {value}'))
+        return '\n'.join(lines) + '\n'
+
+
+def get_metrics():
+    """Return the current app's Metrics, or None when instrumentation is off."""
+    return current_app.extensions.get('metrics')
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_status = 500
+
+
+def _record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exception=None):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    # The request's directory and shard connections, plus what fan_out() ran on borrowed ones (models/shards.py)
+    conns = [g.get('db')] + [conn for _, conn in g.get('shard_dbs', {}).values()]
+    stats = [conn.take_stats() for conn in conns if hasattr(conn, 'take_stats')] + g.pop('fan_out_stats', [])
+    statements, sql_seconds = sum(count for count, _ in stats), sum(seconds for _, seconds in stats)
+    status = 500 if exception is not None else g.pop('metrics_status', 500)
+    current_app.extensions['metrics'].observe_request(request.endpoint or 'unmatched', request.method, status,
+                                                      elapsed, statements, sql_seconds)
+
+
+def init_app(app):
+    """Install request/SQL instrumentation if METRICS_ENABLED (SLOW_REQUEST_MS, SLOW_QUERY_MS thresholds)."""
+    app.config.setdefault('METRICS_ENABLED', os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS)
+    app.config.setdefault('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)
+    if not app.config['METRICS_ENABLED']:
+        return None
+    metrics = Metrics(app.config['SLOW_REQUEST_MS'], app.config['SLOW_QUERY_MS'])
+    app.extensions['metrics'] = metrics
+    # get_db() opens request connections with this class (see models/db.py)
+    app.config['DB_CONNECTION_FACTORY'] = metrics.connection_factory
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    # teardown_request runs before the app context teardown that returns the connection to the pool
+    app.teardown_request(_finish_request)
+    return metrics
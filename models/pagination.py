@@ -0,0 +1,27 @@
+# Yeh pagination.py file hai. Lambi lists (history, users, spots) ek saath load nahi hoti, page-by-page aati hain.
+# Page number (OFFSET) ki jagah "cursor" use hota hai: pichle page ki last row ki key.
+# Isse page 1000 bhi utna hi fast hai jitna page 1.
+"""
+pagination.py
+-------------
+Keyset (cursor) pagination helpers.
+
+A page query filters on the sort key of the last row already shown, e.g.
+`WHERE (parking_timestamp, id) < (?, ?) ORDER BY parking_timestamp DESC, id DESC`,
+and fetches page_size() + 1 rows. The extra row only tells us whether a next
+page exists. Deep pages are an index range seek, never an OFFSET scan.
+"""
+
+from flask import current_app
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def page_size():
+    """Rows per page (app.config['PAGE_SIZE'])."""
+    return current_app.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE)
+
+
+def split_page(rows, size):
+    """Split rows fetched with LIMIT size + 1 into (page rows, has_next_page)."""
+    return rows[:size], len(rows) > size
@@ -0,0 +1,133 @@
+# Yeh passwords.py file hai. Password hash banana aur login pe check karna yahin hota hai.
+# Hash ka tareeka (method aur cost) config se aata hai: PASSWORD_HASH_METHOD. Agar kisi user ka purana hash
+# doosre method/cost ka hai, toh sahi login pe naye method se dubara hash ho jaata hai (rehash-on-login).
+# Hashing CPU-heavy hai, isliye yeh ek chhote worker pool me chalta hai; pool bhar jaaye toh login turant "busy" bolta hai,
+# baaki pages block nahi hote.
+"""
+passwords.py
+------------
+Password hashing policy and a bounded verification pool.
+
+- PASSWORD_HASH_METHOD is any Werkzeug method string, e.g. 'pbkdf2:sha256:600000'
+  or 'scrypt:32768:8:1'. It is normalised once to the exact prefix Werkzeug
+  writes, so needs_rehash() is a string comparison with a stored hash.
+- PasswordVerifier runs check/generate on a ThreadPoolExecutor of
+  PASSWORD_VERIFY_WORKERS threads (hashlib's pbkdf2_hmac and scrypt release the
+  GIL, so threads use all cores). At most PASSWORD_VERIFY_QUEUE jobs may be
+  pending; beyond that verify() raises LoginOverloaded immediately instead of
+  queueing behind a login storm.
+- verify() returns (ok, new_hash): new_hash is set when the password was right
+  but the stored hash does not match the current policy.
+
+Run `python -m benchmarks.login_benchmark` to measure logins per second per core
+for a given method.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_HASH_METHOD = 'pbkdf2:sha256:600000'
+DEFAULT_VERIFY_TIMEOUT = 5.0
+
+
+class LoginOverloaded(Exception):
+    """Too many password checks are already pending; the caller should retry later."""
+
+
+def normalize_method(method):
+    """The method prefix Werkzeug stores for `method` (defaults filled in)."""
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(stored_hash, method):
+    """True if stored_hash was not made with the (normalised) method."""
+    return stored_hash.split('$', 1)[0] != method
+
+
+class PasswordVerifier:
+    """Bounded pool for password hashing and verification."""
+
+    def __init__(self, method=DEFAULT_HASH_METHOD, workers=None, max_pending=None,
+                 timeout=DEFAULT_VERIFY_TIMEOUT):
+        self.configured_method = method
+        self._method = None
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def method(self):
+        # Normalising hashes once with the full cost, so do it on first use rather than at startup
+        if self._method is None:
+            self._method = normalize_method(self.configured_method)
+        return self._method
+
+    def _pool(self):
+        # Created lazily and re-created after a fork: worker threads do not survive fork()
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise LoginOverloaded()
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise LoginOverloaded()
+
+    def _check(self, stored_hash, password):
+        if not check_password_hash(stored_hash, password):
+            return False, None
+        if needs_rehash(stored_hash, self.method):
+            return True, generate_password_hash(password, self.method)
+        return True, None
+
+    def verify(self, stored_hash, password):
+        """Return (ok, new_hash_or_None); raises LoginOverloaded when the pool is saturated."""
+        return self._run(self._check, stored_hash, password)
+
+    def hash(self, password):
+        """Hash a new password with the current policy, on the pool."""
+        return self._run(lambda: generate_password_hash(password, self.method))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+def get_verifier():
+    """Return the current app's password verifier."""
+    return current_app.extensions['password_verifier']
+
+
+def init_app(app):
+    """Create the app's verifier from PASSWORD_HASH_METHOD / PASSWORD_VERIFY_* config."""
+    app.config.setdefault('PASSWORD_HASH_METHOD', os.environ.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD))
+    app.config.setdefault('PASSWORD_VERIFY_WORKERS', None)
+    app.config.setdefault('PASSWORD_VERIFY_QUEUE', None)
+    app.config.setdefault('PASSWORD_VERIFY_TIMEOUT', DEFAULT_VERIFY_TIMEOUT)
+    verifier = PasswordVerifier(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_VERIFY_WORKERS'],
+                                app.config['PASSWORD_VERIFY_QUEUE'], app.config['PASSWORD_VERIFY_TIMEOUT'])
+    app.extensions['password_verifier'] = verifier
+    return verifier
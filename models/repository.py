@@ -0,0 +1,198 @@
+# Yeh repository.py file hai. Users, parking lots, spots aur reservations ko padhne wali queries yahin ek baar likhi hain;
+# controllers aur CLI apna SELECT khud nahi likhte, yahan ke functions bulate hain.
+# Rows chhote namedtuple objects me aati hain (User, ParkingLot, ...): row[0] bhi chalta hai aur row.username bhi,
+# aur har row me per-row dict nahi banta. Ek saath kai ids chahiye hon to get_users()/get_lots() jaise batch functions ek hi query chalate hain.
+"""
+repository.py
+-------------
+Read queries for the core tables, with compact row types.
+
+- User, ParkingLot, ParkingSpot and Reservation are namedtuples (no per-row
+  __dict__; callers and templates use attribute access). LotAvailability is a
+  lot with its counters (listings, reports, API); ReservationDetail and
+  SpotOccupancy are the joined rows of the release page and the admin spot list.
+- Every query is a module constant and is executed with the identical SQL
+  string, so sqlite3's per-connection statement cache (cached_statements)
+  compiles it once per pooled connection instead of once per request.
+- get_users/get_lots/get_spots/get_reservations fetch any number of ids with
+  one statement (json_each) and return {id: row}; missing ids are left out.
+- All functions take a cursor (like the other models) but run on a fresh
+  cursor of its connection with their own row_factory, so the caller's cursor
+  and the connection's sqlite3.Row default are left as they were.
+
+Writes stay where they are (models/reservations.py, the controllers); this
+module only reads.
+"""
+
+import json
+from collections import namedtuple
+
+User = namedtuple('User', ['id', 'username', 'email', 'password', 'full_name', 'address', 'pin_code',
+                           'mobile', 'role'])
+ParkingLot = namedtuple('ParkingLot', ['id', 'prime_location_name', 'price', 'address', 'pin_code',
+                                       'maximum_number_of_spots', 'available_spots', 'occupied_spots',
+                                       'entrance_index'])
+# A lot with its maintained counters, as the listings, reports and API show it
+LotAvailability = namedtuple('LotAvailability', ['id', 'prime_location_name', 'price', 'address', 'pin_code',
+                                                 'maximum_number_of_spots', 'total_spots', 'available_spots',
+                                                 'occupied_spots'])
+ParkingSpot = namedtuple('ParkingSpot', ['id', 'lot_id', 'status'])
+Reservation = namedtuple('Reservation', ['id', 'spot_id', 'user_id', 'vehicle_number', 'parking_timestamp',
+                                         'leaving_timestamp', 'parking_cost', 'status'])
+# An active reservation with what the release page shows about its lot
+ReservationDetail = namedtuple('ReservationDetail', Reservation._fields + ('price', 'lot_id'))
+# A spot with its active reservation, if any (admin spot list)
+SpotOccupancy = namedtuple('SpotOccupancy', ParkingSpot._fields + ('vehicle_number', 'parking_timestamp',
+                                                                   'full_name', 'user_id'))
+
+_USER_COLUMNS = ', '.join(User._fields)
+_LOT_COLUMNS = ', '.join(ParkingLot._fields)
+_SPOT_COLUMNS = ', '.join(ParkingSpot._fields)
+_RESERVATION_COLUMNS = ', '.join(Reservation._fields)
+
+USER_BY_ID_SQL = f'SELECT {_USER_COLUMNS} FROM users WHERE id = ?'
+USER_BY_USERNAME_SQL = f'SELECT {_USER_COLUMNS} FROM users WHERE username = ?'
+USERS_BY_IDS_SQL = f'SELECT {_USER_COLUMNS} FROM users WHERE id IN (SELECT value FROM json_each(?))'
+USER_TAKEN_SQL = 'SELECT 1 FROM users WHERE username = ? OR email = ? LIMIT 1'
+# Keyset page of customer accounts (admins are not listed)
+USER_PAGE_SQL = f'''
+    SELECT {_USER_COLUMNS} FROM users
+    WHERE role != 'admin' AND id > ?
+    ORDER BY id
+    LIMIT ?
+'''
+# (admins, everyone else) over all accounts, not just the page shown
+USER_ROLE_COUNTS_SQL = "SELECT COUNT(*) FILTER (WHERE role = 'admin'), COUNT(*) FILTER (WHERE role != 'admin') FROM users"
+
+LOT_BY_ID_SQL = f'SELECT {_LOT_COLUMNS} FROM parking_lots WHERE id = ?'
+LOTS_BY_IDS_SQL = f'SELECT {_LOT_COLUMNS} FROM parking_lots WHERE id IN (SELECT value FROM json_each(?))'
+# Counters only (models/counters.py): O(lots), no scan of parking_spots
+LOT_AVAILABILITY_SQL = '''
+    SELECT id, prime_location_name, price, address, pin_code, maximum_number_of_spots,
+           available_spots + occupied_spots AS total_spots,
+           available_spots, occupied_spots
+    FROM parking_lots
+    ORDER BY id
+'''
+
+SPOTS_BY_IDS_SQL = f'SELECT {_SPOT_COLUMNS} FROM parking_spots WHERE id IN (SELECT value FROM json_each(?))'
+# full_name is filled from the users table afterwards, which may be in another file (models/shards.py)
+SPOT_PAGE_SQL = '''
+    SELECT ps.id, ps.lot_id, ps.status, r.vehicle_number, r.parking_timestamp, NULL AS full_name, r.user_id
+    FROM parking_spots ps
+    LEFT JOIN reservations r ON ps.id = r.spot_id AND r.status = 'active'
+    WHERE ps.lot_id = ? AND ps.id > ?
+    ORDER BY ps.id
+    LIMIT ?
+'''
+
+RESERVATIONS_BY_IDS_SQL = f'''
+    SELECT {_RESERVATION_COLUMNS} FROM all_reservations WHERE id IN (SELECT value FROM json_each(?))
+'''
+ACTIVE_RESERVATION_SQL = '''
+    SELECT r.id, r.spot_id, r.user_id, r.vehicle_number, r.parking_timestamp, r.leaving_timestamp,
+           r.parking_cost, r.status, pl.price, ps.lot_id
+    FROM reservations r
+    JOIN parking_spots ps ON r.spot_id = ps.id
+    JOIN parking_lots pl ON ps.lot_id = pl.id
+    WHERE r.id = ? AND r.user_id = ? AND r.status = 'active'
+'''
+# Active reservations never move to the archive, so the hot table is enough
+ACTIVE_COUNT_SQL = "SELECT COUNT(*) FROM reservations WHERE user_id = ? AND status = 'active'"
+
+
+def _rows_as(cursor, row_type):
+    rows = cursor.connection.cursor()
+    rows.row_factory = lambda _, row: row_type._make(row)
+    return rows
+
+
+def _one(cursor, row_type, sql, params):
+    return _rows_as(cursor, row_type).execute(sql, params).fetchone()
+
+
+def _by_id(cursor, row_type, sql, ids):
+    # One statement for the whole batch; json_each keeps the SQL text (and its cached statement) fixed
+    ids = sorted({int(value) for value in ids})
+    if not ids:
+        return {}
+    return {row.id: row for row in _rows_as(cursor, row_type).execute(sql, (json.dumps(ids),))}
+
+
+def _scalar(cursor, sql, params=()):
+    return cursor.execute(sql, params).fetchone()[0]
+
+
+def get_user(cursor, user_id):
+    """The User with this id, or None."""
+    return _one(cursor, User, USER_BY_ID_SQL, (user_id,))
+
+
+def find_user(cursor, username):
+    """The User with this username, or None."""
+    return _one(cursor, User, USER_BY_USERNAME_SQL, (username,))
+
+
+def get_users(cursor, user_ids):
+    """{id: User} for the given ids, in one query."""
+    return _by_id(cursor, User, USERS_BY_IDS_SQL, user_ids)
+
+
+def user_taken(cursor, username, email):
+    """True if an account already uses this username or email."""
+    return cursor.execute(USER_TAKEN_SQL, (username, email)).fetchone() is not None
+
+
+def user_page(cursor, after, limit):
+    """Customer accounts with id > after, oldest first (keyset page of at most `limit`)."""
+    return _rows_as(cursor, User).execute(USER_PAGE_SQL, (after, limit)).fetchall()
+
+
+def user_role_counts(cursor):
+    """(admin accounts, customer accounts)."""
+    return tuple(cursor.execute(USER_ROLE_COUNTS_SQL).fetchone())
+
+
+def get_lot(cursor, lot_id):
+    """The ParkingLot with this id, or None."""
+    return _one(cursor, ParkingLot, LOT_BY_ID_SQL, (lot_id,))
+
+
+def get_lots(cursor, lot_ids):
+    """{id: ParkingLot} for the given ids, in one query."""
+    return _by_id(cursor, ParkingLot, LOTS_BY_IDS_SQL, lot_ids)
+
+
+def lot_availability_rows(cursor):
+    """Every lot in this file as a LotAvailability, by id."""
+    return _rows_as(cursor, LotAvailability).execute(LOT_AVAILABILITY_SQL).fetchall()
+
+
+def get_spots(cursor, spot_ids):
+    """{id: ParkingSpot} for the given ids, in one query."""
+    return _by_id(cursor, ParkingSpot, SPOTS_BY_IDS_SQL, spot_ids)
+
+
+def spot_page(cursor, lot_id, after, limit, users_cursor=None):
+    """SpotOccupancy rows of one lot with id > after (keyset page of at most `limit`).
+
+    Parkers' names come from `users_cursor` (default: `cursor`) in one batch.
+    """
+    spots = _rows_as(cursor, SpotOccupancy).execute(SPOT_PAGE_SQL, (lot_id, after, limit)).fetchall()
+    users = get_users(users_cursor or cursor, {spot.user_id for spot in spots if spot.user_id is not None})
+    return [spot._replace(full_name=users[spot.user_id].full_name) if spot.user_id in users else spot
+            for spot in spots]
+
+
+def get_reservations(cursor, reservation_ids):
+    """{id: Reservation} for the given ids, hot or archived, in one query."""
+    return _by_id(cursor, Reservation, RESERVATIONS_BY_IDS_SQL, reservation_ids)
+
+
+def active_reservation(cursor, reservation_id, user_id):
+    """The user's active reservation as a ReservationDetail, or None."""
+    return _one(cursor, ReservationDetail, ACTIVE_RESERVATION_SQL, (reservation_id, user_id))
+
+
+def active_reservation_count(cursor, user_id):
+    return _scalar(cursor, ACTIVE_COUNT_SQL, (user_id,))
@@ -0,0 +1,164 @@
+# Yeh reservations.py file hai. Spot booking ka asli logic yahin hai (routes sirf isko call karte hain).
+# Spots ek hi conditional UPDATE se claim hote hain, ek write transaction ke andar,
+# isliye do users ko kabhi same spot nahi mil sakta.
+"""
+reservations.py
+---------------
+Race-free spot allocation and set-based release, shared by the booking routes.
+
+book_spots() claims N free spots of a lot with a single conditional
+UPDATE ... RETURNING inside one BEGIN IMMEDIATE transaction (see
+models.db.write_transaction), inserts the reservations and moves the lot
+counters, all-or-nothing unless a partial booking is allowed. Spot choice is
+delegated to the in-memory allocator when the caller passes one.
+
+release_reservations() releases any number of a user's reservations with one
+bulk fetch, one leaving timestamp, a single pass of integer math (timestamps
+are epoch seconds, see models/timestamps.py) over the rows for the costs
+and bulk UPDATEs, all in one write transaction that also adds the completed
+reservations to the report rollups (models/rollups.py).
+"""
+
+import json
+from collections import namedtuple
+
+from models.counters import adjust_lot_counters
+from models.db import write_transaction
+from models.rollups import record_completed
+from models.timestamps import now_epoch
+
+
+# Outcome of releasing one reservation: status is 'released', 'not_found' or 'invalid_timestamp'
+# (lot_id is None when the reservation was not found)
+ReleaseResult = namedtuple('ReleaseResult', ['reservation_id', 'status', 'parking_cost', 'lot_id'])
+
+
+class AllocationError(Exception):
+    """Not enough free spots; nothing was booked."""
+
+    def __init__(self, requested, available):
+        super().__init__(f'Requested {requested} spot(s), only {available} available')
+        self.requested = requested
+        self.available = available
+
+
+def _claim_spots(cursor, lot_id, count):
+    # The status check in the outer WHERE makes the claim conditional on the
+    # spot still being free, even if this ever runs outside an IMMEDIATE transaction.
+    cursor.execute('''
+        UPDATE parking_spots SET status = 'O'
+        WHERE id IN (
+            SELECT id FROM parking_spots
+            WHERE lot_id = ? AND status = 'A'
+            ORDER BY id
+            LIMIT ?
+        ) AND status = 'A'
+        RETURNING id
+    ''', (lot_id, count))
+    return sorted(row[0] for row in cursor.fetchall())
+
+
+def book_spots(conn, lot_id, user_id, vehicle_numbers, allow_partial=False, allocator=None):
+    """Book one spot per vehicle number in a lot.
+
+    Spots are picked by the in-memory allocator (models/allocator.py) when one is
+    given, otherwise by an id-ordered subquery. Returns a list of
+    (reservation_id, spot_id, vehicle_number). Raises AllocationError if fewer
+    spots are free than requested (unless allow_partial, in which case the
+    shorter list is returned), and models.db.DatabaseBusy if the write lock
+    could not be taken.
+    """
+    requested = len(vehicle_numbers)
+
+    def work(cursor):
+        if allocator is not None:
+            spot_ids = allocator.allocate(cursor, lot_id, requested)
+        else:
+            spot_ids = _claim_spots(cursor, lot_id, requested)
+        try:
+            if not spot_ids or (len(spot_ids) < requested and not allow_partial):
+                raise AllocationError(requested, len(spot_ids))
+            parking_timestamp = now_epoch()
+            rows = list(zip(spot_ids, vehicle_numbers))
+            placeholders = ', '.join(['(?, ?, ?, ?)'] * len(rows))
+            params = []
+            for spot_id, vehicle_number in rows:
+                params.extend((spot_id, user_id, vehicle_number, parking_timestamp))
+            cursor.execute(f'''
+                INSERT INTO reservations (spot_id, user_id, vehicle_number, parking_timestamp)
+                VALUES {placeholders}
+                RETURNING id, spot_id, vehicle_number
+            ''', params)
+            booked = sorted(tuple(row) for row in cursor.fetchall())
+            adjust_lot_counters(cursor, lot_id, -len(booked), len(booked))
+        except Exception:
+            # The transaction is rolled back, so the claimed spots are free again
+            if allocator is not None:
+                allocator.release(lot_id, spot_ids)
+            raise
+        return booked
+
+    return write_transaction(conn, work)
+
+
+def release_reservations(conn, user_id, reservation_ids, allocator=None):
+    """Release a batch of the user's active reservations in one transaction.
+
+    Cost is hours parked times the lot's hourly price, with one leaving
+    timestamp for the whole batch. Returns one ReleaseResult per distinct
+    requested id, in request order. Freed spots are handed back to the
+    allocator (if given) after the commit.
+    """
+    requested = []
+    for reservation_id in reservation_ids:
+        try:
+            reservation_id = int(reservation_id)
+        except (TypeError, ValueError):
+            continue
+        if reservation_id not in requested:
+            requested.append(reservation_id)
+    if not requested:
+        return []
+
+    def work(cursor):
+        cursor.execute('''
+            SELECT r.id, r.spot_id, r.parking_timestamp, pl.price, ps.lot_id
+            FROM reservations r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            JOIN parking_lots pl ON ps.lot_id = pl.id
+            WHERE r.id IN (SELECT value FROM json_each(?))
+              AND r.user_id = ? AND r.status = 'active'
+        ''', (json.dumps(requested), user_id))
+        rows = cursor.fetchall()
+        leaving = now_epoch()
+        outcomes, updates, freed, completed = {}, [], {}, []
+        for reservation_id, spot_id, parked, price, lot_id in rows:
+            # Text left over from before the epoch migration could not be converted
+            if not isinstance(parked, int):
+                outcomes[reservation_id] = ('invalid_timestamp', None, lot_id)
+                continue
+            parking_cost = (leaving - parked) / 3600 * price  # price per hour
+            outcomes[reservation_id] = ('released', parking_cost, lot_id)
+            updates.append((leaving, parking_cost, reservation_id))
+            freed.setdefault(lot_id, []).append(spot_id)
+            completed.append((user_id, lot_id, parked, leaving, parking_cost))
+        cursor.executemany('''
+            UPDATE reservations
+            SET leaving_timestamp = ?, parking_cost = ?, status = 'completed'
+            WHERE id = ?
+        ''', updates)
+        spot_ids = [spot_id for spots in freed.values() for spot_id in spots]
+        cursor.execute('''
+            UPDATE parking_spots SET status = 'A' WHERE id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(spot_ids),))
+        for lot_id, spots in freed.items():
+            adjust_lot_counters(cursor, lot_id, len(spots), -len(spots))
+        record_completed(cursor, completed)
+        return outcomes, freed
+
+    outcomes, freed = write_transaction(conn, work)
+    if allocator is not None:
+        for lot_id, spot_ids in freed.items():
+            allocator.release(lot_id, spot_ids)
+    return [ReleaseResult(reservation_id, *outcomes.get(reservation_id, ('not_found', None, None)))
+            for reservation_id in requested]
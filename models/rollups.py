@@ -0,0 +1,197 @@
+# Yeh rollups.py file hai. Reports ke liye pehle se jode hue (pre-aggregated) totals yahan maintain hote hain:
+# har user ka har mahine ka total, aur har lot ka har din ka revenue.
+# Jab bhi koi reservation complete (release) hota hai, usi transaction me yeh totals badh jaate hain,
+# isliye report page ko poori history scan nahi karni padti. rebuild_rollups() se sab dubara ban jaata hai.
+"""
+rollups.py
+----------
+Incrementally maintained report rollups.
+
+- user_monthly_rollups: one row per (user, month of parking) with the number of
+  completed reservations and their total cost (user reports).
+- lot_daily_rollups: one row per (lot, day of leaving) with completed
+  reservations and revenue (admin revenue report).
+
+record_completed() is called by release_reservations() inside the release
+transaction, so the rollups move together with the reservation rows.
+rebuild_rollups() recomputes both tables from the reservations (used by the
+migration that creates them and by `flask --app app rebuild-rollups`);
+rebuild_rollups_in_batches() does the same in short per-id-range transactions
+for the background job (models/jobs.py).
+"""
+
+from models.db import write_transaction
+from models.timestamps import from_epoch
+
+# User or lot ids recomputed per write transaction by rebuild_rollups_in_batches()
+REBUILD_BATCH_SIZE = 200
+
+# Local month of parking / local day of leaving of the epoch timestamps (NULL for unconverted text)
+_PARKED_MONTH_SQL = "strftime('%Y-%m', r.parking_timestamp, 'unixepoch', 'localtime')"
+_LEFT_DAY_SQL = "date(r.leaving_timestamp, 'unixepoch', 'localtime')"
+
+
+def create_rollup_tables(cursor):
+    """Create the rollup tables (WITHOUT ROWID: the key is the clustered index)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_monthly_rollups (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            reservations INTEGER NOT NULL DEFAULT 0,
+            total_cost REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lot_daily_rollups (
+            lot_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            reservations INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (lot_id, day)
+        ) WITHOUT ROWID
+    ''')
+    # Revenue over a date range across all lots
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_lot_daily_rollups_day ON lot_daily_rollups (day)')
+    # The archive (migration 10) does not exist yet when this migration runs
+    rebuild_rollups(cursor, source='reservations')
+
+
+def record_completed(cursor, completed):
+    """Add completed reservations to the rollups.
+
+    `completed` is an iterable of (user_id, lot_id, parked, leaving, parking_cost)
+    with parked/leaving as epoch seconds. Rows are summed per key first, so a batch
+    release costs one upsert per (user, month) and (lot, day).
+    """
+    by_user, by_lot = {}, {}
+    for user_id, lot_id, parked, leaving, parking_cost in completed:
+        user_key = (user_id, from_epoch(parked).strftime('%Y-%m'))
+        count, cost = by_user.get(user_key, (0, 0.0))
+        by_user[user_key] = (count + 1, cost + parking_cost)
+        lot_key = (lot_id, from_epoch(leaving).date().isoformat())
+        count, revenue = by_lot.get(lot_key, (0, 0.0))
+        by_lot[lot_key] = (count + 1, revenue + parking_cost)
+    cursor.executemany('''
+        INSERT INTO user_monthly_rollups (user_id, month, reservations, total_cost)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id, month) DO UPDATE
+        SET reservations = reservations + excluded.reservations,
+            total_cost = total_cost + excluded.total_cost
+    ''', [(*key, count, cost) for key, (count, cost) in by_user.items()])
+    cursor.executemany('''
+        INSERT INTO lot_daily_rollups (lot_id, day, reservations, revenue)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (lot_id, day) DO UPDATE
+        SET reservations = reservations + excluded.reservations,
+            revenue = revenue + excluded.revenue
+    ''', [(*key, count, revenue) for key, (count, revenue) in by_lot.items()])
+
+
+_REBUILD_USER_SQL = f'''
+    INSERT INTO user_monthly_rollups (user_id, month, reservations, total_cost)
+    SELECT r.user_id, {_PARKED_MONTH_SQL} AS month, COUNT(*), COALESCE(SUM(r.parking_cost), 0)
+    FROM {{source}} r
+    WHERE r.status = 'completed' AND {_PARKED_MONTH_SQL} IS NOT NULL {{where}}
+    GROUP BY r.user_id, month
+'''
+_REBUILD_LOT_SQL = f'''
+    INSERT INTO lot_daily_rollups (lot_id, day, reservations, revenue)
+    SELECT ps.lot_id, {_LEFT_DAY_SQL} AS day, COUNT(*), COALESCE(SUM(r.parking_cost), 0)
+    FROM {{source}} r
+    JOIN parking_spots ps ON r.spot_id = ps.id
+    WHERE r.status = 'completed' AND {_LEFT_DAY_SQL} IS NOT NULL {{where}}
+    GROUP BY ps.lot_id, day
+'''
+
+
+def rebuild_rollups(cursor, source='all_reservations'):
+    """Recompute both rollup tables from the completed reservations in `source` (default: hot and archived)."""
+    cursor.execute('DELETE FROM user_monthly_rollups')
+    cursor.execute(_REBUILD_USER_SQL.format(source=source, where=''))
+    cursor.execute('DELETE FROM lot_daily_rollups')
+    cursor.execute(_REBUILD_LOT_SQL.format(source=source, where=''))
+
+
+def _key_range(conn, queries):
+    bounds = [conn.execute(sql).fetchone() for sql in queries]
+    lows = [low for low, _ in bounds if low is not None]
+    highs = [high for _, high in bounds if high is not None]
+    return (min(lows), max(highs)) if lows else None
+
+
+def rebuild_rollups_in_batches(conn, batch_size=REBUILD_BATCH_SIZE):
+    """rebuild_rollups() one key range at a time, each range in its own short write transaction.
+
+    A range's rows are deleted and recomputed under the same lock, so releases
+    committed between batches are counted exactly once; bookings and releases
+    only ever wait for one batch of `batch_size` user or lot ids.
+    """
+    tables = (
+        ('user_monthly_rollups', 'user_id', _REBUILD_USER_SQL, 'r.user_id',
+         ('SELECT MIN(user_id), MAX(user_id) FROM all_reservations',
+          'SELECT MIN(user_id), MAX(user_id) FROM user_monthly_rollups')),
+        ('lot_daily_rollups', 'lot_id', _REBUILD_LOT_SQL, 'ps.lot_id',
+         ('SELECT MIN(id), MAX(id) FROM parking_lots', 'SELECT MIN(lot_id), MAX(lot_id) FROM lot_daily_rollups')),
+    )
+    batches = 0
+    for table, key, rebuild_sql, source_key, range_queries in tables:
+        bounds = _key_range(conn, range_queries)
+        if bounds is None:
+            continue
+        insert = rebuild_sql.format(source='all_reservations', where=f'AND {source_key} >= ? AND {source_key} < ?')
+        for low in range(bounds[0], bounds[1] + 1, batch_size):
+            def work(cursor, low=low):
+                cursor.execute(f'DELETE FROM {table} WHERE {key} >= ? AND {key} < ?', (low, low + batch_size))
+                cursor.execute(insert, (low, low + batch_size))
+            write_transaction(conn, work)
+            batches += 1
+    return batches
+
+
+def user_monthly_report(cursor, user_id, months=12):
+    """Latest `months` rollup rows of a user: (month, reservations, total_cost), newest first."""
+    cursor.execute('''
+        SELECT month, reservations, total_cost
+        FROM user_monthly_rollups
+        WHERE user_id = ?
+        ORDER BY month DESC
+        LIMIT ?
+    ''', (user_id, months))
+    return cursor.fetchall()
+
+
+def user_totals(cursor, user_id):
+    """(completed_reservations, total_spent) of a user, summed from the monthly rollups."""
+    cursor.execute('''
+        SELECT COALESCE(SUM(reservations), 0), COALESCE(SUM(total_cost), 0)
+        FROM user_monthly_rollups
+        WHERE user_id = ?
+    ''', (user_id,))
+    return tuple(cursor.fetchone())
+
+
+def daily_revenue(cursor, since):
+    """Revenue per day across all lots from `since` (YYYY-MM-DD): (day, reservations, revenue)."""
+    cursor.execute('''
+        SELECT day, SUM(reservations) AS reservations, SUM(revenue) AS revenue
+        FROM lot_daily_rollups
+        WHERE day >= ?
+        GROUP BY day
+        ORDER BY day DESC
+    ''', (since,))
+    return cursor.fetchall()
+
+
+def lot_revenue(cursor, since):
+    """Revenue per lot from `since` (YYYY-MM-DD): (lot_id, name, reservations, revenue)."""
+    cursor.execute('''
+        SELECT pl.id, pl.prime_location_name,
+               COALESCE(SUM(rl.reservations), 0) AS reservations,
+               COALESCE(SUM(rl.revenue), 0) AS revenue
+        FROM parking_lots pl
+        LEFT JOIN lot_daily_rollups rl ON rl.lot_id = pl.id AND rl.day >= ?
+        GROUP BY pl.id
+        ORDER BY revenue DESC
+    ''', (since,))
+    return cursor.fetchall()
@@ -0,0 +1,219 @@
+# Yeh schema.py file hai. Database ki saari tables, columns aur indexes yahin se bante hain.
+# Har schema change ek numbered migration hai; schema_migrations table me likha rehta hai ki kaunsi lag chuki hai.
+# Naya column ya index chahiye toh MIGRATIONS list ke end me ek nayi migration add karo (purani mat badlo).
+"""
+schema.py
+---------
+Versioned schema migrations for parking.db.
+
+- MIGRATIONS is an ordered list of (version, name, function). Each function gets a
+  cursor and must be safe to run on databases created before versioning existed
+  (so it uses IF NOT EXISTS / column checks). Functions marked @batched rewrite
+  large tables: they get the connection and commit one batch at a time.
+- migrate() applies every pending migration in its own write transaction and
+  records it in schema_migrations, so existing files are upgraded without data loss.
+  It runs from `flask --app app init-db` (or `python app.py`), not on every start.
+- check_schema() is the cheap read-only startup check each worker does instead.
+"""
+
+import sqlite3
+from datetime import datetime
+
+from models.archive import create_archive_table
+from models.counters import ensure_counter_columns
+from models.db import write_transaction
+from models.jobs import INCREMENTAL_VACUUM, create_job_tables
+from models.rollups import create_rollup_tables, rebuild_rollups
+from models.timestamps import convert_reservation_timestamps
+from models.tokens import create_token_table
+
+
+def _create_base_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            full_name TEXT NOT NULL,
+            address TEXT,
+            pin_code TEXT,
+            mobile TEXT,
+            role TEXT DEFAULT 'user'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS parking_lots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            prime_location_name TEXT NOT NULL,
+            price REAL NOT NULL,
+            address TEXT NOT NULL,
+            pin_code TEXT NOT NULL,
+            maximum_number_of_spots INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS parking_spots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lot_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'A',
+            FOREIGN KEY (lot_id) REFERENCES parking_lots (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reservations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            spot_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            vehicle_number TEXT NOT NULL,
+            parking_timestamp DATETIME NOT NULL,
+            leaving_timestamp DATETIME,
+            parking_cost REAL,
+            status TEXT DEFAULT 'active',
+            FOREIGN KEY (spot_id) REFERENCES parking_spots (id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+
+def _add_hot_lookup_indexes(cursor):
+    # Free-spot lookup: WHERE lot_id = ? AND status = 'A'
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_parking_spots_lot_status ON parking_spots (lot_id, status)')
+    # User history / dashboard: WHERE user_id = ? ORDER BY parking_timestamp DESC
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_user_parked ON reservations (user_id, parking_timestamp)')
+    # Active reservation of a spot: r.spot_id = ps.id AND r.status = 'active'
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_spot_status ON reservations (spot_id, status)')
+    # Admin dashboard recent history: ORDER BY parking_timestamp DESC LIMIT 10
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_parked ON reservations (parking_timestamp)')
+
+
+def _add_lot_entrance_index(cursor):
+    # Position (0 = lowest spot id) of the spot nearest the entrance, for the 'nearest' allocation policy
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(parking_lots)')]
+    if 'entrance_index' not in columns:
+        cursor.execute('ALTER TABLE parking_lots ADD COLUMN entrance_index INTEGER NOT NULL DEFAULT 0')
+
+
+def _add_spot_page_index(cursor):
+    # Spot listing pages: WHERE lot_id = ? AND id > ? ORDER BY id
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_parking_spots_lot_id ON parking_spots (lot_id, id)')
+
+
+def _add_lot_export_index(cursor):
+    # Lot-filtered exports: spots of the lot, then each spot's reservations by time (and date range)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_spot_parked ON reservations (spot_id, parking_timestamp)')
+
+
+def _add_completion_index(cursor):
+    # Incremental analytics loads: completed reservations after a (leaving_timestamp, id) watermark
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_left ON reservations (leaving_timestamp)')
+
+
+def batched(apply):
+    """Mark a migration that commits its own batches: it gets the connection, not a cursor in a transaction.
+
+    It runs before the version is recorded and must be safe to run again
+    (an interrupted or concurrent run just repeats the batches left).
+    """
+    apply.batched = True
+    return apply
+
+
+@batched
+def _use_epoch_timestamps(conn):
+    convert_reservation_timestamps(conn)
+    # Rollups built by migration 7 on an older file could not read the text timestamps
+    write_transaction(conn, rebuild_rollups)
+
+
+@batched
+def _use_incremental_vacuum(conn):
+    # The vacuum job then frees pages a few at a time (models/jobs.py). An existing file only
+    # switches modes through one full VACUUM, done here once by init-db instead of by the job.
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != INCREMENTAL_VACUUM:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+
+
+# Append new migrations at the end; never renumber or edit one that has shipped.
+MIGRATIONS = [
+    (1, 'base tables', _create_base_tables),
+    (2, 'lot availability counters', ensure_counter_columns),
+    (3, 'hot lookup indexes', _add_hot_lookup_indexes),
+    (4, 'lot entrance index', _add_lot_entrance_index),
+    (5, 'spot pagination index', _add_spot_page_index),
+    (6, 'lot export index', _add_lot_export_index),
+    (7, 'report rollups', create_rollup_tables),
+    (8, 'completion index', _add_completion_index),
+    (9, 'api tokens', create_token_table),
+    (10, 'reservation archive', create_archive_table),
+    (11, 'epoch reservation timestamps', _use_epoch_timestamps),
+    (12, 'background jobs', create_job_tables),
+    (13, 'incremental auto-vacuum', _use_incremental_vacuum),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cursor):
+    """Return the highest applied migration version (0 for a new or unversioned file)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('SELECT MAX(version) FROM schema_migrations')
+    return cursor.fetchone()[0] or 0
+
+
+class SchemaOutdated(RuntimeError):
+    """The database is behind the code's migrations; run `flask --app app init-db`."""
+
+    def __init__(self, version):
+        super().__init__(f'Database schema is at version {version}, this code needs {SCHEMA_VERSION}. '
+                         'Run `flask --app app init-db` first.')
+        self.version = version
+
+
+def check_schema(conn):
+    """Raise SchemaOutdated unless every migration is applied; reads only, creates nothing."""
+    try:
+        version = conn.execute('SELECT MAX(version) FROM schema_migrations').fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        # No version table: a new file, or one from before migrations existed
+        version = 0
+    if version < SCHEMA_VERSION:
+        raise SchemaOutdated(version)
+    return version
+
+
+def migrate(conn):
+    """Apply all pending migrations; returns the list of versions applied."""
+    cursor = conn.cursor()
+    applied = []
+    for version, name, apply in MIGRATIONS:
+        if version <= current_version(cursor):
+            continue
+        # Long data rewrites commit batch by batch first; only the version is recorded under the lock below
+        if getattr(apply, 'batched', False):
+            apply(conn)
+        # Each migration runs in its own write transaction. Re-check the version once
+        # the write lock is held, in case another worker migrated in the meantime.
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= current_version(cursor):
+                conn.rollback()
+                continue
+            if not getattr(apply, 'batched', False):
+                apply(cursor)
+            cursor.execute('''
+                INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)
+            ''', (version, name, datetime.now().isoformat()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
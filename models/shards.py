@@ -0,0 +1,312 @@
+# Yeh shards.py file hai. SHARD_COUNT set ho toh har lot ke spots aur reservations alag SQLite file (shard) me jaate hain,
+# taaki ek lot ki booking doosre lot ki release ke peeche line me na lage (har file ka apna write lock hai).
+# Users, API tokens aur lots ki list (catalogue) main file (directory) me hi rehti hai. Lot ka shard = lot_id % SHARD_COUNT.
+# Har shard ke spot/reservation ids alag range se shuru hote hain (shard << 40), isliye id se hi pata chal jaata hai kaunsa shard hai.
+# SHARD_COUNT = 0 (default) matlab sab kuch ek hi file me, bilkul pehle jaisa.
+"""
+shards.py
+---------
+Routing layer for sharded storage.
+
+- With SHARD_COUNT = N > 0, lot `lot_id` lives in shard `lot_id % N`, a
+  separate database file (parking.shard0.db, ...) holding that lot's
+  parking_lots row (with its availability counters), spots, reservations,
+  archive and rollups. Every shard is migrated with the full schema, so
+  book_spots(), release_reservations(), rollups and the archive work on a
+  shard connection unchanged.
+- The directory (DATABASE) keeps users, API tokens and the lot catalogue.
+  Lot add/edit/delete write the catalogue row and the shard's copy
+  (lot_dbs()); availability counters are only maintained in the shard.
+- Spot and reservation ids of shard k start at k << SHARD_ID_BITS
+  (sqlite_sequence is seeded by prepare_shards()), so ShardRouter.for_id()
+  routes a reservation id from a form or the API without a lookup.
+- fan_out(func) runs func(conn) on every shard in parallel on the router's
+  thread pool, each call on its own pooled connection, and returns the
+  results in shard order for the caller to merge. lot_db()/shard_db() give
+  this request's connection to one shard. Pooled or not (ShardRouter.connect()),
+  shard connections use DB_CONNECTION_FACTORY like get_db(), so metrics see
+  their statements.
+- SHARD_COUNT = 0 (default) is a single shard that is the directory itself:
+  every helper runs inline on get_db(), so single-file behaviour is unchanged.
+
+The layout is recorded in a shard_layout table in the directory and in each
+shard by `init-db`; workers refuse to start if SHARD_COUNT does not match it.
+A single-file database is not split automatically.
+"""
+
+import functools
+import os
+import pathlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g
+
+from models.db import connect, get_db, get_pool
+from models.reservations import release_reservations
+from models.schema import migrate
+
+SHARD_ID_BITS = 40
+
+
+class ShardLayoutError(RuntimeError):
+    """SHARD_COUNT does not match the layout `init-db` created."""
+
+
+def shard_paths(directory, count):
+    """Shard file names next to the directory database (none when count is 0)."""
+    path = pathlib.Path(directory)
+    return [str(path.with_name(f'{path.stem}.shard{index}{path.suffix or ".db"}')) for index in range(count)]
+
+
+class ShardRouter:
+    """Maps lots and ids to shard files and runs work on several shards at once."""
+
+    def __init__(self, directory, paths=(), pool_size=None, factory=sqlite3.Connection):
+        self.directory = directory
+        self.sharded = bool(paths)
+        self.paths = list(paths) or [directory]
+        self.pool_size = pool_size
+        self.factory = factory
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def for_lot(self, lot_id):
+        return int(lot_id) % len(self.paths)
+
+    @staticmethod
+    def parse_id(record_id):
+        try:
+            return int(record_id)
+        except (TypeError, ValueError):
+            return None
+
+    def for_id(self, record_id):
+        """Shard of a spot or reservation id (0 for anything that is not an id)."""
+        record_id = self.parse_id(record_id)
+        index = record_id >> SHARD_ID_BITS if record_id is not None and record_id > 0 else 0
+        return index if index < len(self.paths) else 0
+
+    def split(self, record_ids):
+        """{shard index: ids} keeping the given order inside each shard."""
+        groups = {}
+        for record_id in record_ids:
+            groups.setdefault(self.for_id(record_id), []).append(record_id)
+        return groups
+
+    def pool(self, index):
+        return get_pool(self.paths[index], self.pool_size, self.factory)
+
+    def connect(self, path):
+        """A new unpooled connection to `path`, of the same class as the pooled ones (DB_CONNECTION_FACTORY)."""
+        return connect(path, self.factory)
+
+    def run(self, index, func, stats=None):
+        """func(conn) on a pooled connection to one shard (usable outside a request).
+
+        With a metrics connection, its (statements, SQL seconds) are appended to `stats` if given.
+        """
+        pool = self.pool(index)
+        conn = pool.acquire()
+        try:
+            return func(conn)
+        finally:
+            if stats is not None and hasattr(conn, 'take_stats'):
+                stats.append(conn.take_stats())
+            pool.release(conn)
+
+    def _pool_executor(self):
+        # Created on first use and again after a fork: threads do not survive fork()
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(len(self.paths), thread_name_prefix='shard')
+                self._pid = os.getpid()
+            return self._executor
+
+    def execute(self, calls):
+        """[call() for call in calls] in order, run in parallel on the router's threads when there is more than one."""
+        if len(calls) == 1:
+            return [calls[0]()]
+        executor = self._pool_executor()
+        futures = [executor.submit(call) for call in calls]
+        return [future.result() for future in futures]
+
+    def map(self, func, indexed=False, stats=None):
+        """[func(conn) for each shard] in shard order, run in parallel when there is more than one.
+
+        With indexed=True func is called as func(index, conn); `stats` is passed on to run().
+        """
+        return self.execute([functools.partial(self.run, index, functools.partial(func, index) if indexed else func,
+                                               stats)
+                             for index in range(len(self.paths))])
+
+
+def get_router():
+    """Return the current app's shard router."""
+    return current_app.extensions['shard_router']
+
+
+def shard_db(index):
+    """This request's connection to shard `index` (get_db() itself when not sharded)."""
+    router = get_router()
+    if not router.sharded:
+        return get_db()
+    if 'shard_dbs' not in g:
+        g.shard_dbs = {}
+    if index not in g.shard_dbs:
+        pool = router.pool(index)
+        g.shard_dbs[index] = (pool, pool.acquire())
+    return g.shard_dbs[index][1]
+
+
+def lot_db(lot_id):
+    """This request's connection to the shard holding `lot_id`."""
+    return shard_db(get_router().for_lot(lot_id))
+
+
+def lot_dbs(lot_id):
+    """Connections a lot catalogue write goes to: the directory, plus the lot's shard when sharded."""
+    router = get_router()
+    if not router.sharded:
+        return [get_db()]
+    return [get_db(), lot_db(lot_id)]
+
+
+def fan_out(func, indexed=False):
+    """[func(conn) for every shard]: inline on get_db() when not sharded, else in parallel.
+
+    func runs on the router's threads, so it must not touch flask.session or
+    flask.g: read what it needs before the call. indexed=True passes the shard
+    index first, func(index, conn).
+    """
+    router = get_router()
+    if not router.sharded:
+        return [func(0, get_db()) if indexed else func(get_db())]
+    # The borrowed connections' statement counts belong to this request (models/metrics.py)
+    return router.map(func, indexed, g.setdefault('fan_out_stats', []))
+
+
+def merge_newest(results, key, limit=None):
+    """Rows of every shard's result, newest (largest key) first, at most `limit` of them."""
+    rows = sorted((row for rows in results for row in rows), key=key, reverse=True)
+    return rows if limit is None else rows[:limit]
+
+
+def sum_rows(results):
+    """Column-wise sum of one numeric row per shard (e.g. COUNT/SUM results)."""
+    return tuple(sum(column) for column in zip(*results))
+
+
+def release_everywhere(user_id, reservation_ids, allocator=None):
+    """release_reservations() routed by id: one transaction per shard, results in request order.
+
+    Shards commit independently, so a DatabaseBusy from one shard can follow
+    releases already committed on another (each result stands on its own, as
+    within one shard).
+    """
+    router = get_router()
+    results = {}
+    for index, ids in router.split(reservation_ids).items():
+        for result in release_reservations(shard_db(index), user_id, ids, allocator=allocator):
+            results[result.reservation_id] = result
+    ordered = []
+    for reservation_id in reservation_ids:
+        result = results.pop(router.parse_id(reservation_id), None)
+        if result is not None:
+            ordered.append(result)
+    return ordered
+
+
+def close_shards(exception=None):
+    """Return the request's shard connections to their pools at app context teardown."""
+    for pool, conn in g.pop('shard_dbs', {}).values():
+        pool.release(conn)
+
+
+def _create_layout_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS shard_layout (
+            shard_count INTEGER NOT NULL,
+            shard_index INTEGER
+        )
+    ''')
+
+
+def read_layout(conn):
+    """(shard_count, shard_index) recorded in a database file, or None if it has no layout yet."""
+    try:
+        row = conn.execute('SELECT shard_count, shard_index FROM shard_layout').fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return tuple(row) if row else None
+
+
+def prepare_shards(directory, paths):
+    """Record the layout in the directory and migrate/seed every shard (run by `init-db`).
+
+    Raises ShardLayoutError if the directory was set up with another layout,
+    or if single-file data would be hidden by switching to shards.
+    """
+    conn = connect(directory)
+    try:
+        cursor = conn.cursor()
+        layout = read_layout(conn)
+        if layout is None:
+            if paths and cursor.execute('SELECT 1 FROM parking_spots LIMIT 1').fetchone():
+                raise ShardLayoutError(f'{directory} already holds spots in a single file; '
+                                       'it cannot be switched to SHARD_COUNT without moving them.')
+            _create_layout_table(cursor)
+            cursor.execute('INSERT INTO shard_layout (shard_count, shard_index) VALUES (?, NULL)', (len(paths),))
+            conn.commit()
+        elif layout[0] != len(paths):
+            raise ShardLayoutError(f'{directory} was set up with SHARD_COUNT={layout[0]}, not {len(paths)}.')
+    finally:
+        conn.close()
+    for index, path in enumerate(paths):
+        conn = connect(path)
+        try:
+            migrate(conn)
+            cursor = conn.cursor()
+            if read_layout(conn) is None:
+                _create_layout_table(cursor)
+                cursor.execute('INSERT INTO shard_layout (shard_count, shard_index) VALUES (?, ?)',
+                               (len(paths), index))
+                # This shard's spot and reservation ids start above every other shard's
+                for table in ('parking_spots', 'reservations'):
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)',
+                                   (table, index << SHARD_ID_BITS))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def check_layout(conn, count, index=None):
+    """Raise ShardLayoutError unless a file's recorded layout is (count, index); read-only."""
+    # Files set up before sharding existed have no layout table: they are single-file databases
+    layout = read_layout(conn) or (0, None)
+    if layout != (count, index):
+        raise ShardLayoutError(f'Database layout is {layout}, SHARD_COUNT expects {(count, index)}. '
+                               'Run `flask --app app init-db` with the same SHARD_COUNT.')
+
+
+def init_app(app):
+    """Create the app's router (SHARD_COUNT shard files next to DATABASE; 0 = single file).
+
+    Call after models.metrics.init_app, which may swap DB_CONNECTION_FACTORY.
+    """
+    app.config.setdefault('SHARD_COUNT', int(os.environ.get('PARKING_SHARDS', 0)))
+    # SHARD_PATHS may also be set directly (e.g. shards on different disks); its length wins
+    app.config.setdefault('SHARD_PATHS', shard_paths(app.config['DATABASE'], app.config['SHARD_COUNT']))
+    app.config['SHARD_COUNT'] = len(app.config['SHARD_PATHS'])
+    if app.config['SHARD_COUNT'] >= 1 << (63 - SHARD_ID_BITS):
+        raise ValueError(f'SHARD_COUNT must be below {1 << (63 - SHARD_ID_BITS)}')
+    router = ShardRouter(app.config['DATABASE'], app.config['SHARD_PATHS'],
+                         app.config['DB_POOL_SIZE'], app.config['DB_CONNECTION_FACTORY'])
+    app.extensions['shard_router'] = router
+    app.teardown_appcontext(close_shards)
+    return router
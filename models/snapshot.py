@@ -0,0 +1,276 @@
+# Yeh snapshot.py file hai. REPORT_SNAPSHOT on ho toh admin reports aur exports live parking.db nahi padhte,
+# balki uski ek copy (parking.report.db) padhte hain, taaki bade reports booking/release ke saath takraaye nahi.
+# Copy SQLite ke online backup API se thode-thode pages me banti hai, beech me ruk-ruk ke, aur poori hone pe hi purani copy ki jagah leti hai.
+# Copy REPORT_SNAPSHOT_MAX_AGE seconds se purani ho jaaye toh background me nayi banti hai; reports page pe dikhta hai ki data kitna purana hai.
+"""
+snapshot.py
+-----------
+Reporting snapshot: admin reports and exports read a periodically refreshed
+copy of the database instead of the live files.
+
+- backup_file() copies one database with the sqlite3 online backup API,
+  REPORT_SNAPSHOT_STEP_PAGES pages per step with a short pause between steps.
+  The copy is made inside one read transaction on the source, so every step
+  reads the same WAL snapshot: bookings keep committing meanwhile without
+  restarting the copy or leaking into it. The copy is built in
+  `<snapshot>.building` and renamed over the old snapshot when complete.
+- ReportSnapshots covers the directory and every shard (models/shards.py),
+  one snapshot file each (parking.report.db, parking.shard0.report.db, ...).
+  Its age is the oldest file's snapshot time (the file's mtime), so every
+  worker process sees the same freshness.
+- ensure() builds missing snapshots right away and refreshes stale ones
+  (older than REPORT_SNAPSHOT_MAX_AGE seconds) on a background thread, so a
+  report never waits on a refresh once a first copy exists. The
+  `.building` file doubles as a lock between processes.
+- report_db() and report_fan_out() are the reporting counterparts of
+  get_db() and fan_out(): snapshot connections are opened read-only and
+  immutable, so SQLite takes no locks on them at all. With REPORT_SNAPSHOT
+  off they are get_db()/fan_out() and reports read live data as before.
+
+`flask --app app refresh-snapshot` refreshes the snapshots now (e.g. from cron).
+"""
+
+import functools
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app, g
+
+from models.cache import lot_availability
+from models.db import STATEMENT_CACHE_SIZE, connect, get_db
+from models.repository import lot_availability_rows
+from models.shards import fan_out, get_router
+
+DEFAULT_MAX_AGE = 300
+DEFAULT_STEP_PAGES = 256
+DEFAULT_STEP_PAUSE = 0.002
+# A `.building` file older than this was left by a crashed refresh
+BUILD_TIMEOUT = 600
+
+# Where report reads go: the directory file, the storage files (shard order) and how to open them
+ReportSources = namedtuple('ReportSources', ['directory', 'storage', 'connect'])
+
+
+def snapshot_path(path):
+    """Snapshot file of a database file: parking.db -> parking.report.db."""
+    path = pathlib.Path(path)
+    return str(path.with_name(f'{path.stem}.report{path.suffix or ".db"}'))
+
+
+def connect_snapshot(path):
+    """Read-only connection to a snapshot; immutable, since a snapshot is replaced and never written."""
+    conn = sqlite3.connect(pathlib.Path(path).resolve().as_uri() + '?immutable=1', uri=True,
+                           check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _claim(building):
+    """Create the `.building` file, or return False while another refresh holds it."""
+    try:
+        os.close(os.open(building, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(building) < BUILD_TIMEOUT:
+                return False
+            os.remove(building)
+        except FileNotFoundError:
+            pass
+        return _claim(building)
+
+
+def backup_file(source, target, pages=DEFAULT_STEP_PAGES, pause=DEFAULT_STEP_PAUSE):
+    """Copy `source` to `target` in steps of `pages` pages; returns the snapshot time.
+
+    Returns None without copying if another refresh of `target` is running.
+    """
+    building = target + '.building'
+    if not _claim(building):
+        return None
+    try:
+        src = connect(source)
+        dest = sqlite3.connect(building)
+        try:
+            # Pin one read snapshot of the source for the whole copy
+            src.execute('BEGIN')
+            src.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchone()
+            taken = time.time()
+            src.backup(dest, pages=pages, progress=lambda *_: time.sleep(pause) if pause else None)
+            src.rollback()
+            # The copy inherits WAL mode; readers open it immutable, so it must be a single plain file
+            dest.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            dest.close()
+            src.close()
+        os.utime(building, (taken, taken))
+        os.replace(building, target)
+        return taken
+    except BaseException:
+        if os.path.exists(building):
+            os.remove(building)
+        raise
+
+
+class ReportSnapshots:
+    """The reporting copies of the directory and every shard file."""
+
+    def __init__(self, directory, shard_paths=(), max_age=DEFAULT_MAX_AGE, pages=DEFAULT_STEP_PAGES,
+                 pause=DEFAULT_STEP_PAUSE):
+        self.sources = [directory] + list(shard_paths)
+        self.targets = [snapshot_path(path) for path in self.sources]
+        self.max_age = max_age
+        self.pages = pages
+        self.pause = pause
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def directory(self):
+        return self.targets[0]
+
+    @property
+    def storage(self):
+        """Snapshot files holding spots and reservations, in shard order (the directory when not sharded)."""
+        return self.targets[1:] or self.targets[:1]
+
+    def taken_at(self):
+        """Epoch time of the oldest snapshot file, or None while any is missing."""
+        try:
+            return min(os.path.getmtime(target) for target in self.targets)
+        except FileNotFoundError:
+            return None
+
+    def age(self, now=None):
+        taken = self.taken_at()
+        return None if taken is None else max((now or time.time()) - taken, 0)
+
+    def refresh(self, wait=False):
+        """Copy every file now; returns how many were copied.
+
+        Files another process is copying are skipped, or waited for with wait=True.
+        """
+        copied = 0
+        for source, target in zip(self.sources, self.targets):
+            taken = backup_file(source, target, self.pages, self.pause)
+            while taken is None and wait:
+                time.sleep(0.05)
+                taken = backup_file(source, target, self.pages, self.pause)
+            copied += taken is not None
+        return copied
+
+    def refreshing(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def ensure(self):
+        """Make sure there is a snapshot to read: build a missing one now, refresh a stale one in the background."""
+        age = self.age()
+        if age is None:
+            self.refresh(wait=True)
+        elif age > self.max_age:
+            with self._lock:
+                if not self.refreshing():
+                    self._thread = threading.Thread(target=self.refresh, name='report-snapshot', daemon=True)
+                    self._thread.start()
+        return self
+
+
+def get_snapshots():
+    """Return the current app's ReportSnapshots, or None when reports read live data."""
+    return current_app.extensions.get('report_snapshots')
+
+
+def _checked_snapshots():
+    # ensure() once per request: every report read in it uses the same files
+    snapshots = get_snapshots()
+    if snapshots is not None and not g.get('report_snapshot_checked'):
+        snapshots.ensure()
+        g.report_snapshot_checked = True
+    return snapshots
+
+
+def report_db():
+    """This request's connection for report reads of the directory (get_db() when reading live)."""
+    snapshots = _checked_snapshots()
+    if snapshots is None:
+        return get_db()
+    if 'report_db' not in g:
+        g.report_db = connect_snapshot(snapshots.directory)
+    return g.report_db
+
+
+def _on_snapshot(path, func):
+    conn = connect_snapshot(path)
+    try:
+        return func(conn)
+    finally:
+        conn.close()
+
+
+def report_fan_out(func, indexed=False):
+    """fan_out() for reports: func(conn) on every shard's snapshot, in parallel (live shards when reading live)."""
+    snapshots = _checked_snapshots()
+    if snapshots is None:
+        return fan_out(func, indexed)
+    calls = [functools.partial(_on_snapshot, path, functools.partial(func, index) if indexed else func)
+             for index, path in enumerate(snapshots.storage)]
+    return get_router().execute(calls)
+
+
+def report_lots():
+    """LotAvailability rows (by id) as the reports see them."""
+    if get_snapshots() is None:
+        return lot_availability().rows
+    shards = report_fan_out(lambda conn: lot_availability_rows(conn.cursor()))
+    return sorted((row for rows in shards for row in rows), key=lambda row: row.id)
+
+
+def report_sources():
+    """ReportSources for code that opens its own connections (streamed exports)."""
+    snapshots = _checked_snapshots()
+    if snapshots is None:
+        router = get_router()
+        return ReportSources(current_app.config['DATABASE'], router.paths, router.connect)
+    return ReportSources(snapshots.directory, snapshots.storage, connect_snapshot)
+
+
+def report_freshness():
+    """What the reports page says about its data: None when live, else the snapshot's time and age."""
+    snapshots = get_snapshots()
+    if snapshots is None:
+        return None
+    taken = snapshots.taken_at()
+    return {'taken_at': None if taken is None else int(taken), 'age': None if taken is None else int(snapshots.age()),
+            'max_age': snapshots.max_age, 'refreshing': snapshots.refreshing()}
+
+
+def close_report_db(exception=None):
+    conn = g.pop('report_db', None)
+    if conn is not None:
+        conn.close()
+
+
+def init_app(app):
+    """Set up report snapshots if REPORT_SNAPSHOT (REPORT_SNAPSHOT_MAX_AGE seconds, backup step size and pause).
+
+    Call after models.shards.init_app: every shard file gets its own snapshot.
+    """
+    app.config.setdefault('REPORT_SNAPSHOT',
+                          os.environ.get('PARKING_REPORT_SNAPSHOT', '').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('REPORT_SNAPSHOT_MAX_AGE',
+                          int(os.environ.get('PARKING_REPORT_SNAPSHOT_MAX_AGE', DEFAULT_MAX_AGE)))
+    app.config.setdefault('REPORT_SNAPSHOT_STEP_PAGES', DEFAULT_STEP_PAGES)
+    app.config.setdefault('REPORT_SNAPSHOT_STEP_PAUSE', DEFAULT_STEP_PAUSE)
+    if not app.config['REPORT_SNAPSHOT']:
+        return None
+    snapshots = ReportSnapshots(app.config['DATABASE'], app.config['SHARD_PATHS'],
+                                app.config['REPORT_SNAPSHOT_MAX_AGE'], app.config['REPORT_SNAPSHOT_STEP_PAGES'],
+                                app.config['REPORT_SNAPSHOT_STEP_PAUSE'])
+    app.extensions['report_snapshots'] = snapshots
+    app.teardown_appcontext(close_report_db)
+    return snapshots
@@ -0,0 +1,67 @@
+# Yeh spots.py file hai. Parking lot ke spots banane aur lot ka size badalne ka logic yahin hai.
+# Naye spots ek hi bulk INSERT se bante hain, aur resize me sirf farak wale spots add/remove hote hain.
+# Occupied spots kabhi delete nahi hote, aur bache hue spots ki IDs same rehti hain.
+"""
+spots.py
+--------
+Bulk spot provisioning and diff-based lot resizing.
+
+- lot_size_error() rejects lot sizes below one spot.
+- provision_spots() creates N available spots with one INSERT ... SELECT.
+- resize_lot() grows a lot by provisioning only the missing spots, or shrinks it by
+  deleting free spots from the end, keeping the ids that reservation history points to.
+Both keep the lot's counters (models/counters.py) in the same transaction.
+"""
+
+from models.counters import adjust_lot_counters
+
+
+def lot_size_error(size):
+    """Return an error message if a lot cannot have `size` spots, else None."""
+    if size < 1:
+        return 'A parking lot needs at least 1 spot.'
+    return None
+
+
+def provision_spots(cursor, lot_id, count):
+    """Create `count` available spots for a lot in a single statement."""
+    if count <= 0:
+        return 0
+    cursor.execute('''
+        WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+        INSERT INTO parking_spots (lot_id, status)
+        SELECT ?, 'A' FROM seq
+    ''', (count, lot_id))
+    return count
+
+
+def resize_lot(cursor, lot_id, new_size):
+    """Grow or shrink a lot to `new_size` spots, touching only the difference.
+
+    Returns None on success, or an error message if the lot would have to lose
+    occupied spots. Only free spots with the highest ids are removed.
+    """
+    cursor.execute('SELECT available_spots, occupied_spots FROM parking_lots WHERE id = ?', (lot_id,))
+    available, occupied = cursor.fetchone()
+    difference = new_size - (available + occupied)
+    if difference > 0:
+        provision_spots(cursor, lot_id, difference)
+        adjust_lot_counters(cursor, lot_id, difference, 0)
+    elif difference < 0:
+        remove = -difference
+        if remove > available:
+            return f'Cannot shrink below {occupied} spot(s): occupied spots cannot be removed.'
+        cursor.execute('''
+            DELETE FROM parking_spots
+            WHERE id IN (
+                SELECT id FROM parking_spots
+                WHERE lot_id = ? AND status = 'A'
+                ORDER BY id DESC
+                LIMIT ?
+            ) AND status = 'A'
+        ''', (lot_id, remove))
+        if cursor.rowcount != remove:
+            # A booking took some of the free spots after we read the counters
+            return 'Spots were booked while resizing; please try again.'
+        adjust_lot_counters(cursor, lot_id, -remove, 0)
+    return None
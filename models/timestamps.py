@@ -0,0 +1,81 @@
+# Yeh timestamps.py file hai. Reservations ka parking aur leaving time ab integer (Unix epoch seconds) me save hota hai,
+# string me nahi. Isse duration/cost ka hisaab aur date range queries seedha integer math ban jaate hain.
+# Time ko "2025-03-01 10:30" jaisa dikhana sirf templates me hota hai (datetime filter).
+"""
+timestamps.py
+-------------
+Reservation times as integer Unix epoch seconds.
+
+- parking_timestamp / leaving_timestamp hold epoch seconds. Durations, costs,
+  keyset cursors and range filters are plain integer comparisons on them. The
+  columns keep their declared DATETIME type, whose NUMERIC affinity stores
+  integers as they are.
+- Calendar questions (which local day or month) are answered with
+  from_epoch() in Python or `'unixepoch', 'localtime'` in SQL, so they follow
+  the server's local time like the old naive ISO strings did.
+- format_timestamp() is the `datetime` template filter; nothing else formats
+  reservation times for display.
+- convert_reservation_timestamps() is the migration that rewrites old ISO text
+  values in place, committing one id-range batch at a time.
+"""
+
+import time
+from datetime import datetime
+
+from models.db import write_transaction
+
+CONVERT_BATCH_SIZE = 10000
+DISPLAY_FORMAT = '%Y-%m-%d %H:%M'
+
+# Old ISO text (either separator, stray whitespace) read as local time, as epoch seconds; NULL if unparseable
+_ISO_TO_EPOCH_SQL = ("CAST(strftime('%s', trim(replace(replace({column}, char(10), ' '), char(13), ' ')), 'utc') "
+                     "AS INTEGER)")
+
+
+def now_epoch():
+    """Current time in epoch seconds."""
+    return int(time.time())
+
+
+def to_epoch(value):
+    """Epoch seconds of a naive local datetime (or date, at local midnight)."""
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return int(value.timestamp())
+
+
+def from_epoch(seconds):
+    """Naive local datetime of epoch seconds."""
+    return datetime.fromtimestamp(seconds)
+
+
+def format_timestamp(seconds, fmt=DISPLAY_FORMAT):
+    """Template filter: epoch seconds as local time text ('' for a missing time)."""
+    if seconds is None or seconds == '':
+        return ''
+    if not isinstance(seconds, int):
+        # A value the migration could not convert is shown as it was stored
+        return str(seconds)
+    return from_epoch(seconds).strftime(fmt)
+
+
+def convert_reservation_timestamps(conn, batch_size=CONVERT_BATCH_SIZE):
+    """Rewrite ISO text timestamps of both reservation tables as epoch seconds.
+
+    Each id range of `batch_size` is converted and committed in its own write
+    transaction, so the write lock (and the WAL) only ever covers one batch and
+    bookings get in between batches. Integer values are left alone, so an
+    interrupted run just resumes, and text that cannot be parsed is kept;
+    releasing such a reservation reports 'invalid_timestamp' as before.
+    """
+    for table in ('reservations', 'reservations_archive'):
+        converted = ', '.join(
+            f"{column} = CASE WHEN typeof({column}) = 'text' "
+            f"THEN COALESCE({_ISO_TO_EPOCH_SQL.format(column=column)}, {column}) ELSE {column} END"
+            for column in ('parking_timestamp', 'leaving_timestamp'))
+        first, last = conn.execute(f'SELECT MIN(id), MAX(id) FROM {table}').fetchone()
+        if first is None:
+            continue
+        for low in range(first, last + 1, batch_size):
+            write_transaction(conn, lambda cursor: cursor.execute(
+                f'UPDATE {table} SET {converted} WHERE id >= ? AND id < ?', (low, low + batch_size)))
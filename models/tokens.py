@@ -0,0 +1,63 @@
+# Yeh tokens.py file hai. JSON API (kiosk, fleet systems) login cookie ki jagah API token se chalti hai.
+# Token sirf ek baar dikhaya jaata hai; database me uska SHA-256 hash hi save hota hai.
+# Naya token: flask --app app create-api-token <username> --name <kiosk ka naam>
+"""
+tokens.py
+---------
+API tokens for the JSON API (controllers/api_controller.py).
+
+A token is a random URL-safe string handed out once by create_token(); only
+its SHA-256 digest is stored, so a copy of parking.db does not leak usable
+tokens. find_token_user() is a single primary-key lookup per API request.
+"""
+
+import hashlib
+import secrets
+from datetime import datetime
+
+
+def create_token_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS api_tokens (
+            token_hash TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_token(cursor, user_id, name):
+    """Store a new token for the user and return it (the only time it is visible)."""
+    token = secrets.token_urlsafe(32)
+    cursor.execute('''
+        INSERT INTO api_tokens (token_hash, user_id, name, created_at) VALUES (?, ?, ?, ?)
+    ''', (_digest(token), user_id, name, datetime.now().isoformat()))
+    return token
+
+
+def revoke_tokens(cursor, user_id, name=None):
+    """Delete the user's tokens (only the named one if given); returns how many were removed."""
+    if name is None:
+        cursor.execute('DELETE FROM api_tokens WHERE user_id = ?', (user_id,))
+    else:
+        cursor.execute('DELETE FROM api_tokens WHERE user_id = ? AND name = ?', (user_id, name))
+    return cursor.rowcount
+
+
+def find_token_user(cursor, token):
+    """Return (user_id, username, role) for a valid token, else None."""
+    if not token:
+        return None
+    cursor.execute('''
+        SELECT u.id, u.username, u.role
+        FROM api_tokens t
+        JOIN users u ON t.user_id = u.id
+        WHERE t.token_hash = ?
+    ''', (_digest(token),))
+    return cursor.fetchone()
@@ -4,8 +4,47 @@ Simple test script for Vehicle Parking System
 """
 
 import sqlite3
+import json
 import os
-from datetime import datetime
+import random
+import re
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import numpy
+import pytest
+from flask import Flask
+
+from app import DEV_SECRET_KEY, create_app
+
+from benchmarks.route_benchmark import percentile, summarize
+from benchmarks.seed import seed_database
+from models.allocator import SpotAllocator
+from models.archive import newest_reservations_sql, archive_cutoff, archive_reservations, archive_stats
+from models.analytics import HOUR, ReservationColumns, occupancy_report
+from models.cache import TTLCache
+from models.counters import check_lot_counters
+from models.db import PRAGMAS, connect, get_db, get_pool, init_app as init_db_app, write_transaction
+from models.lifecycle import start_worker
+from models.metrics import init_app as init_metrics
+from models.feed import AvailabilityFeed, stream
+from models.jobs import claim_due, run_soon, take_lease, vacuum_job
+from models.passwords import LoginOverloaded, PasswordVerifier, needs_rehash
+from models.exports import RESERVATION_COLUMNS, reservation_query, reservation_rows, stream_export
+from models.repository import (LotAvailability, ParkingLot, User, active_reservation, find_user, get_lots,
+                               get_reservations, get_users, lot_availability_rows, spot_page, user_role_counts)
+from models.reservations import AllocationError, book_spots, release_reservations
+from models.rollups import rebuild_rollups, rebuild_rollups_in_batches
+from models.schema import SCHEMA_VERSION, SchemaOutdated, current_version, migrate
+from models.shards import ShardLayoutError, fan_out, lot_db, shard_paths
+from models.snapshot import connect_snapshot, report_freshness, snapshot_path
+from models.spots import provision_spots
+from models.timestamps import convert_reservation_timestamps, format_timestamp, to_epoch
+from models.tokens import create_token, find_token_user, revoke_tokens
 
 def test_database_creation():
     """Test if database and tables are created properly"""
@@ -85,6 +124,1020 @@ def test_sample_data():
     
     conn.close()
 
+def _new_db_path():
+    return os.path.join(tempfile.mkdtemp(), 'parking.db')
+
+def _query_plan(conn, sql, params=()):
+    return ' | '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+
+def test_hot_queries_use_indexes():
+    """The hot lookups must be index searches, not full table scans"""
+    conn = connect(_new_db_path())
+    migrate(conn)
+    
+    # Free spots of a lot (book_parking)
+    plan = _query_plan(conn, "SELECT id FROM parking_spots WHERE lot_id = ? AND status = 'A' LIMIT ?", (1, 3))
+    assert 'idx_parking_spots_lot_status' in plan, plan
+    
+    # User history, newest first (user_dashboard, user_history)
+    plan = _query_plan(conn, '''
+        SELECT r.id, pl.prime_location_name, ps.id as spot_id, r.parking_timestamp
+        FROM reservations r
+        JOIN parking_spots ps ON r.spot_id = ps.id
+        JOIN parking_lots pl ON ps.lot_id = pl.id
+        WHERE r.user_id = ?
+        ORDER BY r.parking_timestamp DESC
+    ''', (1,))
+    assert 'SEARCH r USING INDEX idx_reservations_user_parked' in plan, plan
+    assert 'TEMP B-TREE' not in plan, plan
+    
+    # One page of spots with their active reservation (view_parking_spots)
+    plan = _query_plan(conn, '''
+        SELECT ps.*, r.vehicle_number, r.parking_timestamp, u.full_name
+        FROM parking_spots ps
+        LEFT JOIN reservations r ON ps.id = r.spot_id AND r.status = 'active'
+        LEFT JOIN users u ON r.user_id = u.id
+        WHERE ps.lot_id = ? AND ps.id > ?
+        ORDER BY ps.id
+        LIMIT ?
+    ''', (1, 0, 50))
+    assert 'idx_parking_spots_lot_id (lot_id=? AND id>?)' in plan, plan
+    assert 'idx_reservations_spot_status' in plan, plan
+    assert 'TEMP B-TREE' not in plan, plan
+    
+    # A deep history page is a range seek on the same index
+    plan = _query_plan(conn, '''
+        SELECT r.id FROM reservations r
+        WHERE r.user_id = ? AND (r.parking_timestamp, r.id) < (?, ?)
+        ORDER BY r.parking_timestamp DESC, r.id DESC
+        LIMIT ?
+    ''', (1, to_epoch(datetime(2025, 1, 1)), 100, 50))
+    assert 'idx_reservations_user_parked' in plan, plan
+    assert 'TEMP B-TREE' not in plan, plan
+    conn.close()
+
+def test_migrate_upgrades_unversioned_database():
+    """An old parking.db (no version table, no counters) is upgraded in place without data loss"""
+    path = _new_db_path()
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE parking_lots (id INTEGER PRIMARY KEY AUTOINCREMENT, prime_location_name TEXT NOT NULL,
+            price REAL NOT NULL, address TEXT NOT NULL, pin_code TEXT NOT NULL,
+            maximum_number_of_spots INTEGER NOT NULL);
+        CREATE TABLE parking_spots (id INTEGER PRIMARY KEY AUTOINCREMENT, lot_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'A');
+        INSERT INTO parking_lots VALUES (1, 'Old Lot', 20.0, 'Street', '123456', 3);
+        INSERT INTO parking_spots (lot_id, status) VALUES (1, 'A'), (1, 'O'), (1, 'A');
+    ''')
+    conn.commit()
+    conn.close()
+    
+    conn = connect(path)
+    assert migrate(conn) == [version for version in range(1, SCHEMA_VERSION + 1)]
+    assert current_version(conn.cursor()) == SCHEMA_VERSION
+    assert migrate(conn) == []
+    lot = conn.execute('SELECT * FROM parking_lots WHERE id = 1').fetchone()
+    assert lot['prime_location_name'] == 'Old Lot'
+    assert (lot['available_spots'], lot['occupied_spots']) == (2, 1)
+    assert conn.execute('SELECT COUNT(*) FROM parking_spots').fetchone()[0] == 3
+    conn.close()
+
+def _db_with_lot(lot_size, entrance_index=0):
+    path = _new_db_path()
+    conn = connect(path)
+    migrate(conn)
+    conn.execute('''
+        INSERT INTO parking_lots (prime_location_name, price, address, pin_code, maximum_number_of_spots,
+                                  available_spots, occupied_spots, entrance_index)
+        VALUES ('Stress Lot', 10.0, 'Street', '123456', ?, ?, 0, ?)
+    ''', (lot_size, lot_size, entrance_index))
+    provision_spots(conn.cursor(), 1, lot_size)
+    conn.commit()
+    return path, conn
+
+def test_requests_share_a_pooled_wal_connection():
+    """get_db() gives each request one pooled connection to DATABASE, in WAL mode, reused by the next request"""
+    path = _new_db_path()
+    app = create_app({'DATABASE': path, 'TESTING': True, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'})
+    app.test_cli_runner().invoke(args=['init-db'])
+    with app.app_context():
+        conn = get_db()
+        assert get_db() is conn
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA database_list').fetchone()['file'] == os.path.realpath(path)
+        conn.execute("INSERT INTO users (username, email, password, full_name) VALUES ('ghost', 'g@x', 'x', 'G')")
+    # Back in the pool with the unfinished write rolled back; the next request borrows the same connection
+    with app.app_context():
+        assert get_db() is conn
+        assert conn.execute("SELECT COUNT(*) FROM users WHERE username = 'ghost'").fetchone()[0] == 0
+    get_pool(path).close_all()
+
+def test_lot_counters_follow_bookings_and_rebuild_after_drift():
+    """Bookings and releases move the lot counters in their own transaction; check-counters finds and repairs drift"""
+    path, conn = _db_with_lot(4)
+    counters = lambda: tuple(conn.execute('SELECT available_spots, occupied_spots FROM parking_lots').fetchone())
+    booked = [reservation_id for reservation_id, _, _ in book_spots(conn, 1, 1, ['C1', 'C2'])]
+    assert counters() == (2, 2)
+    release_reservations(conn, 1, booked[:1])
+    assert counters() == (3, 1) and check_lot_counters(conn.cursor()) == []
+    
+    conn.execute('UPDATE parking_lots SET available_spots = 9')
+    conn.commit()
+    assert [tuple(row) for row in check_lot_counters(conn.cursor())] == [(1, 9, 1, 3, 1)]
+    app = create_app({'DATABASE': path, 'TESTING': True})
+    output = app.test_cli_runner().invoke(args=['check-counters', '--repair']).output
+    assert 'Lot 1: stored 9/1, actual 3/1' in output and 'Rebuilt counters for 1 lot(s).' in output
+    assert counters() == (3, 1) and check_lot_counters(conn.cursor()) == []
+    conn.close()
+
+@pytest.mark.parametrize('policy', [None, 'lowest', 'spread', 'nearest'])
+def test_concurrent_bookings_never_share_a_spot(policy):
+    """Many threads booking the same lot at once: every spot is handed out at most once"""
+    lot_size = 150
+    path, conn = _db_with_lot(lot_size, entrance_index=70)
+    allocator = SpotAllocator(policy) if policy else None
+    
+    threads, attempts = 16, 25
+    start = threading.Barrier(threads)
+    booked, failed, errors = [], [], []
+    
+    def worker(user_id):
+        worker_conn = connect(path)
+        rng = random.Random(user_id)
+        start.wait()
+        for attempt in range(attempts):
+            vehicles = [f'V{user_id}-{attempt}-{n}' for n in range(rng.randint(1, 3))]
+            try:
+                booked.extend(book_spots(worker_conn, 1, user_id, vehicles, allocator=allocator))
+            except AllocationError:
+                failed.append(len(vehicles))
+            except Exception as e:
+                errors.append(e)
+        worker_conn.close()
+    
+    workers = [threading.Thread(target=worker, args=(user_id,)) for user_id in range(1, threads + 1)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    
+    assert not errors, errors
+    spot_ids = [spot_id for _, spot_id, _ in booked]
+    assert len(spot_ids) == len(set(spot_ids)), 'a spot was allocated twice'
+    assert len(spot_ids) == lot_size  # demand exceeds capacity, so the lot fills up exactly
+    assert failed
+    assert conn.execute('''
+        SELECT COUNT(*) FROM (SELECT spot_id FROM reservations WHERE status = 'active'
+                              GROUP BY spot_id HAVING COUNT(*) > 1)
+    ''').fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM parking_spots WHERE status = 'O'").fetchone()[0] == lot_size
+    assert check_lot_counters(conn.cursor()) == []
+    conn.close()
+
+def test_allocator_policies_and_drift():
+    """Each policy picks spots in its own order, and the allocator recovers from outside changes"""
+    path, conn = _db_with_lot(10, entrance_index=5)
+    picks = {}
+    for policy in ('lowest', 'nearest'):
+        allocator = SpotAllocator(policy)
+        allocator.warm(conn.cursor())
+        picks[policy] = [spot for _, spot, _ in book_spots(conn, 1, 1, ['A', 'B', 'C'], allocator=allocator)]
+        conn.execute("UPDATE parking_spots SET status = 'A'")
+        conn.execute("UPDATE parking_lots SET available_spots = 10, occupied_spots = 0")
+        conn.execute("UPDATE reservations SET status = 'completed'")
+        conn.commit()
+    assert picks['lowest'] == [1, 2, 3]
+    assert picks['nearest'] == [5, 6, 7]
+    
+    allocator = SpotAllocator('lowest')
+    allocator.warm(conn.cursor())
+    reloads = []
+    load_lot = allocator.load_lot
+    allocator.load_lot = lambda *args: reloads.append(args[1]) or load_lot(*args)
+    # Another worker books spots 1-2 behind this allocator's back: the failed claims mark them taken here
+    other = book_spots(conn, 1, 2, ['X', 'Y'])
+    assert [spot for _, spot, _ in book_spots(conn, 1, 1, ['Z'], allocator=allocator)] == [3]
+    assert allocator.free_count(1) == 7
+    # ... then releases them: once this worker runs short, only the free spots are re-read
+    release_reservations(conn, 2, [reservation_id for reservation_id, _, _ in other])
+    booked = [spot for _, spot, _ in book_spots(conn, 1, 1, [f'V{i}' for i in range(9)], allocator=allocator)]
+    assert booked == [1, 2, 4, 5, 6, 7, 8, 9, 10] and allocator.free_count(1) == 0
+    assert reloads == []
+    # A lot resized by another worker has spot ids this one has never seen: that lot is reloaded
+    provision_spots(conn.cursor(), 1, 2)
+    conn.execute('UPDATE parking_lots SET available_spots = 2, maximum_number_of_spots = 12')
+    conn.commit()
+    assert [spot for _, spot, _ in book_spots(conn, 1, 1, ['W'], allocator=allocator)] == [11]
+    assert reloads == [1] and allocator.free_count(1) == 1
+    conn.close()
+
+def test_exports_stream_in_batches():
+    """Exports come out batch by batch, honour the filters and never sort in a temp b-tree"""
+    path, conn = _db_with_lot(20)
+    booked = book_spots(conn, 1, 1, [f'EXP{n}' for n in range(7)])
+    conn.execute('UPDATE reservations SET parking_timestamp = ? + id * 86400', (to_epoch(datetime(2025, 2, 28, 10)),))
+    conn.commit()
+    
+    assert [len(rows) for rows in reservation_rows(conn, batch_size=3)] == [3, 3, 1]
+    chunks = list(stream_export(path, 'reservations', 'csv', batch_size=3))
+    assert len(chunks) == 4  # header + one chunk per batch
+    lines = ''.join(chunks).splitlines()
+    assert lines[0] == ','.join(RESERVATION_COLUMNS)
+    assert len(lines) == 1 + len(booked)
+    
+    march_2, march_4 = to_epoch(date(2025, 3, 2)), to_epoch(date(2025, 3, 4))
+    records = [json.loads(line) for line in
+               ''.join(stream_export(path, 'reservations', 'ndjson', march_2, march_4, 1)).splitlines()]
+    assert [record['reservation_id'] for record in records] == [2, 3]
+    assert records[0]['prime_location_name'] == 'Stress Lot'
+    occupancy = json.loads(''.join(stream_export(path, 'occupancy', 'ndjson')))
+    assert (occupancy['occupied_spots'], occupancy['utilization']) == (7, 35.0)
+    
+    for filters in ((None, None, None), (march_2, march_4, None), (None, None, 1), (march_2, None, 1)):
+        plan = _query_plan(conn, *reservation_query(*filters))
+        assert 'TEMP B-TREE' not in plan, plan
+        assert 'SCAN' not in plan or 'idx_reservations_parked' in plan, plan
+    conn.close()
+
+def test_rollups_follow_releases_and_rebuild():
+    """Releasing updates the monthly and daily rollups exactly as a full rebuild would"""
+    path, conn = _db_with_lot(10)
+    booked = book_spots(conn, 1, 1, ['R1', 'R2', 'R3']) + book_spots(conn, 1, 2, ['R4'])
+    conn.execute('UPDATE reservations SET parking_timestamp = ? WHERE id IN (1, 4)', (to_epoch(datetime(2025, 1, 31, 22)),))
+    conn.execute('UPDATE reservations SET parking_timestamp = ? WHERE id = 2', (to_epoch(datetime(2025, 2, 1, 9)),))
+    conn.commit()
+    release_reservations(conn, 1, [1, 2])
+    release_reservations(conn, 1, [3])
+    release_reservations(conn, 2, [4])
+    
+    def snapshot():
+        return (conn.execute('SELECT * FROM user_monthly_rollups ORDER BY user_id, month').fetchall(),
+                conn.execute('SELECT * FROM lot_daily_rollups ORDER BY lot_id, day').fetchall())
+    
+    incremental = [[tuple(row) for row in rows] for rows in snapshot()]
+    users, lots = incremental
+    assert [(user_id, month, count) for user_id, month, count, _ in users] == [
+        (1, '2025-01', 1), (1, '2025-02', 1), (1, datetime.now().strftime('%Y-%m'), 1), (2, '2025-01', 1)]
+    assert sum(count for _, _, count, _ in lots) == len(booked)
+    total_cost = conn.execute("SELECT SUM(parking_cost) FROM reservations WHERE status = 'completed'").fetchone()[0]
+    assert sum(revenue for _, _, _, revenue in lots) == pytest.approx(total_cost)
+    
+    rebuild_rollups(conn.cursor())
+    rebuilt = [[tuple(row) for row in rows] for rows in snapshot()]
+    for before, after in zip(incremental, rebuilt):
+        assert [row[:3] for row in before] == [row[:3] for row in after]
+        assert [row[3] for row in before] == pytest.approx([row[3] for row in after])
+    conn.commit()
+    
+    # The background job's rebuild: one short transaction per id range, same result
+    assert rebuild_rollups_in_batches(conn, batch_size=1) == 2 + 1
+    assert [[tuple(row) for row in rows] for rows in snapshot()] == rebuilt
+    conn.close()
+
+def test_epoch_migration_converts_iso_text_in_place():
+    """Old ISO text timestamps become epoch seconds (batch by batch); unparseable ones stay and cannot be released"""
+    path, conn = _db_with_lot(10)
+    book_spots(conn, 1, 1, ['E1', 'E2', 'E3', 'E4', 'E5'])
+    conn.executemany('UPDATE reservations SET parking_timestamp = ? WHERE id = ?', [
+        ('2025-01-31T22:00:00.250000', 1), ('2025-02-01 09:00:00', 2), (' 2025-02-01T10:00:00\n', 3), ('garbage', 4)])
+    conn.execute("UPDATE reservations SET leaving_timestamp = '2025-02-02T10:00:00', status = 'completed' WHERE id = 3")
+    conn.execute('DELETE FROM schema_migrations WHERE version >= 11')
+    conn.commit()
+    assert migrate(conn) == [11, 12, 13]
+    rows = [tuple(row) for row in conn.execute('SELECT parking_timestamp, leaving_timestamp FROM reservations ORDER BY id')]
+    assert rows[:4] == [(to_epoch(datetime(2025, 1, 31, 22)), None), (to_epoch(datetime(2025, 2, 1, 9)), None),
+                        (to_epoch(datetime(2025, 2, 1, 10)), to_epoch(datetime(2025, 2, 2, 10))), ('garbage', None)]
+    assert isinstance(rows[4][0], int)
+    assert conn.execute('SELECT * FROM lot_daily_rollups').fetchall()[0][1] == '2025-02-02'
+    statements = []
+    conn.set_trace_callback(statements.append)
+    convert_reservation_timestamps(conn, batch_size=2)  # already converted: nothing changes
+    conn.set_trace_callback(None)
+    assert statements.count('BEGIN IMMEDIATE') == 3  # ids 1-5: one write transaction per batch of 2
+    assert [tuple(row) for row in conn.execute('SELECT parking_timestamp, leaving_timestamp FROM reservations ORDER BY id')] == rows
+    
+    results = release_reservations(conn, 1, [1, 4])
+    assert [result.status for result in results] == ['released', 'invalid_timestamp']
+    assert format_timestamp(to_epoch(datetime(2025, 1, 31, 22, 5))) == '2025-01-31 22:05'
+    assert (format_timestamp(None), format_timestamp('garbage')) == ('', 'garbage')
+    conn.close()
+
+def test_analytics_refresh_appends_and_matches_brute_force():
+    """Columns load only new completions, and the vectorized sweep matches a per-hour brute force"""
+    path, conn = _db_with_lot(10)
+    book_spots(conn, 1, 1, ['A1', 'A2', 'A3'])
+    conn.execute('UPDATE reservations SET parking_timestamp = ?', (to_epoch(datetime(2025, 3, 1, 8, 30)),))
+    conn.commit()
+    columns = ReservationColumns()
+    release_reservations(conn, 1, [1, 2])
+    assert columns.refresh(conn) == 2
+    assert columns.refresh(conn) == 0
+    release_reservations(conn, 1, [3])
+    assert columns.refresh(conn) == 1
+    assert sorted(columns.spot_ids.tolist()) == [1, 2, 3]
+    conn.close()
+    
+    rng = random.Random(7)
+    now, days = 1_700_000_000, 3
+    intervals = []
+    for _ in range(200):
+        start = now - rng.randint(0, 5 * 86400)
+        intervals.append((start, start + rng.randint(60, 30 * HOUR), rng.choice([1, 2, 9]), rng.random() * 50))
+    columns = ReservationColumns()
+    columns.starts, columns.ends, columns.lot_ids, columns.costs = (
+        numpy.array(column) for column in zip(*intervals))
+    lots = [(2, 'B', 4), (1, 'A', 10)]  # lot 9 was deleted: ignored
+    report = occupancy_report(columns, lots, days=days, now=now)
+    
+    window_end = (now // HOUR + 1) * HOUR
+    window_start = window_end - days * 86400
+    for k, (lot_id, _, _) in enumerate(lots):
+        by_hour = [0] * 24
+        for start, end, lot, _ in intervals:
+            for bucket in range(window_start, window_end, HOUR):
+                if lot == lot_id:
+                    by_hour[(bucket // HOUR) % 24] += max(0, min(end, bucket + HOUR) - max(start, bucket))
+        assert report['heatmap'][k]['occupied'] == pytest.approx([round(x / (days * HOUR), 2) for x in by_hour])
+        done = [cost for start, end, lot, cost in intervals if lot == lot_id and window_start <= end < window_end]
+        assert report['lots'][k]['completed'] == sum(report['dwell'][k]['counts']) == len(done)
+        assert report['lots'][k]['revenue'] == pytest.approx(sum(done))
+
+def test_ttl_cache_lru_tags_and_stats():
+    """The cache evicts least recently used entries, expires by TTL and drops exactly the tagged entries"""
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set('lots', 1, tags=('lots',))
+    cache.set('page', 2, tags=('lots', 'pages'))
+    assert cache.get('lots') == 1          # 'lots' is now the most recently used
+    cache.set('other', 3)
+    assert cache.get('page') is None       # evicted
+    assert cache.invalidate('lots') == 1
+    assert cache.get('lots') is None and cache.get('other') == 3
+    loads = []
+    assert cache.get_or_load('fresh', lambda: loads.append(1) or 'v') == 'v'
+    assert cache.get_or_load('fresh', lambda: loads.append(1) or 'v') == 'v'
+    assert loads == [1]
+    
+    cache.ttl = 0
+    cache.set('short', 4)
+    assert cache.get('short') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['expirations'], stats['invalidations']) == (3, 4, 2, 1, 1)
+
+def test_api_tokens_are_stored_hashed():
+    """A token finds its user, is never stored in clear text and stops working once revoked"""
+    conn = connect(_new_db_path())
+    migrate(conn)
+    conn.execute("INSERT INTO users (username, email, password, full_name) VALUES ('kiosk', 'k@x', 'x', 'Kiosk')")
+    cursor = conn.cursor()
+    token = create_token(cursor, 1, 'gate-1')
+    assert tuple(find_token_user(cursor, token)) == (1, 'kiosk', 'user')
+    assert conn.execute('SELECT COUNT(*) FROM api_tokens WHERE token_hash = ?', (token,)).fetchone()[0] == 0
+    assert find_token_user(cursor, token + 'x') is None and find_token_user(cursor, None) is None
+    assert revoke_tokens(cursor, 1, 'gate-1') == 1
+    assert find_token_user(cursor, token) is None
+    conn.close()
+
+def test_release_multiple_summarizes_each_reservation():
+    """One release call frees the user's active reservations and reports the ones it skipped"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'release.db')
+        app = create_app({'DATABASE': path, 'TESTING': True, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'})
+        app.test_cli_runner().invoke(args=['init-db'])
+        client = app.test_client()
+        client.post('/register', data={'username': 'driver', 'email': 'd@x', 'password': 'pw', 'confirm_password': 'pw',
+                                       'full_name': 'Driver', 'address': 'a', 'pin_code': '1', 'mobile': '9'})
+        conn = connect(path)
+        conn.execute('''
+            INSERT INTO parking_lots (prime_location_name, price, address, pin_code, maximum_number_of_spots,
+                                      available_spots, occupied_spots)
+            VALUES ('Release Lot', 10.0, 'Street', '1', 5, 5, 0)
+        ''')
+        provision_spots(conn.cursor(), 1, 5)
+        conn.commit()
+        driver = find_user(conn.cursor(), 'driver').id
+        mine = [reservation_id for reservation_id, _, _ in book_spots(conn, 1, driver, ['D1', 'D2', 'D3'])]
+        foreign = book_spots(conn, 1, 1, ['A1'])[0][0]
+        now = int(time.time())
+        conn.executemany('UPDATE reservations SET parking_timestamp = ? WHERE id = ?',
+                         [(now - 2 * 3600, mine[0]), (now - 3 * 3600, mine[1])])
+        conn.commit()
+        release_reservations(conn, driver, [mine[2]])
+        
+        client.post('/login', data={'username': 'driver', 'password': 'pw'})
+        response = client.post('/user/release-multiple', data={
+            'reservation_ids': [str(mine[0]), str(mine[1]), str(mine[2]), str(foreign), 'abc', str(mine[0])]})
+        # Post/redirect/get: the summary is a GET page, so a refresh shows it again instead of re-releasing
+        assert response.status_code == 302 and response.location.endswith('/user/release-summary')
+        page = client.get(response.location).data.decode()
+        total = float(re.search(r'2 reservation\(s\) released successfully! Total cost: ₹([\d.]+)', page).group(1))
+        assert total == pytest.approx(50, abs=0.1)
+        rows = re.findall(r'<td>(\d+)</td>\s*<td>\s*<span class="badge [^"]*">([^<]+)</span>', page)
+        assert rows == [(str(mine[0]), 'Released'), (str(mine[1]), 'Released'),
+                        (str(mine[2]), 'Not found or already released'), (str(foreign), 'Not found or already released')]
+        costs = dict(conn.execute('SELECT id, parking_cost FROM reservations WHERE id IN (?, ?)', mine[:2]).fetchall())
+        assert costs[mine[0]] == pytest.approx(20, abs=0.1) and costs[mine[1]] == pytest.approx(30, abs=0.1)
+        assert conn.execute('SELECT status FROM reservations WHERE id = ?', (foreign,)).fetchone()[0] == 'active'
+        assert tuple(conn.execute('SELECT available_spots, occupied_spots FROM parking_lots').fetchone()) == (4, 1)
+        assert check_lot_counters(conn.cursor()) == []
+        again = client.get('/user/release-summary').data.decode()
+        assert re.findall(r'<td>(\d+)</td>\s*<td>\s*<span class="badge [^"]*">([^<]+)</span>', again) == rows
+        assert 'released successfully' not in again
+        conn.close()
+
+def test_api_bookings_check_the_lot_and_the_bearer_prefix():
+    """Booking a missing lot is a 404, release ids must be integers, and the stream only takes a Bearer token"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'api.db')
+        app = create_app({'DATABASE': path, 'TESTING': True, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'})
+        app.test_cli_runner().invoke(args=['init-db'])
+        conn = connect(path)
+        token = create_token(conn.cursor(), 1, 'gate-1')
+        conn.execute('''
+            INSERT INTO parking_lots (prime_location_name, price, address, pin_code, maximum_number_of_spots,
+                                      available_spots, occupied_spots)
+            VALUES ('Api Lot', 10.0, 'Street', '1', 1, 1, 0)
+        ''')
+        provision_spots(conn.cursor(), 1, 1)
+        conn.commit()
+        conn.close()
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        response = client.post('/api/v1/lots/99/bookings', json={'vehicle_numbers': ['X1']}, headers=headers)
+        assert response.status_code == 404 and response.get_json()['error'] == 'lot_not_found'
+        assert client.post('/api/v1/lots/1/bookings', json={'vehicle_numbers': ['X1']}, headers=headers).status_code == 201
+        response = client.post('/api/v1/lots/1/bookings', json={'vehicle_numbers': ['X2']}, headers=headers)
+        assert response.status_code == 409 and response.get_json()['error'] == 'not_enough_spots'
+        
+        for ids in ([1.9], [True], ['1'], ['abc'], [1, None], 1, []):
+            response = client.post('/api/v1/releases', json={'reservation_ids': ids}, headers=headers)
+            assert response.status_code == 400 and response.get_json()['error'] == 'invalid_reservation_ids'
+        conn = connect(path)
+        assert conn.execute('SELECT status FROM reservations WHERE id = 1').fetchone()[0] == 'active'
+        conn.close()
+        response = client.post('/api/v1/releases', json={'reservation_ids': [1, 7]}, headers=headers)
+        assert [result['status'] for result in response.get_json()['results']] == ['released', 'not_found']
+        
+        assert client.get('/api/v1/lots/stream', headers={'Authorization': f'Basic {token}'}).status_code == 401
+        assert client.get('/api/v1/lots/stream', headers={'Authorization': f'xxxxxx {token}'}).status_code == 401
+        assert client.get(f'/api/v1/lots/stream?token={token}').status_code == 401
+
+def test_repository_rows_and_batch_fetches():
+    """Repository queries return compact named rows and fetch batches in one statement"""
+    conn = connect(_new_db_path())
+    migrate(conn)
+    cursor = conn.cursor()
+    for name in ('asha', 'ravi'):
+        cursor.execute("INSERT INTO users (username, email, password, full_name) VALUES (?, ?, 'x', ?)",
+                       (name, f'{name}@x', name.title()))
+    for name in ('Andheri', 'Bandra'):
+        cursor.execute("INSERT INTO parking_lots (prime_location_name, price, address, pin_code, "
+                       "maximum_number_of_spots, available_spots) VALUES (?, 20, 'addr', '400001', 2, 2)", (name,))
+        provision_spots(cursor, cursor.lastrowid, 2)
+    conn.commit()
+    (reservation_id, spot_id, _), = book_spots(conn, 2, 1, ['MH01AB1234'])
+    
+    user = find_user(cursor, 'ravi')
+    assert isinstance(user, User) and user.id == user[0] == 2 and user.role == 'user'
+    assert not hasattr(user, '__dict__')
+    assert sorted(get_users(cursor, [2, 1, 2, 99])) == [1, 2]
+    lots = get_lots(cursor, ['2', 1])
+    assert isinstance(lots[2], ParkingLot) and (lots[2].available_spots, lots[2].occupied_spots) == (1, 1)
+    assert get_lots(cursor, []) == {}
+    availability = lot_availability_rows(cursor)
+    assert all(isinstance(lot, LotAvailability) for lot in availability)
+    assert [(lot.prime_location_name, lot.total_spots, lot.available_spots, lot.occupied_spots)
+            for lot in availability] == [('Andheri', 2, 2, 0), ('Bandra', 2, 1, 1)]
+    
+    detail = active_reservation(cursor, reservation_id, 1)
+    assert (detail.spot_id, detail.lot_id, detail.price) == (spot_id, 2, 20)
+    assert active_reservation(cursor, reservation_id, 2) is None
+    assert get_reservations(cursor, [reservation_id])[reservation_id].vehicle_number == 'MH01AB1234'
+    spots = spot_page(cursor, 2, 0, 10)
+    assert [(spot.status, spot.full_name) for spot in spots if spot.id == spot_id] == [('O', 'Asha')]
+    # The caller's cursor keeps the connection's sqlite3.Row rows
+    assert cursor.execute('SELECT id FROM users WHERE id = 1').fetchone()['id'] == 1
+    conn.close()
+
+def test_admin_users_page_counts_every_account():
+    """The user statistics count all accounts with one query, not just the page that is shown"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'DATABASE': os.path.join(tmp, 'users.db'), 'TESTING': True, 'PAGE_SIZE': 2,
+                          'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'})
+        app.test_cli_runner().invoke(args=['init-db'])
+        client = app.test_client()
+        for name in ('ua', 'ub', 'uc'):
+            client.post('/register', data={'username': name, 'email': f'{name}@x', 'password': 'pw',
+                                           'confirm_password': 'pw', 'full_name': name, 'address': 'a',
+                                           'pin_code': '1', 'mobile': '9'})
+        client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        page = client.get('/admin/users').data.decode()
+        counts = [int(value) for value in re.findall(r'<h3 class="text-(?:primary|danger|info)">(\d+)</h3>', page)]
+        assert counts == [4, 1, 3]
+        with app.app_context():
+            assert user_role_counts(get_db().cursor()) == (1, 3)
+
+def test_admin_lot_resize_keeps_spot_ids():
+    """Growing or shrinking a lot only touches the difference; occupied spots and bad sizes are refused"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'lots.db')
+        app = create_app({'DATABASE': path, 'TESTING': True, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'})
+        app.test_cli_runner().invoke(args=['init-db'])
+        client = app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        form = {'prime_location_name': 'Resize Lot', 'price': '10', 'address': 'Street', 'pin_code': '1'}
+        conn = connect(path)
+        
+        def spots():
+            return [tuple(row) for row in conn.execute('SELECT id, status FROM parking_spots ORDER BY id')]
+        
+        def counters():
+            return tuple(conn.execute('SELECT available_spots, occupied_spots FROM parking_lots').fetchone())
+        
+        for size in ('0', '-3'):
+            page = client.post('/admin/add-parking-lot', data={**form, 'maximum_number_of_spots': size},
+                               follow_redirects=True).data.decode()
+            assert 'A parking lot needs at least 1 spot.' in page
+        assert conn.execute('SELECT COUNT(*) FROM parking_lots').fetchone()[0] == 0
+        
+        client.post('/admin/add-parking-lot', data={**form, 'maximum_number_of_spots': '4'})
+        original = [spot_id for spot_id, _ in spots()]
+        lot_id = conn.execute('SELECT id FROM parking_lots').fetchone()[0]
+        
+        client.post(f'/admin/edit-parking-lot/{lot_id}', data={**form, 'maximum_number_of_spots': '6'})
+        grown = [spot_id for spot_id, _ in spots()]
+        assert grown[:4] == original and len(grown) == 6 and counters() == (6, 0)
+        
+        occupied = sorted(spot_id for _, spot_id, _ in book_spots(conn, lot_id, 1, ['R1', 'R2']))
+        page = client.post(f'/admin/edit-parking-lot/{lot_id}', data={**form, 'maximum_number_of_spots': '1'},
+                           follow_redirects=True).data.decode()
+        assert 'Cannot shrink below 2 spot(s)' in page and len(spots()) == 6 and counters() == (4, 2)
+        page = client.post(f'/admin/edit-parking-lot/{lot_id}', data={**form, 'maximum_number_of_spots': '0'},
+                           follow_redirects=True).data.decode()
+        assert 'A parking lot needs at least 1 spot.' in page and len(spots()) == 6
+        
+        # Shrinking drops the free spots with the highest ids; the rest keep theirs
+        client.post(f'/admin/edit-parking-lot/{lot_id}', data={**form, 'maximum_number_of_spots': '3'})
+        free = sorted(set(grown) - set(occupied))
+        assert [spot_id for spot_id, _ in spots()] == sorted(occupied + free[:1]) and counters() == (1, 2)
+        
+        # A metadata-only edit leaves the spots alone
+        before = spots()
+        client.post(f'/admin/edit-parking-lot/{lot_id}', data={**form, 'prime_location_name': 'Renamed',
+                                                               'maximum_number_of_spots': '3'})
+        assert spots() == before and counters() == (1, 2)
+        assert conn.execute('SELECT prime_location_name FROM parking_lots').fetchone()[0] == 'Renamed'
+        conn.close()
+
+def test_availability_feed_fans_out_and_recovers_slow_screens():
+    """One change reaches every subscriber; a screen that falls behind gets a fresh snapshot"""
+    path, conn = _db_with_lot(10)
+    feed = AvailabilityFeed(queue_size=2, sync_interval=60)
+    screens = [stream(feed, None, lambda: connect(path), heartbeat=0.01) for _ in range(3)]
+    lot_one = stream(feed, {2}, lambda: connect(path), heartbeat=0.01)
+    for screen in screens + [lot_one]:
+        assert next(screen).startswith('retry')
+    for screen in screens:
+        assert next(screen) == 'event: snapshot\ndata: [{"lot_id":1,"available":10,"occupied":0}]\n\n'
+    assert next(lot_one) == 'event: snapshot\ndata: []\n\n'
+    assert len(feed.subscribers) == 4
+    
+    book_spots(conn, 1, 1, ['F1', 'F2'])
+    assert feed.load(conn, [1]) == [{'lot_id': 1, 'available': 8, 'occupied': 2}]
+    assert feed.load(conn, [1]) == []  # nothing changed, nothing sent
+    for screen in screens:
+        assert next(screen) == 'event: availability\ndata: {"lot_id":1,"available":8,"occupied":2}\n\n'
+    assert next(lot_one) == ': ping\n\n'  # watches lot 2 only
+    
+    for n in range(4):  # more changes than the queue holds
+        book_spots(conn, 1, 1, [f'G{n}'])
+        feed.load(conn, [1])
+    assert feed.stats()['dropped'] == 3 * 2
+    assert next(screens[0]).startswith('event: snapshot\ndata: [{"lot_id":1,"available":4')
+    screens[0].close()
+    assert len(feed.subscribers) == 3
+    
+    # A change committed by another worker arrives within the sync interval, not the heartbeat
+    feed = AvailabilityFeed(sync_interval=0.05)
+    screen = stream(feed, None, lambda: connect(path), heartbeat=60)
+    next(screen), next(screen)
+    book_spots(conn, 1, 1, ['H1'])
+    started = time.monotonic()
+    assert next(screen) == 'event: availability\ndata: {"lot_id":1,"available":3,"occupied":7}\n\n'
+    assert time.monotonic() - started < 5
+    screen.close()
+    conn.close()
+
+def test_password_verifier_rehashes_and_sheds_load():
+    """Old hashes are upgraded on a correct login; a full pool rejects instead of queueing"""
+    verifier = PasswordVerifier('pbkdf2:sha256:2000', workers=1, max_pending=1, timeout=2)
+    old = generate_password_hash('secret', 'pbkdf2:sha256:1000')
+    assert verifier.verify(old, 'wrong') == (False, None)
+    ok, new_hash = verifier.verify(old, 'secret')
+    assert ok and new_hash.startswith('pbkdf2:sha256:2000$')
+    assert check_password_hash(new_hash, 'secret') and not needs_rehash(new_hash, verifier.method)
+    assert verifier.verify(new_hash, 'secret') == (True, None)
+    
+    gate = threading.Event()
+    busy = threading.Thread(target=verifier._run, args=(gate.wait,))
+    busy.start()
+    while verifier._slots._value:  # wait until the slow job holds the only slot
+        pass
+    with pytest.raises(LoginOverloaded):
+        verifier.verify(new_hash, 'secret')
+    assert verifier.rejected == 1
+    gate.set()
+    busy.join()
+    assert verifier.verify(new_hash, 'secret') == (True, None)
+    verifier.shutdown()
+
+def test_benchmark_seed_and_percentiles():
+    """The synthetic seeder is reproducible and consistent; percentiles are nearest-rank"""
+    with tempfile.TemporaryDirectory() as tmp:
+        dumps = []
+        for name in ('bench.db', 'again.db'):
+            path = os.path.join(tmp, name)
+            counts = seed_database(path, lots=5, spots_per_lot=10, users=20, reservations=300, seed=7,
+                                   password_method='pbkdf2:sha256:1000', batch_size=128,
+                                   now=datetime(2024, 3, 1, 9, 30))
+            assert counts == {'lots': 5, 'spots': 50, 'users': 20, 'reservations': 318, 'active': 18}
+            conn = connect(path)
+            dumps.append(conn.execute('SELECT * FROM reservations ORDER BY id').fetchall())
+            assert check_lot_counters(conn.cursor()) == []
+            assert conn.execute("SELECT SUM(occupied_spots) FROM parking_lots").fetchone()[0] == 18
+            assert conn.execute("SELECT SUM(reservations) FROM lot_daily_rollups").fetchone()[0] == 300
+            # A spot never holds two reservations at once, and ids follow arrival time
+            overlaps = conn.execute("""
+                SELECT COUNT(*) FROM (
+                    SELECT parking_timestamp, LAG(COALESCE(leaving_timestamp, 1 << 62)) OVER (
+                        PARTITION BY spot_id ORDER BY parking_timestamp) AS previous_end
+                    FROM reservations)
+                WHERE previous_end > parking_timestamp
+            """).fetchone()[0]
+            assert overlaps == 0
+            times = [row[0] for row in conn.execute("SELECT parking_timestamp FROM reservations WHERE status = 'completed' ORDER BY id")]
+            assert times == sorted(times)
+            with pytest.raises(ValueError):
+                seed_database(path, lots=1, spots_per_lot=1, users=1, reservations=1)
+            conn.close()
+        assert [tuple(row) for row in dumps[0]] == [tuple(row) for row in dumps[1]]
+    
+    values = [n / 1000 for n in range(1, 101)]  # 1..100 ms
+    assert [percentile(values, pct) for pct in (50, 95, 99, 100)] == [0.05, 0.095, 0.099, 0.1]
+    summary = summarize(values, 2, 0.5)
+    assert (summary['throughput'], summary['p95_ms'], summary['max_ms'], summary['errors']) == (200.0, 95.0, 100.0, 2)
+
+def test_metrics_time_requests_and_sql(caplog):
+    """Instrumented request connections feed the histograms and the slow log; disabled means untouched"""
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = Flask(__name__)
+        plain.config['DATABASE'] = os.path.join(tmp, 'm.db')
+        init_db_app(plain)
+        assert init_metrics(plain) is None and plain.config['DB_CONNECTION_FACTORY'] is sqlite3.Connection
+        
+        app = Flask(__name__)
+        app.config.update(DATABASE=os.path.join(tmp, 'm.db'), METRICS_ENABLED=True, SLOW_QUERY_MS=0)
+        init_db_app(app)
+        metrics = init_metrics(app)
+        
+        @app.route('/work')
+        def work():
+            conn = get_db()
+            conn.execute('CREATE TABLE IF NOT EXISTS t (x)')
+            conn.executemany('INSERT INTO t VALUES (?)', [(n,) for n in range(10)])
+            conn.commit()
+            return str(sum(row[0] for row in conn.execute('SELECT x FROM t')))
+        
+        with caplog.at_level('WARNING', logger='parking.slow'):
+            assert app.test_client().get('/work').data == b'45'
+            assert app.test_client().get('/missing').status_code == 404
+        text = metrics.render()
+        pragmas = len(PRAGMAS)  # the request opened a new connection
+        assert 'parking_http_request_duration_seconds_count{endpoint="work",method="GET",status="200"} 1' in text
+        assert 'parking_http_request_duration_seconds_count{endpoint="unmatched",method="GET",status="404"} 1' in text
+        assert f'parking_http_request_sql_statements_sum{{endpoint="work"}} {pragmas + 4}.0' in text
+        for statement in ('CREATE', 'INSERT', 'COMMIT', 'SELECT'):
+            assert f'parking_sql_statement_duration_seconds_count{{statement="{statement}"}} 1' in text
+        assert 'slow query' in caplog.text and 'SELECT x FROM t' in caplog.text
+        assert metrics.slow_statements == pragmas + 4
+        
+        # Shard connections, pooled or opened for a stream/export/job, are instrumented too
+        path = os.path.join(tmp, 'sharded.db')
+        app = create_app({'DATABASE': path, 'TESTING': True, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+                          'SHARD_COUNT': 2, 'METRICS_ENABLED': True})
+        app.test_cli_runner().invoke(args=['init-db'])
+        metrics = app.extensions['metrics']
+        router = app.extensions['shard_router']
+        shard_conn = router.connect(router.paths[1])
+        assert isinstance(shard_conn, metrics.connection_factory)
+        shard_conn.close()
+        app.add_url_rule('/shard-work', 'shard_work',
+                         lambda: str(lot_db(1).execute('SELECT COUNT(*) FROM parking_spots').fetchone()[0]))
+        app.add_url_rule('/fan-work', 'fan_work', lambda: str(sum(fan_out(lambda conn: conn.execute(
+            'SELECT COUNT(*) FROM parking_lots').fetchone()[0]))))
+        assert app.test_client().get('/shard-work').data == b'0'
+        assert f'parking_http_request_sql_statements_sum{{endpoint="shard_work"}} {pragmas + 1}.0' in metrics.render()
+
+        # fan_out's borrowed shard connections count for the request that ran it, and only for that one
+        def statements(endpoint):
+            found = re.search(rf'parking_http_request_sql_statements_sum{{endpoint="{endpoint}"}} ([\d.]+)',
+                              metrics.render())
+            return float(found.group(1)) if found else 0.0
+
+        client = app.test_client()
+        client.get('/fan-work')  # open the pooled connections
+        client.get('/shard-work')
+        before = statements('fan_work'), statements('shard_work')
+        assert client.get('/fan-work').data == b'0' and client.get('/shard-work').data == b'0'
+        assert (statements('fan_work') - before[0], statements('shard_work') - before[1]) == (2, 1)
+
+def test_archive_moves_old_reservations_and_reads_stay_the_same():
+    """Archived reservations keep showing up in exports, rollups and analytics; active ones stay hot"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'archive.db')
+        now = datetime(2024, 6, 1, 12, 0)
+        seed_database(path, lots=4, spots_per_lot=10, users=15, reservations=2000, days=120, seed=3,
+                      password_method='pbkdf2:sha256:1000', now=now)
+        conn = connect(path)
+        
+        def snapshot():
+            exports = [row for lot_id in (None, 2) for rows in reservation_rows(conn, lot_id=lot_id, batch_size=50)
+                       for row in rows]
+            write_transaction(conn, rebuild_rollups)
+            rollups = conn.execute('SELECT * FROM lot_daily_rollups ORDER BY lot_id, day').fetchall()
+            columns = ReservationColumns()
+            columns.refresh(conn)
+            # Sums may add up in another order once rows come from two tables
+            return exports, [(*row[:3], round(row[3], 6)) for row in rollups], len(columns)
+        
+        before = snapshot()
+        cutoff = archive_cutoff(30, to_epoch(now))
+        old = conn.execute("SELECT COUNT(*) FROM reservations WHERE status = 'completed' AND leaving_timestamp < ?",
+                           (cutoff,)).fetchone()[0]
+        assert old > 1000
+        assert archive_reservations(conn, cutoff, batch_size=300) == old
+        assert archive_stats(conn.cursor()) == (2000 + 14 - old, old)
+        assert conn.execute("SELECT COUNT(*) FROM reservations WHERE status = 'active'").fetchone()[0] == 14
+        assert conn.execute('SELECT MIN(leaving_timestamp) FROM reservations').fetchone()[0] >= cutoff
+        assert snapshot() == before
+        assert archive_reservations(conn, cutoff) == 0
+        
+        # History pages walk both tables' own indexes; only the two short pages get sorted
+        sql = f'''
+            SELECT r.id FROM {newest_reservations_sql('user_id = ? AND (parking_timestamp, id) < (?, ?)')} r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            ORDER BY r.parking_timestamp DESC, r.id DESC LIMIT ?
+        '''
+        params = (1, 1 << 62, 0, 11) * 2 + (10,)
+        plan = _query_plan(conn, sql, params)
+        assert 'idx_reservations_user_parked' in plan and 'idx_archive_user_parked' in plan
+        assert plan.count('TEMP B-TREE') == 1
+        expected = conn.execute('''
+            SELECT id FROM all_reservations WHERE user_id = 1
+            ORDER BY parking_timestamp DESC, id DESC LIMIT 10
+        ''').fetchall()
+        assert conn.execute(sql, params).fetchall() == expected
+        conn.close()
+
+def test_create_app_is_lazy_and_workers_check_the_schema():
+    """Building the app touches nothing; each worker process checks the schema before serving"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'factory.db')
+        app = create_app({'DATABASE': path, 'TESTING': True, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+                          'SPOT_ALLOCATOR_WARM': True})
+        assert not os.path.exists(path)
+        assert app.extensions['password_verifier']._executor is None
+        client = app.test_client()
+        with pytest.raises(SchemaOutdated):
+            client.get('/')
+        
+        result = app.test_cli_runner().invoke(args=['init-db'])
+        assert result.exit_code == 0 and f'version {SCHEMA_VERSION}' in result.output
+        assert client.get('/').status_code == 200
+        assert start_worker(app) is False  # already done in this process
+        state = app.extensions['worker_start']
+        state['pid'] = -1  # as seen from a freshly forked worker
+        assert start_worker(app) is True
+        assert connect(path).execute("SELECT COUNT(*) FROM users WHERE role = 'admin'").fetchone()[0] == 1
+        
+        # A forked child never reuses the parent's pooled connections
+        pool = get_pool(path)
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write, b'1' if get_pool(path) is not pool else b'0')
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert os.read(read, 1) == b'1'
+        os.close(read)
+        os.close(write)
+        assert get_pool(path) is pool
+        pool.close_all()
+
+def test_create_app_requires_a_secret_key_outside_debug_and_tests(monkeypatch):
+    """The built-in development key is only used in debug mode or tests"""
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    path = _new_db_path()
+    with pytest.raises(RuntimeError, match='SECRET_KEY'):
+        create_app({'DATABASE': path})
+    assert create_app({'DATABASE': path, 'TESTING': True}).secret_key == DEV_SECRET_KEY
+    assert create_app({'DATABASE': path, 'DEBUG': True}).secret_key == DEV_SECRET_KEY
+    assert create_app({'DATABASE': path, 'SECRET_KEY': 'prod-key'}).secret_key == 'prod-key'
+    monkeypatch.setenv('SECRET_KEY', 'env-key')
+    assert create_app({'DATABASE': path}).secret_key == 'env-key'
+
+def test_sharded_storage_routes_and_merges(monkeypatch):
+    """With SHARD_COUNT each lot lives in its own shard file; ids route releases and pages merge every shard"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sharded.db')
+        config = {'DATABASE': path, 'TESTING': True, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000', 'SHARD_COUNT': 2}
+        app = create_app(config)
+        assert app.config['SHARD_PATHS'] == shard_paths(path, 2)
+        assert app.test_cli_runner().invoke(args=['init-db']).exit_code == 0
+        client = app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        for name in ('Even', 'Odd'):
+            client.post('/admin/add-parking-lot', data={'prime_location_name': name, 'price': '10', 'address': 'x',
+                                                        'pin_code': '1', 'maximum_number_of_spots': '3'})
+        client.get('/logout')
+        client.post('/register', data={'username': 'driver', 'email': 'd@x', 'password': 'pw', 'confirm_password': 'pw',
+                                       'full_name': 'Dee River', 'address': 'a', 'pin_code': '1', 'mobile': '9'})
+        client.post('/login', data={'username': 'driver', 'password': 'pw'})
+        for lot_id in (1, 2):
+            client.post(f'/user/book-parking/{lot_id}', data={'num_spots': '1', 'vehicle_numbers[]': [f'V{lot_id}']})
+        
+        # Lot 1 went to shard 1 (ids above 1 << 40), lot 2 to shard 0; users stay in the directory
+        shards = [connect(shard) for shard in shard_paths(path, 2)]
+        assert tuple(shards[1].execute('SELECT id, spot_id FROM reservations').fetchone()) == (1 << 40 | 1, 1 << 40 | 1)
+        assert shards[0].execute('SELECT id FROM reservations').fetchone()[0] == 1
+        assert shards[0].execute('SELECT COUNT(*) FROM users').fetchone()[0] == 0
+        assert connect(path).execute('SELECT COUNT(*) FROM parking_spots').fetchone()[0] == 0
+        
+        history = client.get('/user/history').data.decode()
+        assert 'V1' in history and 'V2' in history
+        released = client.post('/user/release-multiple', data={'reservation_ids': [str(1 << 40 | 1), '1']},
+                               follow_redirects=True)
+        assert b'2 reservation(s) released' in released.data
+        assert [shard.execute('SELECT occupied_spots FROM parking_lots').fetchone()[0] for shard in shards] == [0, 0]
+        
+        client.post('/user/book-parking/1', data={'num_spots': '1', 'vehicle_numbers[]': ['V3']})
+        client.get('/logout')
+        client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        assert b'Dee River' in client.get('/admin/parking-spots/1').data
+        assert client.get('/admin/reports').status_code == 200
+        
+        # Deleting checks for parked cars under the shard's write lock; the catalogue row goes with the shard's
+        directory = connect(path)
+        lots = lambda conn: [row[0] for row in conn.execute('SELECT id FROM parking_lots ORDER BY id')]
+        client.post('/admin/delete-parking-lot/1')
+        client.post('/admin/delete-parking-lot/2')
+        assert (lots(directory), lots(shards[1]), lots(shards[0])) == ([1], [1], [])
+        
+        # A failed shard write leaves no catalogue row; a shard copy left by an interrupted add is replaced
+        with monkeypatch.context() as patch:
+            patch.setattr('controllers.admin_controller.provision_spots', lambda *args: 1 / 0)
+            with pytest.raises(ZeroDivisionError):
+                client.post('/admin/add-parking-lot', data={'prime_location_name': 'Broken', 'price': '10',
+                                                            'address': 'x', 'pin_code': '1',
+                                                            'maximum_number_of_spots': '2'})
+        assert (lots(directory), lots(shards[1])) == ([1], [1])
+        shards[1].execute("INSERT INTO parking_lots (id, prime_location_name, price, address, pin_code, "
+                          "maximum_number_of_spots) VALUES (3, 'Stale', 1, 'x', '1', 9)")
+        shards[1].execute("INSERT INTO parking_spots (lot_id, status) VALUES (3, 'A')")
+        shards[1].commit()
+        client.post('/admin/add-parking-lot', data={'prime_location_name': 'Third', 'price': '10', 'address': 'x',
+                                                    'pin_code': '1', 'maximum_number_of_spots': '2'})
+        assert (lots(directory), lots(shards[1])) == ([1, 3], [1, 3])
+        assert shards[1].execute('SELECT COUNT(*) FROM parking_spots WHERE lot_id = 3').fetchone()[0] == 2
+        directory.close()
+        for shard in shards:
+            shard.close()
+        
+        # Workers refuse a SHARD_COUNT that does not match the files on disk
+        with pytest.raises(ShardLayoutError):
+            start_worker(create_app({**config, 'SHARD_COUNT': 3}))
+
+def test_reports_read_a_backup_snapshot_until_it_is_refreshed():
+    """With REPORT_SNAPSHOT, reports and exports read backup copies; stale copies refresh in the background"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'live.db')
+        app = create_app({'DATABASE': path, 'TESTING': True, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+                          'SHARD_COUNT': 2, 'REPORT_SNAPSHOT': True, 'REPORT_SNAPSHOT_MAX_AGE': 3600,
+                          'REPORT_SNAPSHOT_STEP_PAGES': 2})
+        runner = app.test_cli_runner()
+        runner.invoke(args=['init-db'])
+        client = app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        client.post('/admin/add-parking-lot', data={'prime_location_name': 'Snap', 'price': '10', 'address': 'x',
+                                                    'pin_code': '1', 'maximum_number_of_spots': '4'})
+        
+        snapshots = app.extensions['report_snapshots']
+        assert snapshots.targets == [snapshot_path(p) for p in [path] + shard_paths(path, 2)]
+        page = client.get('/admin/reports').data.decode()
+        assert 'Report data as of' in page and all(os.path.exists(target) for target in snapshots.targets)
+        snapshot = connect_snapshot(snapshots.storage[1])
+        assert snapshot.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+        assert snapshot.execute('SELECT available_spots FROM parking_lots').fetchone()[0] == 4
+        snapshot.close()
+        
+        def exported():
+            return client.get('/admin/export/reservations?format=ndjson').data.decode().count('\n')
+        
+        live = connect(shard_paths(path, 2)[1])
+        book_spots(live, 1, 1, ['SNAP1'])
+        assert exported() == 0  # the copy is younger than REPORT_SNAPSHOT_MAX_AGE
+        result = runner.invoke(args=['refresh-snapshot'])
+        assert result.exit_code == 0 and 'Copied 3' in result.output
+        assert exported() == 1
+        
+        # A stale copy does not hold up the page: a background thread replaces it
+        book_spots(live, 1, 1, ['SNAP2'])
+        for target in snapshots.targets:
+            os.utime(target, (time.time() - 7200, time.time() - 7200))
+        with app.test_request_context():
+            assert report_freshness()['age'] >= 7200
+        assert client.get('/admin/reports').status_code == 200
+        snapshots._thread.join()
+        assert snapshots.age() < 60 and exported() == 2
+        live.close()
+
+def test_job_scheduler_runs_maintenance_on_the_lease_holder():
+    """One worker holds the scheduler lease and runs due jobs on its pool; runs are recorded for the admin page"""
+    path, conn = _db_with_lot(3)
+    app = create_app({'DATABASE': path, 'TESTING': True, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+                      'JOBS_ENABLED': True, 'JOB_TICK': 3600})
+    app.test_cli_runner().invoke(args=['init-db'])
+    book_spots(conn, 1, 1, ['OLD1'])
+    conn.execute('UPDATE reservations SET parking_timestamp = parking_timestamp - 100 * 3600')
+    conn.execute('UPDATE parking_lots SET available_spots = 9')  # counter drift for the counters job
+    conn.commit()
+    
+    scheduler = app.extensions['scheduler']
+    # A fresh deploy schedules every job one interval out instead of running them all at once
+    assert claim_due(conn, scheduler.jobs, now=1000) == []
+    next_runs = dict(conn.execute('SELECT name, next_run FROM job_state').fetchall())
+    assert next_runs == {job.name: 1000 + job.interval for job in scheduler.jobs}
+    for job in scheduler.jobs:
+        run_soon(conn, job.name)
+    start_worker(app)  # starts this process's ticker, whose first tick runs every job made due above
+    
+    def finished():
+        return conn.execute("SELECT COUNT(*) FROM job_state WHERE last_status IN ('ok', 'failed')").fetchone()[0]
+    
+    deadline = time.time() + 10
+    while finished() < len(scheduler.jobs) and time.time() < deadline:
+        time.sleep(0.05)
+    state = {row['name']: row for row in conn.execute('SELECT * FROM job_state')}
+    assert {job.name for job in scheduler.jobs} == set(state) and scheduler.leader
+    assert all(row['last_status'] == 'ok' and row['runs'] == 1 for row in state.values())
+    assert 'Rebuilt counters for 1 lot(s)' in state['counters']['last_result']
+    assert conn.execute('SELECT available_spots FROM parking_lots').fetchone()[0] == 2
+    assert '1 reservation(s) active for more than 72 hours' in state['stale-active']['last_result']
+    
+    # Another process cannot take the lease, and nothing is due again until its interval passes
+    assert take_lease(conn, 'other-worker', 60) is False
+    assert claim_due(conn, scheduler.jobs) == []
+    run_soon(conn, 'counters')
+    assert [job.name for job in claim_due(conn, scheduler.jobs)] == ['counters']
+    
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    page = client.get('/admin/jobs').data.decode()
+    assert scheduler.owner in page and 'Rebuilt counters' in page
+    
+    # A stopped leader gives the lease up at once
+    scheduler.stop()
+    assert take_lease(conn, 'other-worker', 60) is True
+    conn.close()
+
+def test_vacuum_job_frees_pages_in_short_transactions(monkeypatch):
+    """Migrated files use incremental auto-vacuum; the job returns free pages step by step, never with a full VACUUM"""
+    path, conn = _db_with_lot(3)
+    app = create_app({'DATABASE': path, 'TESTING': True, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'})
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    conn.execute('CREATE TABLE filler (data BLOB)')
+    conn.executemany('INSERT INTO filler VALUES (?)', [(os.urandom(2000),) for _ in range(500)])
+    conn.commit()
+    conn.execute('DROP TABLE filler')
+    conn.commit()
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    assert free > 100
+    
+    monkeypatch.setattr('models.jobs.VACUUM_STEP_PAGES', 50)
+    monkeypatch.setattr('models.jobs.VACUUM_STEP_PAUSE', 0)
+    statements = []
+    monkeypatch.setattr('models.jobs._each', lambda app, paths, work: [work(_traced(conn, statements))])
+    assert vacuum_job(app) == f'Vacuumed 1 file(s), {free} free page(s) returned.'
+    assert conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
+    assert statements.count('PRAGMA incremental_vacuum(50)') == -(-free // 50) and 'VACUUM' not in statements
+    assert vacuum_job(app) == 'Nothing to vacuum.'
+    conn.set_trace_callback(None)
+    conn.close()
+
+def _traced(conn, statements):
+    conn.set_trace_callback(statements.append)
+    return conn
+
 def main():
     """Main test function"""
     print("=" * 50)